@@ -20,6 +20,7 @@ from pydantic.dataclasses import dataclass
 
 import chainlit.input_widget as input_widget
 from chainlit.action import Action
+from chainlit.audio import audio_stream
 from chainlit.cache import cache
 from chainlit.chat_context import chat_context
 from chainlit.chat_settings import ChatSettings
@@ -78,6 +79,7 @@ from .callbacks import (
     on_window_message,
     password_auth_callback,
     send_window_message,
+    session_store,
     set_chat_profiles,
     set_starters,
 )
@@ -161,6 +163,7 @@ __all__ = [
     "Video",
     "__version__",
     "action_callback",
+    "audio_stream",
     "author_rename",
     "cache",
     "chat_context",
@@ -190,6 +193,7 @@ __all__ = [
     "password_auth_callback",
     "run_sync",
     "send_window_message",
+    "session_store",
     "set_chat_profiles",
     "set_starters",
     "sleep",
@@ -0,0 +1,171 @@
+import asyncio
+from typing import AsyncIterator, List, Optional, Tuple
+
+from chainlit.context import context
+from chainlit.logger import logger
+from chainlit.types import InputAudioChunk
+
+# Initial capacity of the audio buffer, about 20s of 24kHz 16-bit mono audio
+INITIAL_BUFFER_SIZE = 1 << 20
+
+
+class AudioStream:
+    """
+    Audio chunks sent by the user during an audio session.
+
+    Chunks are queued in a bounded queue and consumed in order by a single task,
+    which appends them to a preallocated buffer and calls the `on_audio_chunk`
+    hook. The audio received so far is available without copy with `data`, and
+    the chunks can be consumed as they arrive with `async for frame in stream`.
+    Past `max_buffer_size` bytes, the oldest chunks are dropped from the buffer.
+    """
+
+    def __init__(self, maxsize: int, max_buffer_size: Optional[int] = None) -> None:
+        self._queue: asyncio.Queue[Optional[InputAudioChunk]] = asyncio.Queue(
+            maxsize=maxsize
+        )
+        # Keeps the chunks in order when producers wait for the queue
+        self._put_lock = asyncio.Lock()
+
+        self.max_buffer_size = max_buffer_size
+        self._buffer = bytearray(
+            min(INITIAL_BUFFER_SIZE, max_buffer_size or INITIAL_BUFFER_SIZE)
+        )
+        self._length = 0
+        # Offset and size of each chunk in the buffer
+        self._frames: List[Tuple[int, int]] = []
+        # Number of chunks dropped from the buffer
+        self._first_frame = 0
+        self._new_frame = asyncio.Event()
+
+        self.mime_type: Optional[str] = None
+        self.closed = False
+        self._consumer: Optional[asyncio.Task] = None
+
+    @property
+    def data(self) -> memoryview:
+        """Audio received so far, the most recent one past `max_buffer_size`."""
+        return memoryview(self._buffer)[: self._length]
+
+    def _reallocate(self, size: int):
+        # Allocate a new buffer rather than resizing it, the views handed out
+        # keep pointing to the previous one.
+        start = dropped = 0
+        capacity = max(len(self._buffer) * 2, self._length + size)
+        if self.max_buffer_size and capacity > self.max_buffer_size:
+            # Drop the oldest chunks, down to half of the buffer so that
+            # the next chunks are appended without copying the buffer again
+            while (
+                dropped < len(self._frames)
+                and self._length - start + size > self.max_buffer_size // 2
+            ):
+                offset, frame_size = self._frames[dropped]
+                start = offset + frame_size
+                dropped += 1
+            capacity = max(self.max_buffer_size, self._length - start + size)
+
+        buffer = bytearray(capacity)
+        buffer[: self._length - start] = memoryview(self._buffer)[start : self._length]
+        self._buffer = buffer
+        self._length -= start
+        if dropped:
+            self._frames = [
+                (offset - start, frame_size)
+                for offset, frame_size in self._frames[dropped:]
+            ]
+            self._first_frame += dropped
+
+    def _append(self, data: bytes):
+        size = len(data)
+        if self._length + size > len(self._buffer):
+            self._reallocate(size)
+
+        self._buffer[self._length : self._length + size] = data
+        self._frames.append((self._length, size))
+        self._length += size
+        self._new_frame.set()
+
+    async def _consume(self):
+        from chainlit.config import config
+
+        while (chunk := await self._queue.get()) is not None:
+            if chunk.isStart or self.mime_type is None:
+                self.mime_type = chunk.mimeType
+            self._append(chunk.data)
+
+            if config.code.on_audio_chunk:
+                try:
+                    await config.code.on_audio_chunk(chunk)
+                except Exception as e:
+                    # Keep consuming, the producers would wait for the queue forever
+                    logger.exception(e)
+
+    async def put(self, chunk: InputAudioChunk):
+        """Queue a chunk, waiting if the consumer lags behind."""
+        if self.closed:
+            logger.warning("Audio chunk received after the end of the audio stream.")
+            return
+
+        if self._consumer is None:
+            self._consumer = asyncio.ensure_future(self._consume())
+
+        async with self._put_lock:
+            await self._queue.put(chunk)
+
+    async def close(self):
+        """End the stream and wait for the queued chunks to be processed."""
+        if self.closed:
+            return
+
+        self.closed = True
+        if self._consumer:
+            async with self._put_lock:
+                await self._queue.put(None)
+            await self._consumer
+        self._new_frame.set()
+
+    def cancel(self):
+        """Drop the queued chunks."""
+        self.closed = True
+        if self._consumer:
+            self._consumer.cancel()
+        self._new_frame.set()
+
+    async def __aiter__(self) -> AsyncIterator[memoryview]:
+        index = 0
+        while True:
+            while True:
+                # Chunks dropped from the buffer before being read are skipped
+                index = max(index, self._first_frame)
+                if index - self._first_frame >= len(self._frames):
+                    break
+                offset, size = self._frames[index - self._first_frame]
+                index += 1
+                yield memoryview(self._buffer)[offset : offset + size]
+
+            if self.closed:
+                return
+
+            self._new_frame.clear()
+            await self._new_frame.wait()
+
+
+def audio_stream() -> AudioStream:
+    """
+    Audio stream of the current session.
+
+    Example:
+        @cl.on_audio_start
+        async def on_audio_start():
+            asyncio.create_task(transcribe(cl.audio_stream()))
+            return True
+    """
+    from chainlit.config import config
+
+    session = context.session
+    if getattr(session, "audio_stream", None) is None:
+        session.audio_stream = AudioStream(  # type: ignore[union-attr]
+            maxsize=config.features.audio.chunk_queue_size,
+            max_buffer_size=config.features.audio.max_buffer_size_mb * 1024 * 1024,
+        )
+    return session.audio_stream  # type: ignore[union-attr]
@@ -13,7 +13,7 @@ from .cookie import (
     get_token_from_cookies,
     set_auth_cookie,
 )
-from .jwt import create_jwt, decode_jwt, get_jwt_secret
+from .jwt import create_jwt, decode_jwt, evict_jwt, get_jwt_secret
 
 reuseable_oauth = OAuth2PasswordBearerWithCookie(tokenUrl="/login", auto_error=False)
 
@@ -93,6 +93,7 @@ async def get_current_user(token: str = Depends(reuseable_oauth)):
 __all__ = [
     "clear_auth_cookie",
     "create_jwt",
+    "evict_jwt",
     "get_configuration",
     "get_current_user",
     "get_token_from_cookies",
@@ -1,12 +1,23 @@
+import copy
+import hashlib
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import jwt as pyjwt
 
 from chainlit.config import config
+from chainlit.metrics import metrics
 from chainlit.user import User
 
+# Maximum number of verified tokens kept, the least recently used are evicted first
+DECODED_TOKENS_CACHE_SIZE = 10000
+
+# Expiry and user of the verified tokens, by token hash
+_decoded_tokens: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+
 
 def get_jwt_secret() -> Optional[str]:
     return os.environ.get("CHAINLIT_AUTH_SECRET")
@@ -28,15 +39,49 @@ def create_jwt(data: User) -> str:
     return encoded_jwt
 
 
+def _token_key(token: str, secret: str) -> str:
+    # Tokens signed with a previous secret are verified again
+    return hashlib.sha256(f"{secret}:{token}".encode()).hexdigest()
+
+
 def decode_jwt(token: str) -> User:
+    """
+    Verify a token and return its user. Verified tokens are cached until they
+    expire, so a token is verified once rather than on every request.
+    """
     secret = get_jwt_secret()
     assert secret
 
+    key = _token_key(token, secret)
+    if cached := _decoded_tokens.get(key):
+        exp, user = cached
+        if exp > time.time():
+            metrics.incr("jwt_cache.hits")
+            _decoded_tokens.move_to_end(key)
+            # Callers may update the user they get
+            return copy.deepcopy(user)
+        del _decoded_tokens[key]
+
+    metrics.incr("jwt_cache.misses")
     dict = pyjwt.decode(
         token,
         secret,
         algorithms=["HS256"],
         options={"verify_signature": True},
     )
-    del dict["exp"]
-    return User(**dict)
+    exp = dict.pop("exp")
+    user = User(**dict)
+
+    _decoded_tokens[key] = (exp, copy.deepcopy(user))
+    while len(_decoded_tokens) > DECODED_TOKENS_CACHE_SIZE:
+        _decoded_tokens.popitem(last=False)
+    return user
+
+
+def evict_jwt(token: str):
+    """Forget a verified token (e.g. on logout), it is verified again if used."""
+    if secret := get_jwt_secret():
+        _decoded_tokens.pop(_token_key(token, secret), None)
+
+
+metrics.register_gauge("jwt_cache.tokens", lambda: len(_decoded_tokens))
@@ -12,6 +12,7 @@ from chainlit.data.base import BaseDataLayer
 from chainlit.mcp import McpConnection
 from chainlit.message import Message
 from chainlit.oauth_providers import get_configured_oauth_providers
+from chainlit.session_store import BaseSessionStore
 from chainlit.step import Step, step
 from chainlit.telemetry import trace
 from chainlit.types import ChatProfile, Starter, ThreadDict
@@ -428,3 +429,14 @@ def data_layer(
     # 2. We don't want to change the API for get_data_layer() to be async, everywhere (at this point).
     config.code.data_layer = func
     return func
+
+
+def session_store(
+    func: Callable[[], BaseSessionStore],
+) -> Callable[[], BaseSessionStore]:
+    """
+    Hook to configure a custom session store, shared by all the workers serving the app.
+    """
+
+    config.code.session_store = func
+    return func
@@ -1,56 +1,133 @@
-from typing import TYPE_CHECKING, Dict, List
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 
 from chainlit.context import context
 
 if TYPE_CHECKING:
     from chainlit.message import Message
 
-chat_contexts: Dict[str, List["Message"]] = {}
+Tokenizer = Callable[[str], int]
 
 
-class ChatContext:
-    def get(self) -> List["Message"]:
-        if not context.session:
-            return []
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about 4 characters per token."""
+    return len(text) // 4 + 1
 
-        if context.session.id not in chat_contexts:
-            # Create a new chat context
-            chat_contexts[context.session.id] = []
 
-        return chat_contexts[context.session.id].copy()
+class SessionChatContext:
+    """Messages of a session, in order and indexed by id."""
+
+    def __init__(self) -> None:
+        self.messages: OrderedDict[str, Message] = OrderedDict()
+        # Token count of each message, along with the content it was computed for
+        self._token_counts: Dict[str, Tuple[str, int]] = {}
+        self._tokenizer: Optional[Tokenizer] = None
 
     def add(self, message: "Message"):
-        if not context.session:
-            return
+        # Updating a message keeps its position
+        self.messages[message.id] = message
 
-        if context.session.id not in chat_contexts:
-            chat_contexts[context.session.id] = []
+    def remove(self, message: "Message") -> bool:
+        if self.messages.pop(message.id, None) is None:
+            return False
+        self._token_counts.pop(message.id, None)
+        return True
+
+    def clear(self):
+        self.messages.clear()
+        self._token_counts.clear()
+
+    def count_tokens(self, message: "Message", tokenizer: Tokenizer) -> int:
+        """Token count of a message, only computed again when its content changes."""
+        if tokenizer is not self._tokenizer:
+            self._token_counts.clear()
+            self._tokenizer = tokenizer
+
+        content = message.content or ""
+        cached = self._token_counts.get(message.id)
+        if cached and cached[0] == content:
+            return cached[1]
+
+        count = tokenizer(content)
+        self._token_counts[message.id] = (content, count)
+        return count
+
+    def window(self, max_tokens: int, tokenizer: Tokenizer) -> List["Message"]:
+        """
+        Most recent messages fitting in `max_tokens`.
+
+        The latest message is always kept, even if it alone exceeds the budget,
+        so the LLM never receives an empty context.
+        """
+        messages: List[Message] = []
+        total = 0
+        for message in reversed(self.messages.values()):
+            total += self.count_tokens(message, tokenizer)
+            if messages and total > max_tokens:
+                break
+            messages.append(message)
+        messages.reverse()
+        return messages
 
-        if message not in chat_contexts[context.session.id]:
-            chat_contexts[context.session.id].append(message)
 
-        return message
+chat_contexts: Dict[str, SessionChatContext] = {}
 
-    def remove(self, message: "Message") -> bool:
+
+class ChatContext:
+    def _session_context(self) -> Optional[SessionChatContext]:
         if not context.session:
-            return False
+            return None
 
         if context.session.id not in chat_contexts:
-            return False
+            # Create a new chat context
+            chat_contexts[context.session.id] = SessionChatContext()
 
-        if message in chat_contexts[context.session.id]:
-            chat_contexts[context.session.id].remove(message)
-            return True
+        return chat_contexts[context.session.id]
 
-        return False
+    def get(self) -> List["Message"]:
+        if session_context := self._session_context():
+            return list(session_context.messages.values())
+        return []
+
+    def add(self, message: "Message"):
+        if session_context := self._session_context():
+            session_context.add(message)
+            return message
+
+    def remove(self, message: "Message") -> bool:
+        if not context.session or context.session.id not in chat_contexts:
+            return False
+
+        return chat_contexts[context.session.id].remove(message)
 
     def clear(self) -> None:
         if context.session and context.session.id in chat_contexts:
-            chat_contexts[context.session.id] = []
+            chat_contexts[context.session.id].clear()
+
+    def to_openai(
+        self,
+        max_tokens: Optional[int] = None,
+        tokenizer: Optional[Tokenizer] = None,
+    ):
+        """
+        Convert the chat context to OpenAI messages.
+
+        If `max_tokens` is provided, only the most recent messages fitting in that
+        budget are returned, always including the latest one. Token counts are
+        computed with `tokenizer` (a function returning the number of tokens of a
+        text) and cached per message.
+        """
+        session_context = self._session_context()
+        if not session_context:
+            return []
+
+        if max_tokens is None:
+            window = list(session_context.messages.values())
+        else:
+            window = session_context.window(max_tokens, tokenizer or estimate_tokens)
 
-    def to_openai(self):
         messages = []
-        for message in self.get():
+        for message in window:
             if message.type == "assistant_message":
                 messages.append({"role": "assistant", "content": message.content})
             elif message.type == "user_message":
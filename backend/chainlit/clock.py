@@ -0,0 +1,34 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+class MonotonicClock:
+    """
+    Hybrid logical clock returning strictly increasing UTC timestamps.
+
+    The wall clock is used as long as it moves forward. When two timestamps are
+    requested within the same microsecond (or if the wall clock goes backward),
+    the last timestamp is bumped by one microsecond instead, so timestamps can be
+    used as an ordering key for steps and messages.
+    """
+
+    def __init__(self) -> None:
+        self._last: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        wall = datetime.now(timezone.utc).replace(tzinfo=None)
+        with self._lock:
+            if self._last is not None and wall <= self._last:
+                wall = self._last + timedelta(microseconds=1)
+            self._last = wall
+        return wall
+
+
+clock = MonotonicClock()
+
+
+def utc_now() -> str:
+    """Return a strictly increasing ISO 8601 UTC timestamp."""
+    return clock.now().isoformat(timespec="microseconds") + "Z"
@@ -24,6 +24,7 @@ from starlette.datastructures import Headers
 
 from chainlit.data.base import BaseDataLayer
 from chainlit.logger import logger
+from chainlit.session_store import BaseSessionStore
 from chainlit.translations import lint_translation_json
 from chainlit.version import __version__
 
@@ -74,6 +75,42 @@ session_timeout = 3600
 # Duration (in seconds) of the user session expiry
 user_session_timeout = 1296000  # 15 days
 
+# Interval (in milliseconds) during which streamed tokens are merged into a single websocket event. 0 disables it.
+stream_flush_interval_ms = 25
+
+# Number of buffered characters that triggers an early flush of the streamed tokens
+stream_flush_max_size = 4096
+
+# Maximum number of events waiting to be sent to a client. Streamed tokens are merged when the client lags behind.
+outbound_queue_size = 1000
+
+# Number of sent events kept per session to replay the ones a reconnecting client missed.
+replay_buffer_size = 1000
+
+# Use MessagePack instead of JSON for the websocket events of the clients supporting it. Requires the msgpack package.
+msgpack_serializer = false
+
+# Interval (in milliseconds) between two writes of the pending steps and elements to the data layer. Successive updates of a step are merged into one write.
+persistence_flush_interval_ms = 100
+
+# Number of pending writes that triggers an early write to the data layer
+persistence_batch_size = 100
+
+# Maximum number of steps and elements waiting to be written to the data layer
+persistence_queue_size = 10000
+
+# Number of the most recent steps sent when a thread is resumed, the previous ones are loaded as the user scrolls up. 0 sends all the steps.
+resume_steps_limit = 0
+
+# Memory (in MB) of the threads and elements cached by the data layer, 0 disables the cache. Threads are invalidated when written by this instance only.
+thread_cache_size_mb = 0
+
+# Duration (in seconds) during which a thread is cached. Keep it short when several instances share the database.
+thread_cache_ttl = 60
+
+# Duration (in seconds) during which the users and the authors of the threads are cached, saving a query or two per request. 0 disables the cache.
+identity_cache_ttl = 0
+
 # Enable third parties caching (e.g., LangChain cache)
 cache = false
 
@@ -115,6 +152,10 @@ edit_message = true
 [features.audio]
     # Sample rate of the audio
     sample_rate = 24000
+    # Number of received audio chunks waiting to be processed before the client is slowed down
+    chunk_queue_size = 256
+    # Maximum size of the audio kept in memory per session, the oldest audio is dropped beyond
+    max_buffer_size_mb = 50
 
 [features.mcp.sse]
     enabled = true
@@ -242,6 +283,10 @@ class SpontaneousFileUploadFeature(DataClassJsonMixin):
 @dataclass
 class AudioFeature(DataClassJsonMixin):
     sample_rate: int = 24000
+    # Number of received audio chunks waiting to be processed
+    chunk_queue_size: int = 256
+    # Maximum size of the audio kept in memory, the oldest audio is dropped beyond
+    max_buffer_size_mb: int = 50
     enabled: bool = False
 
 
@@ -361,6 +406,7 @@ class CodeSettings:
     on_window_message: Optional[Callable[[str], Any]] = None
     author_rename: Optional[Callable[[str], Awaitable[str]]] = None
     data_layer: Optional[Callable[[], BaseDataLayer]] = None
+    session_store: Optional[Callable[[], BaseSessionStore]] = None
 
 
 @dataclass()
@@ -378,6 +424,30 @@ class ProjectSettings(DataClassJsonMixin):
     session_timeout: int = 300
     # Duration (in seconds) of the user session expiry
     user_session_timeout: int = 1296000  # 15 days
+    # Interval (in milliseconds) during which streamed tokens are merged into a single websocket event. 0 disables it.
+    stream_flush_interval_ms: int = 25
+    # Number of buffered characters that triggers an early flush of the streamed tokens
+    stream_flush_max_size: int = 4096
+    # Maximum number of events waiting to be sent to a client. Streamed tokens are merged when the client lags behind.
+    outbound_queue_size: int = 1000
+    # Number of sent events kept per session to replay the ones a reconnecting client missed
+    replay_buffer_size: int = 1000
+    # Use MessagePack instead of JSON for the websocket events of the clients supporting it
+    msgpack_serializer: bool = False
+    # Interval (in milliseconds) between two writes of the pending steps and elements to the data layer
+    persistence_flush_interval_ms: int = 100
+    # Number of pending writes that triggers an early write to the data layer
+    persistence_batch_size: int = 100
+    # Maximum number of steps and elements waiting to be written to the data layer
+    persistence_queue_size: int = 10000
+    # Number of the most recent steps sent when a thread is resumed, 0 for all of them
+    resume_steps_limit: int = 0
+    # Memory (in MB) of the threads cached by the data layer, 0 disables the cache
+    thread_cache_size_mb: int = 0
+    # Duration (in seconds) during which a thread is cached
+    thread_cache_ttl: int = 60
+    # Duration (in seconds) during which the users and thread authors are cached, 0 disables the cache
+    identity_cache_ttl: int = 0
     # Enable third parties caching (e.g LangChain cache)
     cache: bool = False
 
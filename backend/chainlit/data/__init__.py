@@ -1,6 +1,6 @@
 import os
 import warnings
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from .base import BaseDataLayer
 from .utils import (
@@ -98,8 +98,23 @@ def get_data_layer():
                         storage_key=azure_storage_key,
                     )
 
+                # Connection pool and full-text search
+                options: Dict[str, Any] = {}
+                if min_size := os.getenv("DATABASE_POOL_MIN_SIZE"):
+                    options["pool_min_size"] = int(min_size)
+                if max_size := os.getenv("DATABASE_POOL_MAX_SIZE"):
+                    options["pool_max_size"] = int(max_size)
+                if command_timeout := os.getenv("DATABASE_COMMAND_TIMEOUT"):
+                    options["command_timeout"] = float(command_timeout)
+                if statement_cache_size := os.getenv("DATABASE_STATEMENT_CACHE_SIZE"):
+                    options["statement_cache_size"] = int(statement_cache_size)
+                if full_text_search := os.getenv("DATABASE_FULL_TEXT_SEARCH"):
+                    options["full_text_search"] = full_text_search
+
                 _data_layer = ChainlitDataLayer(
-                    database_url=database_url, storage_client=storage_client
+                    database_url=database_url,
+                    storage_client=storage_client,
+                    **options,
                 )
             elif api_key := os.environ.get("LITERAL_API_KEY"):
                 # When LITERAL_API_KEY is defined, use Literal AI data layer
@@ -113,6 +128,21 @@ def get_data_layer():
                 )
                 _data_layer = LiteralDataLayer(api_key=api_key, server=server)
 
+        from chainlit.config import config
+
+        if _data_layer and (
+            config.project.thread_cache_size_mb > 0
+            or config.project.identity_cache_ttl > 0
+        ):
+            from .cache import CachedDataLayer
+
+            _data_layer = CachedDataLayer(
+                _data_layer,
+                max_size=config.project.thread_cache_size_mb * 1024 * 1024,
+                ttl=config.project.thread_cache_ttl,
+                identity_ttl=config.project.identity_cache_ttl,
+            )
+
         _data_layer_initialized = True
 
     return _data_layer
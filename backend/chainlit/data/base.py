@@ -7,9 +7,10 @@ from chainlit.types import (
     Pagination,
     ThreadDict,
     ThreadFilter,
+    ThreadStepsPage,
 )
 
-from .utils import queue_until_user_message
+from .utils import queue_until_user_message, steps_window
 
 if TYPE_CHECKING:
     from chainlit.element import Element, ElementDict
@@ -20,6 +21,17 @@ if TYPE_CHECKING:
 class BaseDataLayer(ABC):
     """Base class for data persistence."""
 
+    async def connect(self):
+        """
+        Open the connections to the database, called on app startup.
+        Data layers connecting lazily on the first query can override it to connect ahead.
+        """
+        pass
+
+    async def close(self):
+        """Release the connections to the database, called on app shutdown."""
+        pass
+
     @abstractmethod
     async def get_user(self, identifier: str) -> Optional["PersistedUser"]:
         pass
@@ -47,6 +59,14 @@ class BaseDataLayer(ABC):
     async def create_element(self, element: "Element"):
         pass
 
+    async def create_elements(self, elements: List["Element"]):
+        """
+        Persist several elements at once.
+        Data layers able to write them in bulk should override it, it defaults to create_element.
+        """
+        for element in elements:
+            await self.create_element(element)
+
     @abstractmethod
     async def get_element(
         self, thread_id: str, element_id: str
@@ -63,11 +83,26 @@ class BaseDataLayer(ABC):
     async def create_step(self, step_dict: "StepDict"):
         pass
 
+    async def create_steps(self, step_dicts: List["StepDict"]):
+        """
+        Persist several steps at once.
+        Data layers able to write them in bulk should override it, it defaults to create_step.
+        """
+        for step_dict in step_dicts:
+            await self.create_step(step_dict)
+
     @queue_until_user_message()
     @abstractmethod
     async def update_step(self, step_dict: "StepDict"):
         pass
 
+    async def patch_step(self, step_dict: "StepDict", changed_fields: List[str]):
+        """
+        Persist a step already created, `changed_fields` lists the fields changed since the last write.
+        Data layers able to update only these fields should override it, it defaults to update_step.
+        """
+        await self.update_step(step_dict)
+
     @queue_until_user_message()
     @abstractmethod
     async def delete_step(self, step_id: str):
@@ -91,6 +126,36 @@ class BaseDataLayer(ABC):
     async def get_thread(self, thread_id: str) -> "Optional[ThreadDict]":
         pass
 
+    async def get_thread_steps(
+        self, thread_id: str, before: Optional[str] = None, limit: int = 100
+    ) -> ThreadStepsPage:
+        """
+        Get the `limit` steps of a thread preceding the step `before` (or its most recent steps), along with the ancestors they are nested in and their elements.
+        Data layers able to query only these steps should override it, it defaults to get_thread.
+        """
+        thread = await self.get_thread(thread_id)
+        if not thread:
+            return ThreadStepsPage(steps=[], elements=[], before=None)
+        return steps_window(thread["steps"], thread["elements"] or [], before, limit)
+
+    async def get_thread_window(
+        self, thread_id: str, limit: int
+    ) -> "Optional[ThreadDict]":
+        """
+        Get a thread with only its `limit` most recent steps, as get_thread_steps, and the cursor of the previous ones.
+        Data layers able to query only these steps should override it, it defaults to get_thread.
+        """
+        thread = await self.get_thread(thread_id)
+        if not thread:
+            return None
+        page = steps_window(thread["steps"], thread["elements"] or [], None, limit)
+        return {
+            **thread,
+            "steps": page["steps"],
+            "elements": page["elements"],
+            "stepsBefore": page["before"],
+        }
+
     @abstractmethod
     async def update_thread(
         self,
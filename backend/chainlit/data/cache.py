@@ -0,0 +1,464 @@
+import asyncio
+import copy
+import json
+import time
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from chainlit.data.base import BaseDataLayer
+from chainlit.data.utils import queue_until_user_message, steps_window
+from chainlit.metrics import metrics
+from chainlit.types import (
+    Feedback,
+    PaginatedResponse,
+    Pagination,
+    ThreadDict,
+    ThreadFilter,
+    ThreadStepsPage,
+)
+
+if TYPE_CHECKING:
+    from chainlit.element import Element, ElementDict
+    from chainlit.step import StepDict
+    from chainlit.user import PersistedUser, User
+
+T = TypeVar("T")
+
+# Result of a load whose caller was cancelled, the callers waiting for it load again
+_RELOAD: Any = object()
+
+
+class TTLCache(Generic[T]):
+    """
+    Values kept for `ttl` seconds, up to `maxsize` of them (least recently used
+    first out). Concurrent loads of a missing key are made once, the callers
+    waiting for the first one. Empty values (e.g. a user not found) are not cached.
+    """
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 10000) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._values: OrderedDict[str, Tuple[float, T]] = OrderedDict()
+        self._loads: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def get(self, key: str) -> Optional[T]:
+        if (cached := self._values.get(key)) is None:
+            return None
+        expires_at, value = cached
+        if expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: T):
+        # A load in progress may have read the value before it was set
+        self._loads.pop(key, None)
+        if not value:
+            self._values.pop(key, None)
+            return
+        self._values[key] = (time.monotonic() + self.ttl, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._loads.pop(key, None)
+        self._values.pop(key, None)
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            if (value := self.get(key)) is not None:
+                metrics.incr(f"{self.name}.hits")
+                return value
+
+            future = self._loads.get(key)
+            if not future or future.get_loop() is not asyncio.get_running_loop():
+                break
+            metrics.incr(f"{self.name}.coalesced")
+            if (value := await asyncio.shield(future)) is not _RELOAD:
+                return value
+
+        metrics.incr(f"{self.name}.misses")
+        future = self._loads[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await load()
+        except BaseException as e:
+            if self._loads.get(key) is future:
+                del self._loads[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Retrieved, whether callers are waiting for it or not
+                future.exception()
+            else:
+                # Cancelled, the waiting callers are not
+                future.set_result(_RELOAD)
+            raise
+        # Not cached if invalidated during the load
+        if self._loads.get(key) is future:
+            self.set(key, value)
+        future.set_result(value)
+        return value
+
+
+class ThreadCacheEntry:
+    """Cached thread and elements of a thread, serialized."""
+
+    def __init__(self, expires_at: float) -> None:
+        self.expires_at = expires_at
+        self.thread: Optional[str] = None
+        self.elements: Dict[str, str] = {}
+        # Ids of the steps, elements and feedbacks of the cached thread
+        self.ids: Set[str] = set()
+
+    @property
+    def size(self) -> int:
+        return len(self.thread or "") + sum(map(len, self.elements.values()))
+
+
+class CachedDataLayer(BaseDataLayer):
+    """
+    Read-through cache of the threads, elements, users and thread authors of a
+    data layer.
+
+    Threads are cached in memory, up to `max_size` bytes (least recently used
+    threads are evicted first) and for `ttl` seconds. A thread is invalidated
+    whenever it, or one of its steps, elements or feedbacks, is written through
+    this data layer. Writes made by other processes are only seen once the cached
+    thread expires, keep `ttl` short when several Chainlit instances share a
+    database and below the expiry of the signed URLs of the elements.
+
+    Users and thread authors, looked up by nearly every request, are cached for
+    `identity_ttl` seconds. They are updated by `create_user`, `update_thread` and
+    `delete_thread`. A `max_size` or an `identity_ttl` of 0 disables the cache.
+    """
+
+    def __init__(
+        self,
+        data_layer: BaseDataLayer,
+        max_size: int,
+        ttl: float,
+        identity_ttl: float = 0,
+    ) -> None:
+        self.data_layer = data_layer
+        self.max_size = max_size
+        self.ttl = ttl
+        self.identity_ttl = identity_ttl
+        self.users: TTLCache[PersistedUser] = TTLCache("user_cache", identity_ttl)
+        self.authors: TTLCache[str] = TTLCache("thread_author_cache", identity_ttl)
+        self._entries: OrderedDict[str, ThreadCacheEntry] = OrderedDict()
+        self._size = 0
+        # Thread of the cached steps, elements and feedbacks, by id
+        self._owners: Dict[str, str] = {}
+        # Loads in progress, dropped when their thread is invalidated meanwhile
+        self._loads: Dict[str, Set[object]] = {}
+
+        metrics.register_gauge("thread_cache.threads", lambda: len(self._entries))
+        metrics.register_gauge("thread_cache.size_bytes", lambda: self._size)
+        metrics.register_gauge("user_cache.users", lambda: len(self.users))
+        metrics.register_gauge("thread_author_cache.threads", lambda: len(self.authors))
+
+    def __getattr__(self, name: str) -> Any:
+        # Attributes specific to the cached data layer (e.g. its storage client)
+        if name == "data_layer":
+            raise AttributeError(name)
+        return getattr(self.data_layer, name)
+
+    def _get_entry(self, thread_id: str) -> Optional[ThreadCacheEntry]:
+        entry = self._entries.get(thread_id)
+        if entry and entry.expires_at <= time.monotonic():
+            self._remove(thread_id)
+            return None
+        if entry:
+            self._entries.move_to_end(thread_id)
+        return entry
+
+    def _remove(self, thread_id: str):
+        if entry := self._entries.pop(thread_id, None):
+            self._size -= entry.size
+            for item_id in entry.ids:
+                self._owners.pop(item_id, None)
+
+    def _start_load(self, thread_id: str) -> object:
+        token = object()
+        self._loads.setdefault(thread_id, set()).add(token)
+        return token
+
+    def _end_load(self, thread_id: str, token: object) -> bool:
+        """Return False if the thread was invalidated during the load."""
+        tokens = self._loads.get(thread_id)
+        if not tokens or token not in tokens:
+            return False
+        tokens.discard(token)
+        if not tokens:
+            del self._loads[thread_id]
+        return True
+
+    def _store(
+        self,
+        thread_id: str,
+        thread: Optional[ThreadDict] = None,
+        element: Optional["ElementDict"] = None,
+    ):
+        if not self.max_size:
+            return
+        if not (entry := self._get_entry(thread_id)):
+            entry = self._entries[thread_id] = ThreadCacheEntry(
+                time.monotonic() + self.ttl
+            )
+        self._size -= entry.size
+
+        if thread is not None:
+            entry.thread = json.dumps(thread)
+            for step in thread["steps"]:
+                entry.ids.add(step["id"])
+                if feedback_id := (step.get("feedback") or {}).get("id"):
+                    entry.ids.add(feedback_id)
+            entry.ids.update(element["id"] for element in thread["elements"] or [])
+        if element is not None:
+            entry.elements[element["id"]] = json.dumps(element)
+            entry.ids.add(element["id"])
+        for item_id in entry.ids:
+            self._owners[item_id] = thread_id
+
+        self._size += entry.size
+        while self._size > self.max_size and self._entries:
+            evicted_id = next(iter(self._entries))
+            self._remove(evicted_id)
+            metrics.incr("thread_cache.evictions")
+
+    def invalidate(self, *thread_ids: Optional[str]):
+        """Drop the cached data of threads, e.g. after writing to the database directly."""
+        for thread_id in thread_ids:
+            if thread_id is None:
+                continue
+            self._loads.pop(thread_id, None)
+            if thread_id in self._entries:
+                self._remove(thread_id)
+                metrics.incr("thread_cache.invalidations")
+
+    def _owner(self, item_id: str) -> Optional[str]:
+        return self._owners.get(item_id)
+
+    async def connect(self):
+        await self.data_layer.connect()
+
+    async def close(self):
+        await self.data_layer.close()
+
+    async def get_user(self, identifier: str) -> Optional["PersistedUser"]:
+        if not self.identity_ttl:
+            return await self.data_layer.get_user(identifier)
+        user = await self.users.get_or_load(
+            identifier, lambda: self.data_layer.get_user(identifier)
+        )
+        # Callers may update the user they get (e.g. its display name)
+        return copy.deepcopy(user)
+
+    async def create_user(self, user: "User") -> Optional["PersistedUser"]:
+        try:
+            persisted_user = await self.data_layer.create_user(user)
+        except Exception:
+            self.users.invalidate(user.identifier)
+            raise
+        if self.identity_ttl:
+            self.users.set(user.identifier, copy.deepcopy(persisted_user))
+        return persisted_user
+
+    async def delete_feedback(self, feedback_id: str) -> bool:
+        try:
+            return await self.data_layer.delete_feedback(feedback_id)
+        finally:
+            self.invalidate(self._owner(feedback_id))
+
+    async def upsert_feedback(self, feedback: Feedback) -> str:
+        try:
+            return await self.data_layer.upsert_feedback(feedback)
+        finally:
+            self.invalidate(
+                feedback.threadId,
+                self._owner(feedback.forId),
+                feedback.id and self._owner(feedback.id),
+            )
+
+    @queue_until_user_message()
+    async def create_element(self, element: "Element"):
+        try:
+            await self.data_layer.create_element(element)
+        finally:
+            self.invalidate(element.thread_id)
+
+    async def create_elements(self, elements: List["Element"]):
+        try:
+            await self.data_layer.create_elements(elements)
+        finally:
+            self.invalidate(*{element.thread_id for element in elements})
+
+    async def get_element(
+        self, thread_id: str, element_id: str
+    ) -> Optional["ElementDict"]:
+        if not self.max_size:
+            return await self.data_layer.get_element(thread_id, element_id)
+
+        entry = self._get_entry(thread_id)
+        if entry and element_id in entry.elements:
+            metrics.incr("thread_cache.hits")
+            return json.loads(entry.elements[element_id])
+
+        metrics.incr("thread_cache.misses")
+        token = self._start_load(thread_id)
+        try:
+            element = await self.data_layer.get_element(thread_id, element_id)
+        finally:
+            loaded = self._end_load(thread_id, token)
+        if loaded and element:
+            self._store(thread_id, element=element)
+        return element
+
+    @queue_until_user_message()
+    async def delete_element(self, element_id: str, thread_id: Optional[str] = None):
+        try:
+            await self.data_layer.delete_element(element_id, thread_id)
+        finally:
+            self.invalidate(thread_id, self._owner(element_id))
+
+    def _invalidate_steps(self, step_dicts: List["StepDict"]):
+        self.invalidate(
+            *{step_dict.get("threadId") for step_dict in step_dicts},
+            *{self._owner(step_dict["id"]) for step_dict in step_dicts},
+        )
+
+    @queue_until_user_message()
+    async def create_step(self, step_dict: "StepDict"):
+        try:
+            await self.data_layer.create_step(step_dict)
+        finally:
+            self._invalidate_steps([step_dict])
+
+    async def create_steps(self, step_dicts: List["StepDict"]):
+        try:
+            await self.data_layer.create_steps(step_dicts)
+        finally:
+            self._invalidate_steps(step_dicts)
+
+    @queue_until_user_message()
+    async def update_step(self, step_dict: "StepDict"):
+        try:
+            await self.data_layer.update_step(step_dict)
+        finally:
+            self._invalidate_steps([step_dict])
+
+    async def patch_step(self, step_dict: "StepDict", changed_fields: List[str]):
+        try:
+            await self.data_layer.patch_step(step_dict, changed_fields)
+        finally:
+            self._invalidate_steps([step_dict])
+
+    @queue_until_user_message()
+    async def delete_step(self, step_id: str):
+        try:
+            await self.data_layer.delete_step(step_id)
+        finally:
+            self.invalidate(self._owner(step_id))
+
+    async def get_thread_author(self, thread_id: str) -> str:
+        if not self.identity_ttl:
+            return await self.data_layer.get_thread_author(thread_id)
+        return await self.authors.get_or_load(
+            thread_id, lambda: self.data_layer.get_thread_author(thread_id)
+        )
+
+    async def delete_thread(self, thread_id: str):
+        try:
+            await self.data_layer.delete_thread(thread_id)
+        finally:
+            self.invalidate(thread_id)
+            self.authors.invalidate(thread_id)
+
+    async def list_threads(
+        self, pagination: "Pagination", filters: "ThreadFilter"
+    ) -> "PaginatedResponse[ThreadDict]":
+        return await self.data_layer.list_threads(pagination, filters)
+
+    def _cached_thread(self, thread_id: str) -> Optional[ThreadDict]:
+        if not self.max_size:
+            return None
+        entry = self._get_entry(thread_id)
+        if entry and entry.thread is not None:
+            metrics.incr("thread_cache.hits")
+            return json.loads(entry.thread)
+        metrics.incr("thread_cache.misses")
+        return None
+
+    async def get_thread(self, thread_id: str) -> "Optional[ThreadDict]":
+        if thread := self._cached_thread(thread_id):
+            return thread
+
+        token = self._start_load(thread_id)
+        try:
+            thread = await self.data_layer.get_thread(thread_id)
+        finally:
+            loaded = self._end_load(thread_id, token)
+        # Threads not found may be created any time, they are not cached
+        if loaded and thread:
+            self._store(thread_id, thread=thread)
+        return thread
+
+    async def get_thread_steps(
+        self, thread_id: str, before: Optional[str] = None, limit: int = 100
+    ) -> ThreadStepsPage:
+        if thread := self._cached_thread(thread_id):
+            return steps_window(
+                thread["steps"], thread["elements"] or [], before, limit
+            )
+        # Pages are not cached, the data layer may query only the steps of the page
+        return await self.data_layer.get_thread_steps(thread_id, before, limit)
+
+    async def get_thread_window(
+        self, thread_id: str, limit: int
+    ) -> "Optional[ThreadDict]":
+        if thread := self._cached_thread(thread_id):
+            page = steps_window(thread["steps"], thread["elements"] or [], None, limit)
+            return {
+                **thread,
+                "steps": page["steps"],
+                "elements": page["elements"],
+                "stepsBefore": page["before"],
+            }
+        return await self.data_layer.get_thread_window(thread_id, limit)
+
+    async def update_thread(
+        self,
+        thread_id: str,
+        name: Optional[str] = None,
+        user_id: Optional[str] = None,
+        metadata: Optional[Dict] = None,
+        tags: Optional[List[str]] = None,
+    ):
+        try:
+            await self.data_layer.update_thread(
+                thread_id, name=name, user_id=user_id, metadata=metadata, tags=tags
+            )
+        finally:
+            self.invalidate(thread_id)
+            if user_id:
+                self.authors.invalidate(thread_id)
+
+    async def build_debug_url(self) -> str:
+        return await self.data_layer.build_debug_url()
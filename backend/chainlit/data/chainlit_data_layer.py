@@ -1,16 +1,23 @@
-import json
+import asyncio
+import re
+import time
 import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 import aiofiles
+import aiofiles.os
 import asyncpg  # type: ignore
 
 from chainlit.data.base import BaseDataLayer
-from chainlit.data.storage_clients.base import BaseStorageClient
+from chainlit.data.storage_clients.base import BaseStorageClient, file_chunks
 from chainlit.data.utils import queue_until_user_message
 from chainlit.element import ElementDict
 from chainlit.logger import logger
+from chainlit.metrics import metrics
+from chainlit.serialization import dumps, loads
 from chainlit.step import StepDict
 from chainlit.types import (
     Feedback,
@@ -20,6 +27,7 @@ from chainlit.types import (
     Pagination,
     ThreadDict,
     ThreadFilter,
+    ThreadStepsPage,
 )
 from chainlit.user import PersistedUser, User
 
@@ -29,6 +37,258 @@ if TYPE_CHECKING:
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Step dict fields persisted in the "Step" table, by column
+STEP_COLUMNS = {
+    "parentId": "parentId",
+    "threadId": "threadId",
+    "name": "name",
+    "type": "type",
+    "input": "input",
+    "output": "output",
+    "metadata": "metadata",
+    "showInput": "showInput",
+    "isError": "isError",
+}
+
+THREAD_INSERT_QUERY = """
+INSERT INTO "Thread" (id, metadata) VALUES ($1, '{}')
+ON CONFLICT (id) DO NOTHING
+"""
+
+# Steps holding the messages of a thread
+MESSAGE_TYPES = ("user_message", "assistant_message")
+MESSAGE_STEP_TYPES = "('user_message', 'assistant_message')"
+
+# Last activity of a thread, bumped when its messages are written
+THREAD_ACTIVITY_QUERY = """
+UPDATE "Thread" SET "updatedAt" = $2
+WHERE id = $1 AND ("updatedAt" IS NULL OR "updatedAt" < $2)
+"""
+
+# Threads created before their activity was tracked fall back to their creation
+THREAD_ACTIVITY = 'COALESCE(t."updatedAt", t."createdAt")'
+
+# Index of the thread list of a user, from the most recently active thread
+THREAD_ACTIVITY_INDEX = (
+    "Thread_userId_activity_idx",
+    'ON "Thread" ("userId", COALESCE("updatedAt", "createdAt") DESC, id DESC)',
+)
+
+# Whether an index exists and can be used, NULL if it does not exist
+INDEX_VALID_QUERY = """
+SELECT i.indisvalid FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE c.relname = $1 AND pg_table_is_visible(c.oid)
+"""
+
+# Placeholder for a step not created yet (e.g. the parent of a step)
+STEP_PLACEHOLDER_QUERY = """
+INSERT INTO "Step" (
+    id, "threadId", metadata, type, "startTime", "endTime", "showInput", "isError"
+) VALUES ($1, $2, '{}', 'run', $3, $3, 'json', false)
+ON CONFLICT (id) DO NOTHING
+"""
+
+ELEMENT_UPSERT_QUERY = """
+INSERT INTO "Element" (
+    id, "threadId", "stepId", metadata, mime, name, "objectKey", url,
+    "chainlitKey", display, size, language, page, props
+) VALUES (
+    $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14
+)
+ON CONFLICT (id) DO UPDATE SET
+    props = EXCLUDED.props
+"""
+
+# Messages searched by the full-text search, along with the thread names
+SEARCHED_STEP_TYPES = MESSAGE_STEP_TYPES
+
+# Number of thread and step ids known to exist, per process
+KNOWN_IDS_MAXSIZE = 10000
+
+
+class KnownIds:
+    """
+    Ids of the threads and steps known to exist in the database, bounded to the
+    most recently used ones, with the id of their thread.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._ids: OrderedDict[str, Optional[str]] = OrderedDict()
+
+    def __contains__(self, id: str) -> bool:
+        if id in self._ids:
+            self._ids.move_to_end(id)
+            return True
+        return False
+
+    def add(self, id: str, thread_id: Optional[str]):
+        self._ids[id] = thread_id
+        self._ids.move_to_end(id)
+        while len(self._ids) > self.maxsize:
+            self._ids.popitem(last=False)
+
+    def discard(self, id: Optional[str]):
+        if id:
+            self._ids.pop(id, None)
+
+    def discard_thread(self, thread_id: str):
+        """Forget a thread and its steps."""
+        for id in [id for id, tid in self._ids.items() if tid == thread_id]:
+            del self._ids[id]
+
+
+def step_upsert_query(create_thread: bool, create_parent: bool) -> str:
+    """
+    Upsert a step in a single statement, creating its thread and a placeholder for
+    its parent step if requested and they do not exist yet. Messages bump the last
+    activity of their thread, other steps leave the thread row untouched.
+    """
+    ctes = [
+        f"""activity AS (
+            UPDATE "Thread" SET "updatedAt" = $9
+            WHERE id = $2 AND $8 IN {MESSAGE_STEP_TYPES}
+            AND ("updatedAt" IS NULL OR "updatedAt" < $9)
+        )"""
+    ]
+    if create_thread:
+        # Threads created by other steps fall back to their creation time
+        ctes.append(
+            f"""thread AS (
+            INSERT INTO "Thread" (id, metadata, "updatedAt") VALUES (
+                $2, '{{}}', CASE WHEN $8 IN {MESSAGE_STEP_TYPES} THEN $9 END
+            )
+            ON CONFLICT (id) DO NOTHING
+        )"""
+        )
+    if create_parent:
+        ctes.append(
+            """parent AS (
+            INSERT INTO "Step" (
+                id, "threadId", metadata, type, "startTime", "endTime",
+                "showInput", "isError"
+            ) VALUES ($3, $2, '{}', 'run', $9, $9, 'json', false)
+            ON CONFLICT (id) DO NOTHING
+        )"""
+        )
+
+    query = f"WITH {', '.join(ctes)}"
+    return (
+        query
+        + """
+        INSERT INTO "Step" (
+            id, "threadId", "parentId", input, metadata, name, output,
+            type, "startTime", "endTime", "showInput", "isError"
+        ) VALUES (
+            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12
+        )
+        ON CONFLICT (id) DO UPDATE SET
+            "parentId" = COALESCE(EXCLUDED."parentId", "Step"."parentId"),
+            input = COALESCE(EXCLUDED.input, "Step".input),
+            metadata = CASE 
+                WHEN EXCLUDED.metadata <> '{}' THEN EXCLUDED.metadata 
+                ELSE "Step".metadata 
+            END,
+            name = COALESCE(EXCLUDED.name, "Step".name),
+            output = COALESCE(EXCLUDED.output, "Step".output),
+            type = CASE 
+                WHEN EXCLUDED.type = 'run' THEN "Step".type 
+                ELSE EXCLUDED.type 
+            END,
+            "threadId" = COALESCE(EXCLUDED."threadId", "Step"."threadId"),
+            "endTime" = COALESCE(EXCLUDED."endTime", "Step"."endTime"),
+            "startTime" = LEAST(EXCLUDED."startTime", "Step"."startTime"),
+            "showInput" = COALESCE(EXCLUDED."showInput", "Step"."showInput"),
+            "isError" = COALESCE(EXCLUDED."isError", "Step"."isError")
+        """
+    )
+
+
+def encode_thread_cursor(thread: Dict[str, Any]) -> str:
+    """Opaque cursor of a thread, for the keyset pagination of list_threads."""
+    activity = thread.get("updatedAt") or thread["createdAt"]
+    return f"{activity.isoformat()}|{thread['id']}"
+
+
+def decode_thread_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+    """Last activity and id of the thread of a cursor, None if it is invalid."""
+    updated_at, _, thread_id = cursor.partition("|")
+    if not thread_id:
+        return None
+    try:
+        return datetime.fromisoformat(updated_at), thread_id
+    except ValueError:
+        return None
+
+
+GET_USER_QUERY = """
+SELECT * FROM "User"
+WHERE identifier = $1
+"""
+
+GET_THREAD_QUERY = """
+SELECT t.*, u.identifier as user_identifier
+FROM "Thread" t
+LEFT JOIN "User" u ON t."userId" = u.id
+WHERE t.id = $1 AND t."deletedAt" IS NULL
+"""
+
+GET_THREAD_STEPS_QUERY = """
+SELECT  s.*,
+        f.id feedback_id,
+        f.value feedback_value,
+        f."comment" feedback_comment
+FROM "Step" s left join "Feedback" f on s.id = f."stepId"
+WHERE s."threadId" = $1
+ORDER BY "startTime"
+"""
+
+GET_THREAD_ELEMENTS_QUERY = """
+SELECT * FROM "Element"
+WHERE "threadId" = $1
+"""
+
+# Ancestors of steps, for the windows of steps to be nested in their parents
+GET_STEPS_ANCESTORS_QUERY = """
+WITH RECURSIVE ancestors AS (
+    SELECT id, "parentId" FROM "Step" WHERE id = ANY($1)
+    UNION
+    SELECT s.id, s."parentId" FROM "Step" s JOIN ancestors a ON s.id = a."parentId"
+)
+SELECT  s.*,
+        f.id feedback_id,
+        f.value feedback_value,
+        f."comment" feedback_comment
+FROM "Step" s left join "Feedback" f on s.id = f."stepId"
+WHERE s.id IN (SELECT id FROM ancestors) AND s.id <> ALL($2)
+"""
+
+# Queries prepared once per connection
+HOT_QUERIES = [
+    GET_USER_QUERY,
+    GET_THREAD_QUERY,
+    GET_THREAD_STEPS_QUERY,
+    GET_THREAD_ELEMENTS_QUERY,
+    *(
+        step_upsert_query(create_thread, create_parent)
+        for create_thread in (False, True)
+        for create_parent in (False, True)
+    ),
+]
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Connection keeping the statements prepared when it was opened."""
+
+    __slots__ = ("prepared_statements",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[
+            str, asyncpg.prepared_stmt.PreparedStatement
+        ] = {}
+
 
 class ChainlitDataLayer(BaseDataLayer):
     def __init__(
@@ -36,15 +296,160 @@ class ChainlitDataLayer(BaseDataLayer):
         database_url: str,
         storage_client: Optional[BaseStorageClient] = None,
         show_logger: bool = False,
+        pool_min_size: int = 10,
+        pool_max_size: int = 10,
+        command_timeout: Optional[float] = None,
+        statement_cache_size: int = 100,
+        full_text_search: Optional[str] = None,
+        create_indexes: bool = False,
     ):
+        if full_text_search and not re.fullmatch(r"\w+", full_text_search):
+            raise ValueError(f"Invalid text search configuration: {full_text_search!r}")
+
         self.database_url = database_url
         self.pool: Optional[asyncpg.Pool] = None
         self.storage_client = storage_client
         self.show_logger = show_logger
+        self.known_ids = KnownIds(KNOWN_IDS_MAXSIZE)
+
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.command_timeout = command_timeout
+        # 0 disables prepared statements (e.g. behind PgBouncer in transaction mode)
+        self.statement_cache_size = statement_cache_size
+        self._connect_lock = asyncio.Lock()
+        self._waiting = 0
+        # Text search configuration (e.g. "english", "simple") of the full-text
+        # search of the threads, None to search the thread names with ILIKE
+        self.full_text_search = full_text_search
+        # Create the missing indexes of the thread list and search on connect, when
+        # they are not managed by the database migrations
+        self.create_indexes = create_indexes
 
     async def connect(self):
+        async with self._connect_lock:
+            if self.pool:
+                return
+
+            self.pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=self.pool_min_size,
+                max_size=self.pool_max_size,
+                command_timeout=self.command_timeout,
+                statement_cache_size=self.statement_cache_size,
+                connection_class=PreparedConnection,
+                init=self._prepare_statements,
+            )
+
+            if self.create_indexes:
+                try:
+                    await self.create_thread_indexes()
+                    if self.full_text_search:
+                        await self.create_search_indexes()
+                except Exception as e:
+                    logger.error(f"Failed to create the thread indexes: {e!s}")
+
+        pool = self.pool
+        metrics.register_gauge("database.pool.size", pool.get_size)
+        metrics.register_gauge(
+            "database.pool.in_use", lambda: pool.get_size() - pool.get_idle_size()
+        )
+        metrics.register_gauge("database.pool.waiting", lambda: self._waiting)
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    def _tsvector(self, column: str) -> str:
+        # Same expression as the search indexes, for them to be used
+        return f"to_tsvector('{self.full_text_search}', COALESCE({column}, ''))"
+
+    async def _create_index(self, name: str, definition: str):
+        """
+        Create an index concurrently unless a valid one exists, replacing the
+        invalid index left behind by a failed build. Only one process builds a
+        given index at a time, the others skip it.
+        """
+        async with self.acquire() as connection:
+            if not await connection.fetchval(
+                "SELECT pg_try_advisory_lock(hashtext($1))", name
+            ):
+                return
+            try:
+                valid = await connection.fetchval(INDEX_VALID_QUERY, name)
+                if valid:
+                    return
+                if valid is not None:
+                    await connection.execute(f'DROP INDEX CONCURRENTLY "{name}"')
+                await connection.execute(
+                    f'CREATE INDEX CONCURRENTLY "{name}" {definition}'
+                )
+            finally:
+                await connection.execute(
+                    "SELECT pg_advisory_unlock(hashtext($1))", name
+                )
+
+    async def create_thread_indexes(self):
+        """
+        Create the index of the thread list, for list_threads to read a page of
+        threads with an index range scan. Prefer running it from the database
+        migrations, see THREAD_ACTIVITY_INDEX.
+        """
+        await self._create_index(*THREAD_ACTIVITY_INDEX)
+
+    def search_indexes(self) -> List[Tuple[str, str]]:
+        """Names and definitions of the GIN indexes of the full-text search."""
+        config = self.full_text_search
+        return [
+            (
+                f"Thread_name_{config}_search_idx",
+                f'ON "Thread" USING GIN ({self._tsvector("name")})',
+            ),
+            (
+                f"Step_output_{config}_search_idx",
+                f'ON "Step" USING GIN ({self._tsvector("output")}) '
+                f"WHERE type IN {SEARCHED_STEP_TYPES}",
+            ),
+        ]
+
+    async def create_search_indexes(self):
+        """
+        Create the GIN indexes of the full-text search. Prefer running them from
+        the database migrations, see search_indexes.
+
+        They are expression indexes over the thread names and the message outputs,
+        kept up to date by Postgres as threads and steps are written.
+        """
+        for index in self.search_indexes():
+            await self._create_index(*index)
+
+    async def _prepare_statements(self, connection: PreparedConnection):
+        """Prepare the most frequent queries once per connection."""
+        if not self.statement_cache_size:
+            return
+        for query in HOT_QUERIES:
+            connection.prepared_statements[query] = await connection.prepare(query)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PreparedConnection]:
+        """Acquire a connection of the pool, recording the time spent waiting for it."""
         if not self.pool:
-            self.pool = await asyncpg.create_pool(self.database_url)
+            await self.connect()
+        assert self.pool
+
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            connection = await self.pool.acquire()
+        finally:
+            self._waiting -= 1
+        metrics.observe("database.pool.acquire_seconds", time.monotonic() - start)
+
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
 
     async def get_current_timestamp(self) -> datetime:
         return datetime.now()
@@ -52,26 +457,38 @@ class ChainlitDataLayer(BaseDataLayer):
     async def execute_query(
         self, query: str, params: Union[Dict, None] = None
     ) -> List[Dict[str, Any]]:
-        if not self.pool:
-            await self.connect()
-
-        async with self.pool.acquire() as connection:  # type: ignore
+        async with self.acquire() as connection:
             try:
-                if params:
-                    records = await connection.fetch(query, *params.values())
+                args = params.values() if params else ()
+                statement = connection.prepared_statements.get(query)
+                if statement:
+                    try:
+                        records = await statement.fetch(*args)
+                    except asyncpg.InvalidCachedStatementError:
+                        # The schema changed, the statement must be prepared again
+                        connection.prepared_statements.pop(query, None)
+                        records = await connection.fetch(query, *args)
                 else:
-                    records = await connection.fetch(query)
+                    records = await connection.fetch(query, *args)
                 return [dict(record) for record in records]
             except Exception as e:
                 logger.error(f"Database error: {e!s}")
                 raise
 
+    async def execute_many(self, statements: List[Tuple[str, List[Tuple]]]):
+        """Run statements, each with a list of parameter sets, in one transaction."""
+        async with self.acquire() as connection:
+            try:
+                async with connection.transaction():
+                    for query, args in statements:
+                        if args:
+                            await connection.executemany(query, args)
+            except Exception as e:
+                logger.error(f"Database error: {e!s}")
+                raise
+
     async def get_user(self, identifier: str) -> Optional[PersistedUser]:
-        query = """
-        SELECT * FROM "User" 
-        WHERE identifier = $1
-        """
-        result = await self.execute_query(query, {"identifier": identifier})
+        result = await self.execute_query(GET_USER_QUERY, {"identifier": identifier})
         if not result or len(result) == 0:
             return None
         row = result[0]
@@ -80,7 +497,7 @@ class ChainlitDataLayer(BaseDataLayer):
             id=str(row.get("id")),
             identifier=str(row.get("identifier")),
             createdAt=row.get("createdAt").isoformat(),  # type: ignore
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=loads(row.get("metadata", "{}")),
         )
 
     async def create_user(self, user: User) -> Optional[PersistedUser]:
@@ -95,7 +512,7 @@ class ChainlitDataLayer(BaseDataLayer):
         params = {
             "id": str(uuid.uuid4()),
             "identifier": user.identifier,
-            "metadata": json.dumps(user.metadata),
+            "metadata": dumps(user.metadata),
             "created_at": now,
             "updated_at": now,
         }
@@ -106,7 +523,7 @@ class ChainlitDataLayer(BaseDataLayer):
             id=str(row.get("id")),
             identifier=str(row.get("identifier")),
             createdAt=row.get("createdAt").isoformat(),  # type: ignore
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=loads(row.get("metadata", "{}")),
         )
 
     async def delete_feedback(self, feedback_id: str) -> bool:
@@ -146,13 +563,14 @@ class ChainlitDataLayer(BaseDataLayer):
         if not element.for_id:
             return
 
-        if element.thread_id:
+        if element.thread_id and element.thread_id not in self.known_ids:
             query = 'SELECT id FROM "Thread" WHERE id = $1'
             results = await self.execute_query(query, {"thread_id": element.thread_id})
             if not results:
                 await self.update_thread(thread_id=element.thread_id)
+            self.known_ids.add(element.thread_id, element.thread_id)
 
-        if element.for_id:
+        if element.for_id and element.for_id not in self.known_ids:
             query = 'SELECT id FROM "Step" WHERE id = $1'
             results = await self.execute_query(query, {"step_id": element.for_id})
             if not results:
@@ -165,14 +583,64 @@ class ChainlitDataLayer(BaseDataLayer):
                         "end_time": await self.get_current_timestamp(),
                     }
                 )
-        content: Optional[Union[bytes, str]] = None
+            self.known_ids.add(element.for_id, element.thread_id)
 
-        if element.path:
-            async with aiofiles.open(element.path, "rb") as f:
-                content = await f.read()
-        elif element.content:
-            content = element.content
-        elif not element.url:
+        params = await self._upload_element(element)
+        await self.execute_query(ELEMENT_UPSERT_QUERY, params)
+
+    @queue_until_user_message()
+    async def create_elements(self, elements: List["Element"]):
+        if not self.storage_client:
+            logger.warn(
+                "Data Layer: create_elements error. No cloud storage configured!"
+            )
+            return
+
+        elements = [element for element in elements if element.for_id]
+        if not elements:
+            return
+
+        uploads = await asyncio.gather(
+            *(self._upload_element(element) for element in elements),
+            return_exceptions=True,
+        )
+        rows = []
+        for element, params in zip(elements, uploads):
+            if isinstance(params, BaseException):
+                logger.error(f"Failed to upload element {element.id}: {params!s}")
+            else:
+                rows.append(tuple(params.values()))
+        if not rows:
+            return
+
+        # Threads and steps the elements belong to, if not known to exist
+        now = await self.get_current_timestamp()
+        threads: Dict[str, None] = {}
+        steps: Dict[str, Tuple] = {}
+        for element in elements:
+            if element.thread_id and element.thread_id not in self.known_ids:
+                threads[element.thread_id] = None
+            if element.for_id not in self.known_ids:
+                steps[element.for_id] = (element.for_id, element.thread_id, now)
+
+        await self.execute_many(
+            [
+                (THREAD_INSERT_QUERY, [(thread_id,) for thread_id in threads]),
+                (STEP_PLACEHOLDER_QUERY, list(steps.values())),
+                (ELEMENT_UPSERT_QUERY, rows),
+            ]
+        )
+
+        for element in elements:
+            if element.thread_id:
+                self.known_ids.add(element.thread_id, element.thread_id)
+            self.known_ids.add(element.for_id, element.thread_id)  # type: ignore[arg-type]
+
+    async def _upload_element(self, element: "Element") -> Dict[str, Any]:
+        """Upload the content of an element, return its row parameters."""
+        assert self.storage_client
+
+        if not (element.path or element.content or element.url):
             raise ValueError("Element url, path or content must be provided")
 
         if element.thread_id:
@@ -180,29 +648,33 @@ class ChainlitDataLayer(BaseDataLayer):
         else:
             path = f"files/{element.id}"
 
-        if content is not None:
-            await self.storage_client.upload_file(
+        mime = element.mime or "application/octet-stream"
+        uploaded = None
+        if element.path:
+            # Streamed, large files are not loaded in memory
+            uploaded = await self.storage_client.upload_stream(
                 object_key=path,
-                data=content,
-                mime=element.mime or "application/octet-stream",
+                stream=file_chunks(element.path),
+                mime=mime,
                 overwrite=True,
+                size_hint=await aiofiles.os.path.getsize(element.path),
             )
+        elif element.content:
+            uploaded = await self.storage_client.upload_file(
+                object_key=path,
+                data=element.content,
+                mime=mime,
+                overwrite=True,
+            )
+        if uploaded is not None and not uploaded:
+            # The storage clients log their errors and return an empty dict
+            raise Exception(f"Failed to upload the content of element {element.id}")
 
-        query = """
-        INSERT INTO "Element" (
-            id, "threadId", "stepId", metadata, mime, name, "objectKey", url,
-            "chainlitKey", display, size, language, page, props
-        ) VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14
-        )
-        ON CONFLICT (id) DO UPDATE SET
-            props = EXCLUDED.props
-        """
-        params = {
+        return {
             "id": element.id,
             "thread_id": element.thread_id,
             "step_id": element.for_id,
-            "metadata": json.dumps(
+            "metadata": dumps(
                 {
                     "size": element.size,
                     "language": element.language,
@@ -220,9 +692,8 @@ class ChainlitDataLayer(BaseDataLayer):
             "size": element.size,
             "language": element.language,
             "page": getattr(element, "page", None),
-            "props": json.dumps(getattr(element, "props", {})),
+            "props": dumps(getattr(element, "props", {})),
         }
-        await self.execute_query(query, params)
 
     async def get_element(
         self, thread_id: str, element_id: str
@@ -239,7 +710,7 @@ class ChainlitDataLayer(BaseDataLayer):
             return None
 
         row = results[0]
-        metadata = json.loads(row.get("metadata", "{}"))
+        metadata = loads(row.get("metadata", "{}"))
 
         return ElementDict(
             id=str(row["id"]),
@@ -257,7 +728,7 @@ class ChainlitDataLayer(BaseDataLayer):
             page=row["page"],
             autoPlay=row.get("autoPlay"),
             playerConfig=row.get("playerConfig"),
-            props=json.loads(row.get("props", "{}")),
+            props=loads(row.get("props", "{}")),
         )
 
     @queue_until_user_message()
@@ -287,67 +758,111 @@ class ChainlitDataLayer(BaseDataLayer):
 
     @queue_until_user_message()
     async def create_step(self, step_dict: StepDict):
-        if step_dict.get("threadId"):
-            thread_query = 'SELECT id FROM "Thread" WHERE id = $1'
-            thread_results = await self.execute_query(
-                thread_query, {"thread_id": step_dict["threadId"]}
+        thread_id = step_dict.get("threadId")
+        parent_id = step_dict.get("parentId")
+
+        params = await self._step_params(step_dict)
+
+        # The thread and parent step are created along with the step, unless they
+        # are known to exist
+        create_thread = bool(thread_id) and thread_id not in self.known_ids
+        create_parent = bool(parent_id) and parent_id not in self.known_ids
+        try:
+            await self.execute_query(
+                step_upsert_query(create_thread, create_parent), params
             )
-            if not thread_results:
-                await self.update_thread(thread_id=step_dict["threadId"])
-
-        if step_dict.get("parentId"):
-            parent_query = 'SELECT id FROM "Step" WHERE id = $1'
-            parent_results = await self.execute_query(
-                parent_query, {"parent_id": step_dict["parentId"]}
+        except asyncpg.ForeignKeyViolationError:
+            if create_thread == bool(thread_id) and create_parent == bool(parent_id):
+                raise
+            # Deleted since they were cached, create them again
+            self.known_ids.discard(thread_id)
+            self.known_ids.discard(parent_id)
+            await self.execute_query(
+                step_upsert_query(bool(thread_id), bool(parent_id)), params
             )
-            if not parent_results:
-                await self.create_step(
-                    {
-                        "id": step_dict["parentId"],
-                        "metadata": {},
-                        "type": "run",
-                        "createdAt": step_dict.get("createdAt"),
-                    }
-                )
 
-        query = """
-        INSERT INTO "Step" (
-            id, "threadId", "parentId", input, metadata, name, output,
-            type, "startTime", "endTime", "showInput", "isError"
-        ) VALUES (
-            $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12
-        )
-        ON CONFLICT (id) DO UPDATE SET
-            "parentId" = COALESCE(EXCLUDED."parentId", "Step"."parentId"),
-            input = COALESCE(EXCLUDED.input, "Step".input),
-            metadata = CASE 
-                WHEN EXCLUDED.metadata <> '{}' THEN EXCLUDED.metadata 
-                ELSE "Step".metadata 
-            END,
-            name = COALESCE(EXCLUDED.name, "Step".name),
-            output = COALESCE(EXCLUDED.output, "Step".output),
-            type = CASE 
-                WHEN EXCLUDED.type = 'run' THEN "Step".type 
-                ELSE EXCLUDED.type 
-            END,
-            "threadId" = COALESCE(EXCLUDED."threadId", "Step"."threadId"),
-            "endTime" = COALESCE(EXCLUDED."endTime", "Step"."endTime"),
-            "startTime" = LEAST(EXCLUDED."startTime", "Step"."startTime"),
-            "showInput" = COALESCE(EXCLUDED."showInput", "Step"."showInput"),
-            "isError" = COALESCE(EXCLUDED."isError", "Step"."isError")
+        if thread_id:
+            self.known_ids.add(thread_id, thread_id)
+        if parent_id:
+            self.known_ids.add(parent_id, thread_id)
+        self.known_ids.add(step_dict["id"], thread_id)
+
+    @queue_until_user_message()
+    async def create_steps(self, step_dicts: List[StepDict]):
+        if not step_dicts:
+            return
+
+        params = [await self._step_params(step_dict) for step_dict in step_dicts]
+        statements = self._create_steps_statements(params, True)
+        try:
+            await self.execute_many(statements)
+        except asyncpg.ForeignKeyViolationError:
+            # Some of the cached ids were deleted since, create them again
+            all_statements = self._create_steps_statements(params, False)
+            if all_statements == statements:
+                raise
+            await self.execute_many(all_statements)
+
+        for step_params in params:
+            thread_id = step_params["thread_id"]
+            if thread_id:
+                self.known_ids.add(thread_id, thread_id)
+            self.known_ids.add(step_params["id"], thread_id)
+
+    def _create_steps_statements(
+        self, params: List[Dict[str, Any]], skip_known_ids: bool
+    ) -> List[Tuple[str, List[Tuple]]]:
         """
+        Create the threads and parents of the steps if needed, then the steps, and
+        bump the last activity of the threads of the messages, once per thread.
+        """
+        threads: Dict[str, None] = {}
+        parents: Dict[str, Tuple] = {}
+        activity: Dict[str, datetime] = {}
+        created = set()
+        for step_params in params:
+            thread_id = step_params["thread_id"]
+            parent_id = step_params["parent_id"]
+            if thread_id and step_params["type"] in MESSAGE_TYPES:
+                activity[thread_id] = max(
+                    activity.get(thread_id, step_params["start_time"]),
+                    step_params["start_time"],
+                )
+            if thread_id and not (skip_known_ids and thread_id in self.known_ids):
+                threads[thread_id] = None
+            if (
+                parent_id
+                and parent_id not in created
+                and not (skip_known_ids and parent_id in self.known_ids)
+            ):
+                parents[parent_id] = (parent_id, thread_id, step_params["start_time"])
+            created.add(step_params["id"])
+
+        return [
+            (THREAD_INSERT_QUERY, [(thread_id,) for thread_id in threads]),
+            (STEP_PLACEHOLDER_QUERY, list(parents.values())),
+            (
+                step_upsert_query(False, False),
+                [tuple(step_params.values()) for step_params in params],
+            ),
+            (THREAD_ACTIVITY_QUERY, list(activity.items())),
+        ]
 
-        timestamp = await self.get_current_timestamp()
+    async def _step_timestamp(self, step_dict: StepDict) -> datetime:
         created_at = step_dict.get("createdAt")
         if created_at:
-            timestamp = datetime.strptime(created_at, ISO_FORMAT)
+            return datetime.strptime(created_at, ISO_FORMAT)
+        return await self.get_current_timestamp()
 
-        params = {
+    async def _step_params(self, step_dict: StepDict) -> Dict[str, Any]:
+        timestamp = await self._step_timestamp(step_dict)
+
+        return {
             "id": step_dict["id"],
             "thread_id": step_dict.get("threadId"),
             "parent_id": step_dict.get("parentId"),
             "input": step_dict.get("input"),
-            "metadata": json.dumps(step_dict.get("metadata", {})),
+            "metadata": dumps(step_dict.get("metadata", {})),
             "name": step_dict.get("name"),
             "output": step_dict.get("output"),
             "type": step_dict["type"],
@@ -356,12 +871,62 @@ class ChainlitDataLayer(BaseDataLayer):
             "show_input": str(step_dict.get("showInput", "json")),
             "is_error": step_dict.get("isError", False),
         }
-        await self.execute_query(query, params)
 
     @queue_until_user_message()
     async def update_step(self, step_dict: StepDict):
         await self.create_step(step_dict)
 
+    @queue_until_user_message()
+    async def patch_step(self, step_dict: StepDict, changed_fields: List[str]):
+        if not any(field in STEP_COLUMNS for field in changed_fields):
+            # Nothing persisted by this data layer changed
+            return
+
+        params: Dict[str, Any] = {
+            "id": step_dict["id"],
+            "timestamp": await self._step_timestamp(step_dict),
+        }
+        # Same merge as step_upsert_query: missing values, empty metadata and the
+        # "run" placeholder type keep the stored value
+        sets = []
+        for field in changed_fields:
+            column = STEP_COLUMNS.get(field)
+            value = step_dict.get(field)
+            if field == "metadata":
+                value = dumps(value) if value else None
+            elif field == "showInput" and value is not None:
+                value = str(value)
+            elif field == "type" and value == "run":
+                value = None
+            if not column or value is None:
+                continue
+            params[field] = value
+            sets.append(f'"{column}" = ${len(params)}')
+        if not sets:
+            # Still look the step up, to create it if it does not exist yet
+            sets.append('"id" = "id"')
+
+        query = f"""
+        WITH patched AS (
+            UPDATE "Step" SET {", ".join(sets)}
+            WHERE id = $1
+            RETURNING id, "threadId", type
+        ), activity AS (
+            UPDATE "Thread" SET "updatedAt" = $2
+            FROM patched
+            WHERE "Thread".id = patched."threadId"
+            AND patched.type IN {MESSAGE_STEP_TYPES}
+            AND ("Thread"."updatedAt" IS NULL OR "Thread"."updatedAt" < $2)
+        )
+        SELECT id FROM patched
+        """
+        results = await self.execute_query(query, params)
+        if not results:
+            # The step does not exist yet
+            await self.create_step(step_dict)
+        else:
+            self.known_ids.add(step_dict["id"], step_dict.get("threadId"))
+
     @queue_until_user_message()
     async def delete_step(self, step_id: str):
         # Delete associated elements and feedbacks first
@@ -375,6 +940,7 @@ class ChainlitDataLayer(BaseDataLayer):
         await self.execute_query(
             'DELETE FROM "Step" WHERE id = $1', {"step_id": step_id}
         )
+        self.known_ids.discard(step_id)
 
     async def get_thread_author(self, thread_id: str) -> str:
         query = """
@@ -405,42 +971,87 @@ class ChainlitDataLayer(BaseDataLayer):
         await self.execute_query(
             'DELETE FROM "Thread" WHERE id = $1', {"thread_id": thread_id}
         )
+        self.known_ids.discard_thread(thread_id)
 
     async def list_threads(
         self, pagination: Pagination, filters: ThreadFilter
     ) -> PaginatedResponse[ThreadDict]:
-        query = """
-        SELECT 
-            t.*, 
-            u.identifier as user_identifier,
-            (SELECT COUNT(*) FROM "Thread" WHERE "userId" = t."userId") as total
-        FROM "Thread" t
-        LEFT JOIN "User" u ON t."userId" = u.id
-        WHERE t."deletedAt" IS NULL
-        """
         params: Dict[str, Any] = {}
         param_count = 1
-
-        if filters.search:
-            query += f" AND t.name ILIKE ${param_count}"
-            params["name"] = f"%{filters.search}%"
-            param_count += 1
+        user_filter = ""
 
         if filters.userId:
-            query += f' AND t."userId" = ${param_count}'
+            user_filter = f' AND t."userId" = ${param_count}'
             params["user_id"] = filters.userId
             param_count += 1
 
-        if pagination.cursor:
-            query += f' AND t."createdAt" < (SELECT "createdAt" FROM "Thread" WHERE id = ${param_count})'
-            params["cursor"] = pagination.cursor
+        # Columns of the keyset pagination, in descending order
+        keys = [THREAD_ACTIVITY, "t.id"]
+        if filters.search and self.full_text_search:
+            # Threads with a matching name or message, the most relevant first
+            name_vector = self._tsvector("t.name")
+            output_vector = self._tsvector("s.output")
+            query = f"""
+            WITH query AS (
+                SELECT websearch_to_tsquery('{self.full_text_search}', ${param_count}) AS q
+            ), ranked AS (
+                SELECT id, MAX(rank) AS rank FROM (
+                    SELECT t.id, ts_rank({name_vector}, query.q) AS rank
+                    FROM "Thread" t, query
+                    WHERE {name_vector} @@ query.q{user_filter}
+                    UNION ALL
+                    SELECT t.id, ts_rank({output_vector}, query.q) AS rank
+                    FROM "Step" s JOIN "Thread" t ON s."threadId" = t.id, query
+                    WHERE s.type IN {SEARCHED_STEP_TYPES}
+                    AND {output_vector} @@ query.q{user_filter}
+                ) matches
+                GROUP BY id
+            )
+            SELECT t.*, u.identifier as user_identifier
+            FROM ranked r
+            JOIN "Thread" t ON t.id = r.id
+            LEFT JOIN "User" u ON t."userId" = u.id
+            WHERE t."deletedAt" IS NULL
+            """
+            params["search"] = filters.search
             param_count += 1
-
-        query += f' ORDER BY t."createdAt" DESC LIMIT ${param_count}'
+            keys.insert(0, "r.rank")
+        else:
+            query = f"""
+            SELECT t.*, u.identifier as user_identifier
+            FROM "Thread" t
+            LEFT JOIN "User" u ON t."userId" = u.id
+            WHERE t."deletedAt" IS NULL{user_filter}
+            """
+            if filters.search:
+                query += f" AND t.name ILIKE ${param_count}"
+                params["name"] = f"%{filters.search}%"
+                param_count += 1
+
+        # Keyset pagination, from the most recently active (or relevant) threads
+        if pagination.cursor:
+            if cursor := decode_thread_cursor(pagination.cursor):
+                values = [f"${param_count}", f"${param_count + 1}"]
+                params["cursor_updated_at"], params["cursor_id"] = cursor
+                param_count += 2
+            else:
+                # Cursor of a previous version, the id of the last thread
+                values = [
+                    '(SELECT COALESCE("updatedAt", "createdAt") FROM "Thread"'
+                    f" WHERE id = ${param_count})",
+                    f"${param_count}",
+                ]
+                params["cursor"] = pagination.cursor
+                param_count += 1
+            if len(keys) > len(values):
+                values.insert(0, f"(SELECT rank FROM ranked WHERE id = {values[-1]})")
+            query += f" AND ({', '.join(keys)}) < ({', '.join(values)})"
+
+        order = ", ".join(f"{key} DESC" for key in keys)
+        query += f" ORDER BY {order} LIMIT ${param_count}"
         params["limit"] = pagination.first + 1
 
-        results = await self.execute_query(query, params)
-        threads = results
+        threads = await self.execute_query(query, params)
 
         has_next_page = len(threads) > pagination.first
         if has_next_page:
@@ -451,10 +1062,11 @@ class ChainlitDataLayer(BaseDataLayer):
             thread_dict = ThreadDict(
                 id=str(thread["id"]),
                 createdAt=thread["createdAt"].isoformat(),
+                updatedAt=(thread["updatedAt"] or thread["createdAt"]).isoformat(),
                 name=thread["name"],
                 userId=str(thread["userId"]) if thread["userId"] else None,
                 userIdentifier=thread["user_identifier"],
-                metadata=json.loads(thread["metadata"]),
+                metadata=loads(thread["metadata"]),
                 steps=[],
                 elements=[],
                 tags=[],
@@ -464,47 +1076,111 @@ class ChainlitDataLayer(BaseDataLayer):
         return PaginatedResponse(
             pageInfo=PageInfo(
                 hasNextPage=has_next_page,
-                startCursor=thread_dicts[0]["id"] if thread_dicts else None,
-                endCursor=thread_dicts[-1]["id"] if thread_dicts else None,
+                startCursor=encode_thread_cursor(threads[0]) if threads else None,
+                endCursor=encode_thread_cursor(threads[-1]) if threads else None,
             ),
             data=thread_dicts,
         )
 
     async def get_thread(self, thread_id: str) -> Optional[ThreadDict]:
-        query = """
-        SELECT t.*, u.identifier as user_identifier
-        FROM "Thread" t
-        LEFT JOIN "User" u ON t."userId" = u.id
-        WHERE t.id = $1 AND t."deletedAt" IS NULL
-        """
-        results = await self.execute_query(query, {"thread_id": thread_id})
+        results = await self.execute_query(GET_THREAD_QUERY, {"thread_id": thread_id})
 
         if not results:
             return None
 
-        thread = results[0]
+        thread = self._convert_thread_row_to_dict(results[0])
 
         # Get steps and related feedback
-        steps_query = """
-        SELECT  s.*, 
-                f.id feedback_id, 
-                f.value feedback_value, 
+        steps_results = await self.execute_query(
+            GET_THREAD_STEPS_QUERY, {"thread_id": thread_id}
+        )
+
+        # Get elements
+        elements_results = await self.execute_query(
+            GET_THREAD_ELEMENTS_QUERY, {"thread_id": thread_id}
+        )
+        await self._set_element_urls(elements_results)
+
+        thread["steps"] = [
+            self._convert_step_row_to_dict(step) for step in steps_results
+        ]
+        thread["elements"] = [
+            self._convert_element_row_to_dict(elem) for elem in elements_results
+        ]
+        return thread
+
+    async def get_thread_window(
+        self, thread_id: str, limit: int
+    ) -> Optional[ThreadDict]:
+        results = await self.execute_query(GET_THREAD_QUERY, {"thread_id": thread_id})
+
+        if not results:
+            return None
+
+        thread = self._convert_thread_row_to_dict(results[0])
+        page = await self.get_thread_steps(thread_id, limit=limit)
+        thread["steps"] = page["steps"]
+        thread["elements"] = page["elements"]
+        thread["stepsBefore"] = page["before"]
+        return thread
+
+    async def get_thread_steps(
+        self, thread_id: str, before: Optional[str] = None, limit: int = 100
+    ) -> ThreadStepsPage:
+        query = """
+        SELECT  s.*,
+                f.id feedback_id,
+                f.value feedback_value,
                 f."comment" feedback_comment
         FROM "Step" s left join "Feedback" f on s.id = f."stepId"
         WHERE s."threadId" = $1
-        ORDER BY "startTime"
         """
-        steps_results = await self.execute_query(steps_query, {"thread_id": thread_id})
+        params: Dict[str, Any] = {"thread_id": thread_id}
+        if before:
+            query += """ AND (s."startTime", s.id) < (
+                SELECT "startTime", id FROM "Step" WHERE id = $2
+            )"""
+            params["before"] = before
+        query += f' ORDER BY s."startTime" DESC, s.id DESC LIMIT ${len(params) + 1}'
+        params["limit"] = limit + 1
+
+        steps_results = await self.execute_query(query, params)
+        has_previous = len(steps_results) > limit
+        steps_results = steps_results[:limit]
+
+        # The steps the window is nested in, if not in it
+        ids = [step["id"] for step in steps_results]
+        missing_parents = list(
+            {step["parentId"] for step in steps_results if step["parentId"]} - set(ids)
+        )
+        if missing_parents:
+            steps_results += await self.execute_query(
+                GET_STEPS_ANCESTORS_QUERY,
+                {"parent_ids": missing_parents, "ids": ids},
+            )
+        steps_results.sort(key=lambda step: (step["startTime"], step["id"]))
 
-        # Get elements
         elements_query = """
-        SELECT * FROM "Element" 
-        WHERE "threadId" = $1
+        SELECT * FROM "Element"
+        WHERE "threadId" = $1 AND ("stepId" = ANY($2)
         """
+        # Elements not attached to a step come with the most recent steps
+        elements_query += ' OR "stepId" IS NULL)' if not before else ")"
         elements_results = await self.execute_query(
-            elements_query, {"thread_id": thread_id}
+            elements_query,
+            {"thread_id": thread_id, "ids": [step["id"] for step in steps_results]},
+        )
+        await self._set_element_urls(elements_results)
+
+        return ThreadStepsPage(
+            steps=[self._convert_step_row_to_dict(step) for step in steps_results],
+            elements=[
+                self._convert_element_row_to_dict(elem) for elem in elements_results
+            ],
+            before=str(ids[-1]) if has_previous else None,
         )
 
+    async def _set_element_urls(self, elements_results: List[Dict[str, Any]]):
         if self.storage_client is not None:
             for elem in elements_results:
                 if not elem["url"] and elem["objectKey"]:
@@ -512,20 +1188,6 @@ class ChainlitDataLayer(BaseDataLayer):
                         object_key=elem["objectKey"],
                     )
 
-        return ThreadDict(
-            id=str(thread["id"]),
-            createdAt=thread["createdAt"].isoformat(),
-            name=thread["name"],
-            userId=str(thread["userId"]) if thread["userId"] else None,
-            userIdentifier=thread["user_identifier"],
-            metadata=json.loads(thread["metadata"]),
-            steps=[self._convert_step_row_to_dict(step) for step in steps_results],
-            elements=[
-                self._convert_element_row_to_dict(elem) for elem in elements_results
-            ],
-            tags=[],
-        )
-
     async def update_thread(
         self,
         thread_id: str,
@@ -548,7 +1210,7 @@ class ChainlitDataLayer(BaseDataLayer):
             "name": thread_name,
             "userId": user_id,
             "tags": tags,
-            "metadata": json.dumps(metadata or {}),
+            "metadata": dumps(metadata or {}),
         }
 
         # Remove None values
@@ -589,7 +1251,7 @@ class ChainlitDataLayer(BaseDataLayer):
             type=row["type"],
             input=row.get("input", {}),
             output=row.get("output", {}),
-            metadata=json.loads(row.get("metadata", "{}")),
+            metadata=loads(row.get("metadata", "{}")),
             createdAt=row["createdAt"].isoformat() if row.get("createdAt") else None,
             start=row["startTime"].isoformat() if row.get("startTime") else None,
             showInput=row.get("showInput"),
@@ -598,8 +1260,21 @@ class ChainlitDataLayer(BaseDataLayer):
             feedback=self._extract_feedback_dict_from_step_row(row),
         )
 
+    def _convert_thread_row_to_dict(self, row: Dict) -> ThreadDict:
+        return ThreadDict(
+            id=str(row["id"]),
+            createdAt=row["createdAt"].isoformat(),
+            name=row["name"],
+            userId=str(row["userId"]) if row["userId"] else None,
+            userIdentifier=row["user_identifier"],
+            metadata=loads(row["metadata"]),
+            steps=[],
+            elements=[],
+            tags=[],
+        )
+
     def _convert_element_row_to_dict(self, row: Dict) -> ElementDict:
-        metadata = json.loads(row.get("metadata", "{}"))
+        metadata = loads(row.get("metadata", "{}"))
         return ElementDict(
             id=str(row["id"]),
             threadId=str(row["threadId"]) if row.get("threadId") else None,
@@ -616,7 +1291,7 @@ class ChainlitDataLayer(BaseDataLayer):
             page=row["page"],
             autoPlay=row.get("autoPlay"),
             playerConfig=row.get("playerConfig"),
-            props=json.loads(row.get("props") or "{}"),
+            props=loads(row.get("props") or "{}"),
         )
 
     async def build_debug_url(self) -> str:
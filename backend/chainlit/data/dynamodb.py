@@ -1,20 +1,23 @@
 import asyncio
+import functools
 import json
 import logging
 import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Union
 
-import aiofiles
+import aiofiles.os
 import aiohttp
 import boto3  # type: ignore
 from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
 
 from chainlit.context import context
 from chainlit.data.base import BaseDataLayer
-from chainlit.data.storage_clients.base import BaseStorageClient
+from chainlit.data.storage_clients.base import BaseStorageClient, file_chunks
 from chainlit.data.utils import queue_until_user_message
 from chainlit.element import ElementDict
 from chainlit.logger import logger
@@ -38,28 +41,111 @@ if TYPE_CHECKING:
 _logger = logger.getChild("DynamoDB")
 _logger.setLevel(logging.WARNING)
 
+# Maximum number of requests of a BatchWriteItem call
+BATCH_WRITE_SIZE = 25
+
 
 class DynamoDBDataLayer(BaseDataLayer):
+    """
+    Data layer persisting the threads in a DynamoDB table, one partition per thread.
+
+    boto3 clients are synchronous, calls are made by a pool of `max_workers` threads
+    so that they do not block the event loop. Pass `endpoint_url` (or set
+    `AWS_ENDPOINT_URL_DYNAMODB`) to use a local DynamoDB.
+    """
+
     def __init__(
         self,
         table_name: str,
         client: Optional["DynamoDBClient"] = None,
         storage_provider: Optional[BaseStorageClient] = None,
         user_thread_limit: int = 10,
+        max_workers: int = 10,
+        endpoint_url: Optional[str] = None,
     ):
         if client:
             self.client = client
         else:
             region_name = os.environ.get("AWS_REGION", "us-east-1")
-            self.client = boto3.client("dynamodb", region_name=region_name)  # type: ignore
+            self.client = boto3.client(  # type: ignore
+                "dynamodb",
+                region_name=region_name,
+                endpoint_url=endpoint_url,
+                # One connection per worker
+                config=Config(max_pool_connections=max_workers),
+            )
 
         self.table_name = table_name
         self.storage_provider = storage_provider
         self.user_thread_limit = user_thread_limit
 
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="chainlit-dynamodb"
+        )
         self._type_deserializer = TypeDeserializer()
         self._type_serializer = TypeSerializer()
 
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+    async def _call(self, method: str, **kwargs) -> Dict[str, Any]:
+        """Call a method of the client in the executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(getattr(self.client, method), **kwargs)
+        )
+
+    def _sync_query(self, **kwargs) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        while True:
+            response = self.client.query(TableName=self.table_name, **kwargs)
+            items.extend(map(self._deserialize_item, response["Items"]))
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    async def _query(self, **kwargs) -> List[Dict[str, Any]]:
+        """Get all the pages of a query, deserialized in the executor."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(self._sync_query, **kwargs)
+        )
+
+    def _thread_query(self, thread_id: str, prefix: Optional[str] = None):
+        query: Dict[str, Any] = {
+            "KeyConditionExpression": "#pk = :pk",
+            "ExpressionAttributeNames": {"#pk": "PK"},
+            "ExpressionAttributeValues": {":pk": {"S": f"THREAD#{thread_id}"}},
+        }
+        if prefix:
+            query["KeyConditionExpression"] += " AND begins_with(#sk, :prefix)"
+            query["ExpressionAttributeNames"]["#sk"] = "SK"
+            query["ExpressionAttributeValues"][":prefix"] = {"S": prefix}
+        return query
+
+    async def _write_batch(self, requests: List[Dict[str, Any]]):
+        response = await self._call(
+            "batch_write_item", RequestItems={self.table_name: requests}
+        )
+
+        backoff_time = 1
+        while response.get("UnprocessedItems"):
+            backoff_time *= 2
+            # Cap the backoff time at 32 seconds & add jitter
+            delay = min(backoff_time, 32) + random.uniform(0, 1)
+            await asyncio.sleep(delay)
+
+            response = await self._call(
+                "batch_write_item", RequestItems=response["UnprocessedItems"]
+            )
+
+    async def _batch_write(self, requests: List[Dict[str, Any]]):
+        """Make put and delete requests with concurrent BatchWriteItem calls."""
+        await asyncio.gather(
+            *(
+                self._write_batch(requests[i : i + BATCH_WRITE_SIZE])
+                for i in range(0, len(requests), BATCH_WRITE_SIZE)
+            )
+        )
+
     def _get_current_timestamp(self) -> str:
         return datetime.now().isoformat() + "Z"
 
@@ -74,7 +160,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             for key, value in item.items()
         }
 
-    def _update_item(self, key: Dict[str, Any], updates: Dict[str, Any]):
+    async def _update_item(self, key: Dict[str, Any], updates: Dict[str, Any]):
         update_expr: List[str] = []
         expression_attribute_names = {}
         expression_attribute_values = {}
@@ -88,7 +174,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             expression_attribute_names[k] = attr
             expression_attribute_values[v] = value
 
-        self.client.update_item(
+        await self._call(
+            "update_item",
             TableName=self.table_name,
             Key=self._serialize_item(key),
             UpdateExpression="SET " + ", ".join(update_expr),
@@ -103,7 +190,8 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def get_user(self, identifier: str) -> Optional["PersistedUser"]:
         _logger.info("DynamoDB: get_user identifier=%s", identifier)
 
-        response = self.client.get_item(
+        response = await self._call(
+            "get_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"USER#{identifier}"},
@@ -138,7 +226,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             "createdAt": ts,
         }
 
-        self.client.put_item(
+        await self._call(
+            "put_item",
             TableName=self.table_name,
             Item=self._serialize_item(item),
         )
@@ -158,7 +247,8 @@ class DynamoDBDataLayer(BaseDataLayer):
         thread_id = thread_id.strip("THREAD#")
         step_id = step_id.strip("STEP#")
 
-        self.client.update_item(
+        await self._call(
+            "update_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -186,7 +276,8 @@ class DynamoDBDataLayer(BaseDataLayer):
         feedback.id = f"THREAD#{feedback.threadId}::STEP#{feedback.forId}"
         serialized_feedback = self._type_serializer.serialize(asdict(feedback))
 
-        self.client.update_item(
+        await self._call(
+            "update_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{feedback.threadId}"},
@@ -199,8 +290,8 @@ class DynamoDBDataLayer(BaseDataLayer):
 
         return feedback.id
 
-    @queue_until_user_message()
-    async def create_element(self, element: "Element"):
+    async def _element_item(self, element: "Element") -> Optional[Dict[str, Any]]:
+        """Upload the content of an element and return its item."""
         _logger.info(
             "DynamoDB: create_element thread=%s step=%s type=%s",
             element.thread_id,
@@ -210,23 +301,26 @@ class DynamoDBDataLayer(BaseDataLayer):
         _logger.debug("DynamoDB: create_element: %s", element.to_dict())
 
         if not element.for_id:
-            return
+            return None
 
         if not self.storage_provider:
             _logger.warning(
                 "DynamoDB: create_element error. No storage_provider is configured!"
             )
-            return
+            return None
 
         content: Optional[Union[bytes, str]] = None
+        # Files are streamed, large ones are not loaded in memory
+        stream: Optional[AsyncIterator[bytes]] = None
+        size_hint: Optional[int] = None
 
         if element.content:
             content = element.content
 
         elif element.path:
-            _logger.debug("DynamoDB: create_element reading file %s", element.path)
-            async with aiofiles.open(element.path, "rb") as f:
-                content = await f.read()
+            _logger.debug("DynamoDB: create_element streaming file %s", element.path)
+            stream = file_chunks(element.path)
+            size_hint = await aiofiles.os.path.getsize(element.path)
 
         elif element.url:
             _logger.debug("DynamoDB: create_element http %s", element.url)
@@ -242,7 +336,7 @@ class DynamoDBDataLayer(BaseDataLayer):
         else:
             raise ValueError("Element url, path or content must be provided")
 
-        if content is None:
+        if content is None and stream is None:
             raise ValueError("Content is None, cannot upload file")
 
         if not element.mime:
@@ -252,12 +346,21 @@ class DynamoDBDataLayer(BaseDataLayer):
         user_folder = getattr(context_user, "id", "unknown")
         file_object_key = f"{user_folder}/{element.thread_id}/{element.id}"
 
-        uploaded_file = await self.storage_provider.upload_file(
-            object_key=file_object_key,
-            data=content,
-            mime=element.mime,
-            overwrite=True,
-        )
+        if stream is not None:
+            uploaded_file = await self.storage_provider.upload_stream(
+                object_key=file_object_key,
+                stream=stream,
+                mime=element.mime,
+                overwrite=True,
+                size_hint=size_hint,
+            )
+        else:
+            uploaded_file = await self.storage_provider.upload_file(
+                object_key=file_object_key,
+                data=content,  # type: ignore[arg-type]
+                mime=element.mime,
+                overwrite=True,
+            )
         if not uploaded_file:
             raise ValueError(
                 "DynamoDB Error: create_element, Failed to persist data in storage_provider",
@@ -273,10 +376,36 @@ class DynamoDBDataLayer(BaseDataLayer):
             }
         )
 
-        self.client.put_item(
-            TableName=self.table_name,
-            Item=self._serialize_item(element_dict),
+        return element_dict
+
+    @queue_until_user_message()
+    async def create_element(self, element: "Element"):
+        if element_dict := await self._element_item(element):
+            await self._call(
+                "put_item",
+                TableName=self.table_name,
+                Item=self._serialize_item(element_dict),
+            )
+
+    @queue_until_user_message()
+    async def create_elements(self, elements: List["Element"]):
+        uploads = await asyncio.gather(
+            *(self._element_item(element) for element in elements),
+            return_exceptions=True,
         )
+        requests = []
+        for element, element_dict in zip(elements, uploads):
+            if isinstance(element_dict, BaseException):
+                _logger.error(
+                    "DynamoDB: create_elements failed to upload element=%s: %s",
+                    element.id,
+                    element_dict,
+                )
+            elif element_dict:
+                requests.append(
+                    {"PutRequest": {"Item": self._serialize_item(element_dict)}}
+                )
+        await self._batch_write(requests)
 
     async def get_element(
         self, thread_id: str, element_id: str
@@ -285,7 +414,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             "DynamoDB: get_element thread=%s element=%s", thread_id, element_id
         )
 
-        response = self.client.get_item(
+        response = await self._call(
+            "get_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -305,7 +435,8 @@ class DynamoDBDataLayer(BaseDataLayer):
             "DynamoDB: delete_element thread=%s element=%s", thread_id, element_id
         )
 
-        self.client.delete_item(
+        await self._call(
+            "delete_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -313,6 +444,17 @@ class DynamoDBDataLayer(BaseDataLayer):
             },
         )
 
+    def _step_item(self, step_dict: "StepDict") -> Dict[str, Any]:
+        item = dict(step_dict)
+        item.update(
+            {
+                # ignore type, dynamo needs these so we want to fail if not set
+                "PK": f"THREAD#{step_dict['threadId']}",  # type: ignore
+                "SK": f"STEP#{step_dict['id']}",  # type: ignore
+            }
+        )
+        return item
+
     @queue_until_user_message()
     async def create_step(self, step_dict: "StepDict"):
         _logger.info(
@@ -322,18 +464,23 @@ class DynamoDBDataLayer(BaseDataLayer):
         )
         _logger.debug("DynamoDB: create_step: %s", step_dict)
 
-        item = dict(step_dict)
-        item.update(
-            {
-                # ignore type, dynamo needs these so we want to fail if not set
-                "PK": f"THREAD#{step_dict['threadId']}",  # type: ignore
-                "SK": f"STEP#{step_dict['id']}",  # type: ignore
-            }
+        await self._call(
+            "put_item",
+            TableName=self.table_name,
+            Item=self._serialize_item(self._step_item(step_dict)),
         )
 
-        self.client.put_item(
-            TableName=self.table_name,
-            Item=self._serialize_item(item),
+    @queue_until_user_message()
+    async def create_steps(self, step_dicts: List["StepDict"]):
+        _logger.info("DynamoDB: create_steps count=%s", len(step_dicts))
+
+        # A batch cannot write an item twice, the last version of a step wins
+        items = {step_dict["id"]: step_dict for step_dict in step_dicts}
+        await self._batch_write(
+            [
+                {"PutRequest": {"Item": self._serialize_item(self._step_item(item))}}
+                for item in items.values()
+            ]
         )
 
     @queue_until_user_message()
@@ -345,7 +492,7 @@ class DynamoDBDataLayer(BaseDataLayer):
         )
         _logger.debug("DynamoDB: update_step: %s", step_dict)
 
-        self._update_item(
+        await self._update_item(
             key={
                 # ignore type, dynamo needs these so we want to fail if not set
                 "PK": f"THREAD#{step_dict['threadId']}",  # type: ignore
@@ -359,7 +506,8 @@ class DynamoDBDataLayer(BaseDataLayer):
         thread_id = self.context.session.thread_id
         _logger.info("DynamoDB: delete_feedback thread=%s step=%s", thread_id, step_id)
 
-        self.client.delete_item(
+        await self._call(
+            "delete_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -370,7 +518,8 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def get_thread_author(self, thread_id: str) -> str:
         _logger.info("DynamoDB: get_thread_author thread=%s", thread_id)
 
-        response = self.client.get_item(
+        response = await self._call(
+            "get_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -388,41 +537,24 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def delete_thread(self, thread_id: str):
         _logger.info("DynamoDB: delete_thread thread=%s", thread_id)
 
-        thread = await self.get_thread(thread_id)
-        if not thread:
+        # Only the keys of the items are needed to delete them
+        keys = await self._query(
+            **self._thread_query(thread_id), ProjectionExpression="PK, SK"
+        )
+        if not keys:
             return
 
-        items: List[Any] = thread["steps"]
-        if thread["elements"]:
-            items.extend(thread["elements"])
-
-        delete_requests = []
-        for item in items:
-            key = self._serialize_item({"PK": item["PK"], "SK": item["SK"]})
-            req = {"DeleteRequest": {"Key": key}}
-            delete_requests.append(req)
-
-        BATCH_ITEM_SIZE = 25  # pylint: disable=invalid-name
-        for i in range(0, len(delete_requests), BATCH_ITEM_SIZE):
-            chunk = delete_requests[i : i + BATCH_ITEM_SIZE]
-            response = self.client.batch_write_item(
-                RequestItems={
-                    self.table_name: chunk,  # type: ignore
-                }
-            )
-
-            backoff_time = 1
-            while response.get("UnprocessedItems"):
-                backoff_time *= 2
-                # Cap the backoff time at 32 seconds & add jitter
-                delay = min(backoff_time, 32) + random.uniform(0, 1)
-                await asyncio.sleep(delay)
-
-                response = self.client.batch_write_item(
-                    RequestItems=response["UnprocessedItems"]
-                )
+        await self._batch_write(
+            [
+                {"DeleteRequest": {"Key": self._serialize_item(key)}}
+                for key in keys
+                if key["SK"] != "THREAD"
+            ]
+        )
 
-        self.client.delete_item(
+        # The thread is deleted last, its items are still listed if a batch failed
+        await self._call(
+            "delete_item",
             TableName=self.table_name,
             Key={
                 "PK": {"S": f"THREAD#{thread_id}"},
@@ -467,7 +599,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             query_args["ExpressionAttributeNames"]["#name"] = "name"
             query_args["ExpressionAttributeValues"][":search"] = {"S": filters.search}
 
-        response = self.client.query(**query_args)  # type: ignore
+        response = await self._call("query", **query_args)
 
         if "LastEvaluatedKey" in response:
             paginated_response.pageInfo.hasNextPage = True
@@ -489,53 +621,32 @@ class DynamoDBDataLayer(BaseDataLayer):
     async def get_thread(self, thread_id: str) -> "Optional[ThreadDict]":
         _logger.info("DynamoDB: get_thread thread=%s", thread_id)
 
-        # Get all thread records
-        thread_items: List[Any] = []
-
-        cursor: Dict[str, Any] = {}
-        while True:
-            response = self.client.query(
+        # The thread, its steps and its elements are queried concurrently
+        response, steps, elements = await asyncio.gather(
+            self._call(
+                "get_item",
                 TableName=self.table_name,
-                KeyConditionExpression="#pk = :pk",
-                ExpressionAttributeNames={"#pk": "PK"},
-                ExpressionAttributeValues={":pk": {"S": f"THREAD#{thread_id}"}},
-                **cursor,
-            )
-
-            deserialized_items = map(self._deserialize_item, response["Items"])
-            thread_items.extend(deserialized_items)
-
-            if "LastEvaluatedKey" not in response:
-                break
-            cursor["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-
-        if len(thread_items) == 0:
-            return None
-
-        # process accordingly
-        thread_dict: Optional[ThreadDict] = None
-        steps = []
-        elements = []
-
-        for item in thread_items:
-            if item["SK"] == "THREAD":
-                thread_dict = item
-
-            elif item["SK"].startswith("ELEMENT"):
-                elements.append(item)
-
-            elif item["SK"].startswith("STEP"):
-                if "feedback" in item:  # Decimal is not json serializable
-                    item["feedback"]["value"] = int(item["feedback"]["value"])
-                steps.append(item)
+                Key={
+                    "PK": {"S": f"THREAD#{thread_id}"},
+                    "SK": {"S": "THREAD"},
+                },
+            ),
+            self._query(**self._thread_query(thread_id, "STEP#")),
+            self._query(**self._thread_query(thread_id, "ELEMENT#")),
+        )
 
-        if not thread_dict:
-            if len(thread_items) > 0:
+        if "Item" not in response:
+            if steps or elements:
                 _logger.warning(
                     "DynamoDB: found orphaned items for thread=%s", thread_id
                 )
             return None
 
+        thread_dict: ThreadDict = self._deserialize_item(response["Item"])  # type: ignore
+        for step in steps:
+            if "feedback" in step:  # Decimal is not json serializable
+                step["feedback"]["value"] = int(step["feedback"]["value"])
+
         steps.sort(key=lambda i: i["createdAt"])
         thread_dict.update(
             {
@@ -578,7 +689,7 @@ class DynamoDBDataLayer(BaseDataLayer):
             # user_id may be None on subsequent calls, don't update UserThreadPK to "USER#{None}"
             item["UserThreadPK"] = f"USER#{user_id}"
 
-        self._update_item(
+        await self._update_item(
             key={
                 "PK": f"THREAD#{thread_id}",
                 "SK": "THREAD",
@@ -0,0 +1,333 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from chainlit.context import ChainlitContext, context_var
+from chainlit.logger import logger
+from chainlit.metrics import metrics
+
+if TYPE_CHECKING:
+    from chainlit.data.base import BaseDataLayer
+    from chainlit.element import Element
+    from chainlit.step import StepDict
+
+DELETE_METHODS = ("delete_step", "delete_element")
+
+# Bulk version of the data layer methods, to make consecutive calls at once
+BULK_METHODS = {"create_step": "create_steps", "create_element": "create_elements"}
+
+
+class PendingWrite:
+    """A data layer call waiting to be made."""
+
+    def __init__(
+        self,
+        data_layer: "BaseDataLayer",
+        method: str,
+        args: Tuple,
+        context: Optional[ChainlitContext],
+    ) -> None:
+        self.data_layer = data_layer
+        self.method = method
+        self.args = args
+        # Data layer methods may rely on the context of the caller (session, user...)
+        self.context = context
+        # Callers waiting for the write to be made, and its error
+        self.futures: List[asyncio.Future] = []
+
+    def replaces(self, writes: "List[PendingWrite]") -> "PendingWrite":
+        """Take over the callers waiting for writes merged into this one."""
+        self.futures = [f for write in writes for f in write.futures]
+        return self
+
+    def done(self, error: Optional[BaseException] = None):
+        for future in self.futures:
+            if future.done():
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    def merge(self, write: "PendingWrite") -> Optional["PendingWrite"]:
+        """
+        Merge a later write of the same step or element into this one.
+
+        Return None if the writes cannot be merged and must be made in order.
+        """
+        if write.data_layer is not self.data_layer or self.method in DELETE_METHODS:
+            return None
+
+        # Nothing left to write before a deletion, and elements are sent whole
+        if write.method in DELETE_METHODS or write.method == "create_element":
+            return PendingWrite(
+                write.data_layer, write.method, write.args, write.context
+            ).replaces([self, write])
+
+        # Step dicts are complete, the last one wins. A step created then updated
+        # is created with its last version.
+        step_dict = write.args[0]
+        if self.method == write.method == "patch_step":
+            fields = list(dict.fromkeys([*self.args[1], *write.args[1]]))
+            return PendingWrite(
+                self.data_layer, "patch_step", (step_dict, fields), write.context
+            ).replaces([self, write])
+
+        method = (
+            "create_step"
+            if "create_step" in (self.method, write.method)
+            else "update_step"
+        )
+        return PendingWrite(
+            self.data_layer, method, (step_dict,), write.context
+        ).replaces([self, write])
+
+
+class PendingWrites:
+    """Writes of a step or element, in order."""
+
+    def __init__(self, write: PendingWrite) -> None:
+        self.writes = [write]
+        self.queued_at = time.monotonic()
+
+    def add(self, write: PendingWrite) -> bool:
+        """Add a write, return True if it was merged with the previous one."""
+        if merged := self.writes[-1].merge(write):
+            self.writes[-1] = merged
+            return True
+        self.writes.append(write)
+        return False
+
+
+class PersistenceQueue:
+    """
+    Write-behind queue of the steps and elements persisted by the data layer.
+
+    Writes are made by a single background task, in batches, every
+    `persistence_flush_interval_ms` or as soon as `persistence_batch_size` steps
+    and elements are pending. Successive writes of a step waiting in the queue are
+    merged (e.g. a step created then updated 5 times is created once, with its last
+    version) and the writes are made in the order of the first write of each step
+    or element, so a step is always created before it is updated, and a parent step
+    before its children. When `persistence_queue_size` steps and elements are
+    pending, new ones wait for the queue to be written.
+
+    Writes made with `wait=True` return once they are written, and raise the error
+    of the data layer if they failed.
+    """
+
+    def __init__(self) -> None:
+        self._pending: OrderedDict[Tuple[str, str], PendingWrites] = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = asyncio.Lock()
+        self._batch_ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _bind_loop(self):
+        """
+        The lock, events and writer task belong to the event loop they are used in.
+        Start over with new ones when the queue is used from another event loop
+        (e.g. the server restarted in the same process), the task of a loop that
+        no longer runs would never complete. Nothing waits on the previous ones
+        anymore, their loop does not run.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._batch_ready = asyncio.Event()
+            self._space = asyncio.Event()
+            self._task = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def lag(self) -> float:
+        """Age in seconds of the oldest pending write."""
+        for writes in self._pending.values():
+            return time.monotonic() - writes.queued_at
+        return 0
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        from chainlit.config import config
+
+        return {
+            "interval": config.project.persistence_flush_interval_ms / 1000,
+            "batch_size": max(config.project.persistence_batch_size, 1),
+            "maxsize": max(config.project.persistence_queue_size, 1),
+        }
+
+    def _start(self):
+        """Start the writer task, unless it is running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _put(self, key: Tuple[str, str], write: PendingWrite, wait: bool):
+        self._bind_loop()
+        future = None
+        if wait:
+            future = asyncio.get_running_loop().create_future()
+            write.futures.append(future)
+
+        if writes := self._pending.get(key):
+            if writes.add(write):
+                metrics.incr("persistence.coalesced")
+        else:
+            settings = self.settings
+            while len(self._pending) >= settings["maxsize"]:
+                # The writer makes room, make sure it runs
+                self._start()
+                self._space.clear()
+                self._batch_ready.set()
+                await self._space.wait()
+            self._pending[key] = PendingWrites(write)
+            if len(self._pending) >= settings["batch_size"]:
+                self._batch_ready.set()
+
+        self._start()
+        if future:
+            # Write without waiting for a full batch
+            self._batch_ready.set()
+            await future
+
+    def _write(self, data_layer: "BaseDataLayer", method: str, *args):
+        return PendingWrite(data_layer, method, args, context_var.get(None))
+
+    async def create_step(
+        self, data_layer: "BaseDataLayer", step_dict: "StepDict", wait: bool = False
+    ):
+        await self._put(
+            ("step", step_dict["id"]),
+            self._write(data_layer, "create_step", step_dict),
+            wait,
+        )
+
+    async def update_step(
+        self, data_layer: "BaseDataLayer", step_dict: "StepDict", wait: bool = False
+    ):
+        await self._put(
+            ("step", step_dict["id"]),
+            self._write(data_layer, "update_step", step_dict),
+            wait,
+        )
+
+    async def patch_step(
+        self,
+        data_layer: "BaseDataLayer",
+        step_dict: "StepDict",
+        changed_fields: List[str],
+        wait: bool = False,
+    ):
+        await self._put(
+            ("step", step_dict["id"]),
+            self._write(data_layer, "patch_step", step_dict, changed_fields),
+            wait,
+        )
+
+    async def delete_step(
+        self, data_layer: "BaseDataLayer", step_id: str, wait: bool = False
+    ):
+        await self._put(
+            ("step", step_id), self._write(data_layer, "delete_step", step_id), wait
+        )
+
+    async def create_element(
+        self, data_layer: "BaseDataLayer", element: "Element", wait: bool = False
+    ):
+        await self._put(
+            ("element", element.id),
+            self._write(data_layer, "create_element", element),
+            wait,
+        )
+
+    async def delete_element(
+        self,
+        data_layer: "BaseDataLayer",
+        element_id: str,
+        thread_id: Optional[str] = None,
+        wait: bool = False,
+    ):
+        await self._put(
+            ("element", element_id),
+            self._write(data_layer, "delete_element", element_id, thread_id),
+            wait,
+        )
+
+    async def _execute(self, writes: List[PendingWrite]):
+        """Make a write, or consecutive writes with the same bulk method at once."""
+        write = writes[0]
+        if len(writes) > 1:
+            method = BULK_METHODS[write.method]
+            args: Tuple = ([w.args[0] for w in writes],)
+        else:
+            method, args = write.method, write.args
+
+        token = context_var.set(write.context) if write.context else None
+        try:
+            await getattr(write.data_layer, method)(*args)
+            metrics.incr("persistence.written", len(writes))
+            for w in writes:
+                w.done()
+        except Exception as e:
+            metrics.incr("persistence.failed", len(writes))
+            logger.error(f"Failed to persist {method}: {e!s}")
+            for w in writes:
+                w.done(e)
+        finally:
+            if token:
+                context_var.reset(token)
+
+    async def _write_batch(self, size: int):
+        async with self._lock:
+            batch = []
+            while self._pending and len(batch) < size:
+                batch.append(self._pending.popitem(last=False)[1])
+            self._space.set()
+
+            group: List[PendingWrite] = []
+            for write in (write for writes in batch for write in writes.writes):
+                if group and not (
+                    write.method in BULK_METHODS
+                    and write.method == group[0].method
+                    and write.data_layer is group[0].data_layer
+                    and write.context is group[0].context
+                ):
+                    await self._execute(group)
+                    group = []
+                group.append(write)
+            if group:
+                await self._execute(group)
+
+    async def _run(self):
+        while self._pending:
+            settings = self.settings
+            if len(self._pending) < settings["batch_size"]:
+                try:
+                    await asyncio.wait_for(
+                        self._batch_ready.wait(), timeout=settings["interval"]
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+            await self._write_batch(settings["batch_size"])
+
+    async def flush(self):
+        """Write all the pending steps and elements."""
+        self._bind_loop()
+        while self._pending:
+            await self._write_batch(len(self._pending))
+        # Nothing left to write, let the task stop
+        self._batch_ready.set()
+        if self._task:
+            await self._task
+
+
+persistence_queue = PersistenceQueue()
+
+metrics.register_gauge("persistence.pending", lambda: persistence_queue.pending)
+metrics.register_gauge("persistence.lag_seconds", lambda: persistence_queue.lag)
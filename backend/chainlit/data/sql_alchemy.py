@@ -1,4 +1,3 @@
-import json
 import ssl
 import uuid
 from dataclasses import asdict
@@ -7,7 +6,7 @@ from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
 import aiofiles
 import aiohttp
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
@@ -17,6 +16,7 @@ from chainlit.data.storage_clients.base import BaseStorageClient
 from chainlit.data.utils import queue_until_user_message
 from chainlit.element import ElementDict
 from chainlit.logger import logger
+from chainlit.serialization import dumps, loads
 from chainlit.step import StepDict
 from chainlit.types import (
     Feedback,
@@ -26,6 +26,7 @@ from chainlit.types import (
     Pagination,
     ThreadDict,
     ThreadFilter,
+    ThreadStepsPage,
 )
 from chainlit.user import PersistedUser, User
 
@@ -34,6 +35,122 @@ if TYPE_CHECKING:
     from chainlit.step import StepDict
 
 
+THREAD_HEADER_COLUMNS = """
+    t."id" AS thread_id,
+    t."createdAt" AS thread_createdat,
+    t."name" AS thread_name,
+    t."userId" AS user_id,
+    t."userIdentifier" AS user_identifier,
+    t."tags" AS thread_tags,
+    t."metadata" AS thread_metadata
+"""
+
+
+STEP_FEEDBACK_COLUMNS = """
+    s."id" AS step_id,
+    s."name" AS step_name,
+    s."type" AS step_type,
+    s."threadId" AS step_threadid,
+    s."parentId" AS step_parentid,
+    s."streaming" AS step_streaming,
+    s."waitForAnswer" AS step_waitforanswer,
+    s."isError" AS step_iserror,
+    s."metadata" AS step_metadata,
+    s."tags" AS step_tags,
+    s."input" AS step_input,
+    s."output" AS step_output,
+    s."createdAt" AS step_createdat,
+    s."start" AS step_start,
+    s."end" AS step_end,
+    s."generation" AS step_generation,
+    s."showInput" AS step_showinput,
+    s."language" AS step_language,
+    f."value" AS feedback_value,
+    f."comment" AS feedback_comment,
+    f."id" AS feedback_id
+"""
+
+ELEMENT_COLUMNS = """
+    e."id" AS element_id,
+    e."threadId" as element_threadid,
+    e."type" AS element_type,
+    e."chainlitKey" AS element_chainlitkey,
+    e."url" AS element_url,
+    e."objectKey" as element_objectkey,
+    e."name" AS element_name,
+    e."display" AS element_display,
+    e."size" AS element_size,
+    e."language" AS element_language,
+    e."page" AS element_page,
+    e."forId" AS element_forid,
+    e."mime" AS element_mime,
+    e."props" AS props
+"""
+
+
+def escape_like(value: str) -> str:
+    """Escape the wildcards of a LIKE pattern, with a backslash."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fts5_query(search: str) -> str:
+    """FTS5 query matching documents with words starting with each search term."""
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in search.split())
+
+
+def _search_triggers(table: str, column: str, thread_id: str, condition: str):
+    """Triggers indexing a column of the rows of a table matching a condition."""
+    index = f"""
+        INSERT INTO search_documents ("id", "threadId")
+        SELECT new."id", new."{thread_id}" WHERE {condition};
+        INSERT INTO search_index (rowid, content)
+        SELECT "docId", new."{column}" FROM search_documents WHERE "id" = new."id";
+    """
+    unindex = """
+        DELETE FROM search_index
+        WHERE rowid = (SELECT "docId" FROM search_documents WHERE "id" = old."id");
+        DELETE FROM search_documents WHERE "id" = old."id";
+    """
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_insert
+        AFTER INSERT ON {table} BEGIN {index} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_update
+        AFTER UPDATE OF "{column}", "{thread_id}" ON {table}
+        BEGIN {unindex} {index} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_delete
+        AFTER DELETE ON {table} BEGIN {unindex} END""",
+    ]
+
+
+# Messages searched by the full-text search, along with the thread names. Steps
+# outside of a thread are not searchable.
+SEARCHED_STEPS = """new."type" IN ('user_message', 'assistant_message')
+AND new."threadId" IS NOT NULL"""
+
+SQLITE_SEARCH_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS search_documents (
+        "docId" INTEGER PRIMARY KEY,
+        "id" TEXT NOT NULL UNIQUE,
+        "threadId" TEXT NOT NULL
+    )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(content)",
+    *_search_triggers("threads", "name", "id", "1"),
+    *_search_triggers("steps", "output", "threadId", SEARCHED_STEPS),
+]
+
+# Index the threads and steps written before the search was enabled
+SQLITE_SEARCH_BACKFILL = [
+    """INSERT INTO search_documents ("id", "threadId") SELECT "id", "id" FROM threads""",
+    f"""INSERT INTO search_documents ("id", "threadId")
+    SELECT "id", "threadId" FROM steps new WHERE {SEARCHED_STEPS}""",
+    """INSERT INTO search_index (rowid, content)
+    SELECT d."docId", t."name" FROM search_documents d JOIN threads t ON t."id" = d."id"
+    UNION ALL
+    SELECT d."docId", s."output" FROM search_documents d JOIN steps s ON s."id" = d."id"
+    """,
+]
+
+
 class SQLAlchemyDataLayer(BaseDataLayer):
     def __init__(
         self,
@@ -42,6 +159,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         storage_provider: Optional[BaseStorageClient] = None,
         user_thread_limit: Optional[int] = 1000,
         show_logger: Optional[bool] = False,
+        full_text_search: bool = False,
     ):
         self._conninfo = conninfo
         self.user_thread_limit = user_thread_limit
@@ -59,6 +177,13 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         self.async_session = sessionmaker(
             bind=self.engine, expire_on_commit=False, class_=AsyncSession
         )  # type: ignore
+        # Full-text search of the threads, with FTS5 (SQLite only)
+        self.full_text_search = full_text_search
+        if full_text_search and self.engine.dialect.name != "sqlite":
+            logger.warning(
+                "SQLAlchemyDataLayer full-text search requires SQLite, searching threads with LIKE"
+            )
+            self.full_text_search = False
         if storage_provider:
             self.storage_provider: Optional[BaseStorageClient] = storage_provider
             if self.show_logger:
@@ -72,11 +197,41 @@ class SQLAlchemyDataLayer(BaseDataLayer):
     async def build_debug_url(self) -> str:
         return ""
 
+    async def connect(self):
+        if self.full_text_search:
+            await self.create_search_tables()
+
+    async def create_search_tables(self):
+        """
+        Create the FTS5 index of the thread names and messages if it does not exist
+        yet, along with the triggers keeping it up to date as threads and steps are
+        written.
+        """
+        async with self.engine.begin() as connection:
+            exists = await connection.scalar(
+                text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_documents'"
+                )
+            )
+            for statement in SQLITE_SEARCH_SCHEMA:
+                await connection.execute(text(statement))
+            if not exists:
+                for statement in SQLITE_SEARCH_BACKFILL:
+                    await connection.execute(text(statement))
+
     ###### SQL Helpers ######
     async def execute_sql(
-        self, query: str, parameters: dict
+        self, query: str, parameters: dict, expanding: Optional[List[str]] = None
     ) -> Union[List[Dict[str, Any]], int, None]:
+        """
+        Run a query. The parameters listed in `expanding` are lists, bound as
+        `IN :name` lists of values.
+        """
         parameterized_query = text(query)
+        if expanding:
+            parameterized_query = parameterized_query.bindparams(
+                *(bindparam(name, expanding=True) for name in expanding)
+            )
         async with self.async_session() as session:
             try:
                 await session.begin()
@@ -113,6 +268,19 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             return str(obj)
         return obj
 
+    def _thread_header_to_dict(self, thread: Dict[str, Any]) -> ThreadDict:
+        return ThreadDict(
+            id=thread["thread_id"],
+            createdAt=thread["thread_createdat"],
+            name=thread["thread_name"],
+            userId=thread["user_id"],
+            userIdentifier=thread["user_identifier"],
+            tags=thread["thread_tags"],
+            metadata=thread["thread_metadata"],
+            steps=[],
+            elements=[],
+        )
+
     ###### User ######
     async def get_user(self, identifier: str) -> Optional[PersistedUser]:
         if self.show_logger:
@@ -126,7 +294,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             # SQLite returns JSON as string, we most convert it. (#1137)
             metadata = user_data.get("metadata", {})
             if isinstance(metadata, str):
-                metadata = json.loads(metadata)
+                metadata = loads(metadata)
 
             assert isinstance(metadata, dict)
             assert isinstance(user_data["id"], str)
@@ -171,7 +339,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         existing_user: Optional[PersistedUser] = await self.get_user(user.identifier)
         user_dict: Dict[str, Any] = {
             "identifier": str(user.identifier),
-            "metadata": json.dumps(user.metadata) or {},
+            "metadata": dumps(user.metadata) or {},
         }
         if not existing_user:  # create the user
             if self.show_logger:
@@ -241,7 +409,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             "userId": user_id,
             "userIdentifier": user_identifier,
             "tags": tags,
-            "metadata": json.dumps(metadata) if metadata else None,
+            "metadata": dumps(metadata) if metadata else None,
         }
         parameters = {
             key: value for key, value in data.items() if value is not None
@@ -290,56 +458,186 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             )
         if not filters.userId:
             raise ValueError("userId is required")
-        all_user_threads: List[ThreadDict] = (
-            await self.get_all_user_threads(user_id=filters.userId) or []
-        )
 
-        search_keyword = filters.search.lower() if filters.search else None
-        feedback_value = int(filters.feedback) if filters.feedback else None
-
-        filtered_threads = []
-        for thread in all_user_threads:
-            keyword_match = True
-            feedback_match = True
-            if search_keyword or feedback_value is not None:
-                if search_keyword:
-                    keyword_match = any(
-                        search_keyword in step["output"].lower()
-                        for step in thread["steps"]
-                        if "output" in step
+        parameters: Dict[str, Any] = {
+            "user_id": filters.userId,
+            "limit": pagination.first + 1,
+        }
+        # Only the page of thread headers is fetched, filtered and paginated in SQL
+        if filters.search and self.full_text_search:
+            # Threads with a matching name or message, the most relevant first
+            query = f"""
+                WITH ranked AS (
+                    SELECT d."threadId" AS id, MAX(-search_index.rank) AS rank
+                    FROM search_index
+                    JOIN search_documents d ON d."docId" = search_index.rowid
+                    WHERE search_index MATCH :search
+                    GROUP BY d."threadId"
+                )
+                SELECT {THREAD_HEADER_COLUMNS}
+                FROM ranked r JOIN threads t ON t."id" = r.id
+                WHERE t."userId" = :user_id
+            """
+            parameters["search"] = fts5_query(filters.search)
+            keys = ["r.rank", 't."createdAt"', 't."id"']
+            cursor_thread = """
+                SELECT cr.rank, ct."createdAt", ct."id"
+                FROM ranked cr JOIN threads ct ON ct."id" = cr.id
+                WHERE ct."id" = :cursor
+            """
+        else:
+            query = f"""
+                SELECT {THREAD_HEADER_COLUMNS}
+                FROM threads t
+                WHERE t."userId" = :user_id
+            """
+            if filters.search:
+                query += """
+                    AND EXISTS (
+                        SELECT 1 FROM steps s
+                        WHERE s."threadId" = t."id"
+                        AND LOWER(s."output") LIKE :search ESCAPE '\\'
                     )
-                if feedback_value is not None:
-                    feedback_match = False  # Assume no match until found
-                    for step in thread["steps"]:
-                        feedback = step.get("feedback")
-                        if feedback and feedback.get("value") == feedback_value:
-                            feedback_match = True
-                            break
-            if keyword_match and feedback_match:
-                filtered_threads.append(thread)
-
-        start = 0
+                """
+                parameters["search"] = f"%{escape_like(filters.search.lower())}%"
+            keys = ['t."createdAt"', 't."id"']
+            cursor_thread = """
+                SELECT "createdAt", "id" FROM threads WHERE "id" = :cursor
+            """
+        if filters.feedback is not None:
+            query += """
+                AND EXISTS (
+                    SELECT 1 FROM steps s JOIN feedbacks f ON s."id" = f."forId"
+                    WHERE s."threadId" = t."id" AND f."value" = :feedback
+                )
+            """
+            parameters["feedback"] = int(filters.feedback)
         if pagination.cursor:
-            for i, thread in enumerate(filtered_threads):
-                if (
-                    thread["id"] == pagination.cursor
-                ):  # Find the start index using pagination.cursor
-                    start = i + 1
-                    break
-        end = start + pagination.first
-        paginated_threads = filtered_threads[start:end] or []
-
-        has_next_page = len(filtered_threads) > end
-        start_cursor = paginated_threads[0]["id"] if paginated_threads else None
-        end_cursor = paginated_threads[-1]["id"] if paginated_threads else None
+            # From the first page if the cursor thread no longer exists
+            query += f"""
+                AND (
+                    NOT EXISTS ({cursor_thread})
+                    OR ({", ".join(keys)}) < ({cursor_thread})
+                )
+            """
+            parameters["cursor"] = pagination.cursor
+        order = ", ".join(f"{key} DESC" for key in keys)
+        query += f" ORDER BY {order} LIMIT :limit"
+
+        threads = await self.execute_sql(query=query, parameters=parameters)
+        if not isinstance(threads, list):
+            threads = []
+
+        has_next_page = len(threads) > pagination.first
+        thread_dicts = [
+            self._thread_header_to_dict(thread)
+            for thread in threads[: pagination.first]
+        ]
 
         return PaginatedResponse(
             pageInfo=PageInfo(
                 hasNextPage=has_next_page,
-                startCursor=start_cursor,
-                endCursor=end_cursor,
+                startCursor=thread_dicts[0]["id"] if thread_dicts else None,
+                endCursor=thread_dicts[-1]["id"] if thread_dicts else None,
             ),
-            data=paginated_threads,
+            data=thread_dicts,
+        )
+
+    async def get_thread_window(
+        self, thread_id: str, limit: int
+    ) -> Optional[ThreadDict]:
+        if self.show_logger:
+            logger.info(f"SQLAlchemy: get_thread_window, thread_id={thread_id}")
+        query = f"""
+            SELECT {THREAD_HEADER_COLUMNS}
+            FROM threads t
+            WHERE t."id" = :thread_id
+        """
+        threads = await self.execute_sql(query, {"thread_id": thread_id})
+        if not isinstance(threads, list) or not threads:
+            return None
+
+        thread = self._thread_header_to_dict(threads[0])
+        page = await self.get_thread_steps(thread_id, limit=limit)
+        thread["steps"] = page["steps"]
+        thread["elements"] = page["elements"]
+        thread["stepsBefore"] = page["before"]
+        return thread
+
+    async def get_thread_steps(
+        self, thread_id: str, before: Optional[str] = None, limit: int = 100
+    ) -> ThreadStepsPage:
+        if self.show_logger:
+            logger.info(
+                f"SQLAlchemy: get_thread_steps, thread_id={thread_id}, before={before}"
+            )
+        query = f"""
+            SELECT {STEP_FEEDBACK_COLUMNS}
+            FROM steps s LEFT JOIN feedbacks f ON s."id" = f."forId"
+            WHERE s."threadId" = :thread_id
+        """
+        parameters: Dict[str, Any] = {"thread_id": thread_id, "limit": limit + 1}
+        if before:
+            query += """
+                AND (s."createdAt", s."id") < (
+                    SELECT "createdAt", "id" FROM steps WHERE "id" = :before
+                )
+            """
+            parameters["before"] = before
+        query += ' ORDER BY s."createdAt" DESC, s."id" DESC LIMIT :limit'
+
+        steps = await self.execute_sql(query, parameters)
+        steps = steps if isinstance(steps, list) else []
+        has_previous = len(steps) > limit
+        steps = steps[:limit]
+
+        # The steps the window is nested in, if not in it
+        ids = [step["step_id"] for step in steps]
+        missing_parents = list(
+            {step["step_parentid"] for step in steps if step["step_parentid"]}
+            - set(ids)
+        )
+        if missing_parents:
+            ancestors_query = f"""
+                WITH RECURSIVE ancestors AS (
+                    SELECT "id", "parentId" FROM steps WHERE "id" IN :parent_ids
+                    UNION
+                    SELECT s."id", s."parentId"
+                    FROM steps s JOIN ancestors a ON s."id" = a."parentId"
+                )
+                SELECT {STEP_FEEDBACK_COLUMNS}
+                FROM steps s LEFT JOIN feedbacks f ON s."id" = f."forId"
+                WHERE s."id" IN (SELECT "id" FROM ancestors) AND s."id" NOT IN :ids
+            """
+            ancestors = await self.execute_sql(
+                ancestors_query,
+                {"parent_ids": missing_parents, "ids": ids},
+                expanding=["parent_ids", "ids"],
+            )
+            if isinstance(ancestors, list):
+                steps += ancestors
+        steps.sort(key=lambda step: (step["step_createdat"] or "", step["step_id"]))
+
+        elements_query = f"""
+            SELECT {ELEMENT_COLUMNS}
+            FROM elements e
+            WHERE e."threadId" = :thread_id AND (e."forId" IN :ids
+        """
+        # Elements not attached to a step come with the most recent steps
+        elements_query += ' OR e."forId" IS NULL)' if not before else ")"
+        elements = await self.execute_sql(
+            elements_query,
+            {"thread_id": thread_id, "ids": [step["step_id"] for step in steps]},
+            expanding=["ids"],
+        )
+
+        return ThreadStepsPage(
+            steps=[self._step_row_to_dict(step) for step in steps],
+            elements=[
+                self._element_row_to_dict(element)
+                for element in (elements if isinstance(elements, list) else [])
+            ],
+            before=ids[-1] if has_previous else None,
         )
 
     ###### Steps ######
@@ -360,8 +658,8 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             for key, value in step_dict.items()
             if value is not None and not (isinstance(value, dict) and not value)
         }
-        parameters["metadata"] = json.dumps(step_dict.get("metadata", {}))
-        parameters["generation"] = json.dumps(step_dict.get("generation", {}))
+        parameters["metadata"] = dumps(step_dict.get("metadata", {}))
+        parameters["generation"] = dumps(step_dict.get("generation", {}))
         columns = ", ".join(f'"{key}"' for key in parameters.keys())
         values = ", ".join(f":{key}" for key in parameters.keys())
         updates = ", ".join(
@@ -449,7 +747,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
                 url=element_dict.get("url"),
                 objectKey=element_dict.get("objectKey"),
                 name=element_dict["name"],
-                props=json.loads(element_dict.get("props", "{}")),
+                props=loads(element_dict.get("props") or "{}"),
                 display=element_dict["display"],
                 size=element_dict.get("size"),
                 language=element_dict.get("language"),
@@ -517,7 +815,7 @@ class SQLAlchemyDataLayer(BaseDataLayer):
 
         element_dict_cleaned = {k: v for k, v in element_dict.items() if v is not None}
         if "props" in element_dict_cleaned:
-            element_dict_cleaned["props"] = json.dumps(element_dict_cleaned["props"])
+            element_dict_cleaned["props"] = dumps(element_dict_cleaned["props"])
 
         columns = ", ".join(f'"{column}"' for column in element_dict_cleaned.keys())
         placeholders = ", ".join(f":{column}" for column in element_dict_cleaned.keys())
@@ -556,16 +854,9 @@ class SQLAlchemyDataLayer(BaseDataLayer):
         """Fetch all user threads up to self.user_thread_limit, or one thread by id if thread_id is provided."""
         if self.show_logger:
             logger.info("SQLAlchemy: get_all_user_threads")
-        user_threads_query = """
-            SELECT
-                "id" AS thread_id,
-                "createdAt" AS thread_createdat,
-                "name" AS thread_name,
-                "userId" AS user_id,
-                "userIdentifier" AS user_identifier,
-                "tags" AS thread_tags,
-                "metadata" AS thread_metadata
-            FROM threads
+        user_threads_query = f"""
+            SELECT {THREAD_HEADER_COLUMNS}
+            FROM threads t
             WHERE "userId" = :user_id OR "id" = :thread_id
             ORDER BY "createdAt" DESC
             LIMIT :limit
@@ -582,148 +873,111 @@ class SQLAlchemyDataLayer(BaseDataLayer):
             return None
         if not user_threads:
             return []
-        else:
-            thread_ids = (
-                "('"
-                + "','".join(map(str, [thread["thread_id"] for thread in user_threads]))
-                + "')"
-            )
+        thread_ids = [thread["thread_id"] for thread in user_threads]
 
         steps_feedbacks_query = f"""
-            SELECT
-                s."id" AS step_id,
-                s."name" AS step_name,
-                s."type" AS step_type,
-                s."threadId" AS step_threadid,
-                s."parentId" AS step_parentid,
-                s."streaming" AS step_streaming,
-                s."waitForAnswer" AS step_waitforanswer,
-                s."isError" AS step_iserror,
-                s."metadata" AS step_metadata,
-                s."tags" AS step_tags,
-                s."input" AS step_input,
-                s."output" AS step_output,
-                s."createdAt" AS step_createdat,
-                s."start" AS step_start,
-                s."end" AS step_end,
-                s."generation" AS step_generation,
-                s."showInput" AS step_showinput,
-                s."language" AS step_language,
-                f."value" AS feedback_value,
-                f."comment" AS feedback_comment,
-                f."id" AS feedback_id
+            SELECT {STEP_FEEDBACK_COLUMNS}
             FROM steps s LEFT JOIN feedbacks f ON s."id" = f."forId"
-            WHERE s."threadId" IN {thread_ids}
+            WHERE s."threadId" IN :thread_ids
             ORDER BY s."createdAt" ASC
         """
         steps_feedbacks = await self.execute_sql(
-            query=steps_feedbacks_query, parameters={}
+            query=steps_feedbacks_query,
+            parameters={"thread_ids": thread_ids},
+            expanding=["thread_ids"],
         )
 
         elements_query = f"""
-            SELECT
-                e."id" AS element_id,
-                e."threadId" as element_threadid,
-                e."type" AS element_type,
-                e."chainlitKey" AS element_chainlitkey,
-                e."url" AS element_url,
-                e."objectKey" as element_objectkey,
-                e."name" AS element_name,
-                e."display" AS element_display,
-                e."size" AS element_size,
-                e."language" AS element_language,
-                e."page" AS element_page,
-                e."forId" AS element_forid,
-                e."mime" AS element_mime,
-                e."props" AS props
+            SELECT {ELEMENT_COLUMNS}
             FROM elements e
-            WHERE e."threadId" IN {thread_ids}
+            WHERE e."threadId" IN :thread_ids
         """
-        elements = await self.execute_sql(query=elements_query, parameters={})
-
-        thread_dicts = {}
-        for thread in user_threads:
-            thread_id = thread["thread_id"]
-            if thread_id is not None:
-                thread_dicts[thread_id] = ThreadDict(
-                    id=thread_id,
-                    createdAt=thread["thread_createdat"],
-                    name=thread["thread_name"],
-                    userId=thread["user_id"],
-                    userIdentifier=thread["user_identifier"],
-                    tags=thread["thread_tags"],
-                    metadata=thread["thread_metadata"],
-                    steps=[],
-                    elements=[],
-                )
+        elements = await self.execute_sql(
+            query=elements_query,
+            parameters={"thread_ids": thread_ids},
+            expanding=["thread_ids"],
+        )
+
+        thread_dicts = {
+            thread["thread_id"]: self._thread_header_to_dict(thread)
+            for thread in user_threads
+            if thread["thread_id"] is not None
+        }
         # Process steps_feedbacks to populate the steps in the corresponding ThreadDict
         if isinstance(steps_feedbacks, list):
             for step_feedback in steps_feedbacks:
                 thread_id = step_feedback["step_threadid"]
                 if thread_id is not None:
-                    feedback = None
-                    if step_feedback["feedback_value"] is not None:
-                        feedback = FeedbackDict(
-                            forId=step_feedback["step_id"],
-                            id=step_feedback.get("feedback_id"),
-                            value=step_feedback["feedback_value"],
-                            comment=step_feedback.get("feedback_comment"),
-                        )
-                    step_dict = StepDict(
-                        id=step_feedback["step_id"],
-                        name=step_feedback["step_name"],
-                        type=step_feedback["step_type"],
-                        threadId=thread_id,
-                        parentId=step_feedback.get("step_parentid"),
-                        streaming=step_feedback.get("step_streaming", False),
-                        waitForAnswer=step_feedback.get("step_waitforanswer"),
-                        isError=step_feedback.get("step_iserror"),
-                        metadata=(
-                            step_feedback["step_metadata"]
-                            if step_feedback.get("step_metadata") is not None
-                            else {}
-                        ),
-                        tags=step_feedback.get("step_tags"),
-                        input=(
-                            step_feedback.get("step_input", "")
-                            if step_feedback.get("step_showinput")
-                            not in [None, "false"]
-                            else ""
-                        ),
-                        output=step_feedback.get("step_output", ""),
-                        createdAt=step_feedback.get("step_createdat"),
-                        start=step_feedback.get("step_start"),
-                        end=step_feedback.get("step_end"),
-                        generation=step_feedback.get("step_generation"),
-                        showInput=step_feedback.get("step_showinput"),
-                        language=step_feedback.get("step_language"),
-                        feedback=feedback,
-                    )
                     # Append the step to the steps list of the corresponding ThreadDict
-                    thread_dicts[thread_id]["steps"].append(step_dict)
+                    thread_dicts[thread_id]["steps"].append(
+                        self._step_row_to_dict(step_feedback)
+                    )
 
         if isinstance(elements, list):
             for element in elements:
                 thread_id = element["element_threadid"]
                 if thread_id is not None:
-                    element_dict = ElementDict(
-                        id=element["element_id"],
-                        threadId=thread_id,
-                        type=element["element_type"],
-                        chainlitKey=element.get("element_chainlitkey"),
-                        url=element.get("element_url"),
-                        objectKey=element.get("element_objectkey"),
-                        name=element["element_name"],
-                        display=element["element_display"],
-                        size=element.get("element_size"),
-                        language=element.get("element_language"),
-                        autoPlay=element.get("element_autoPlay"),
-                        playerConfig=element.get("element_playerconfig"),
-                        page=element.get("element_page"),
-                        props=element.get("props", "{}"),
-                        forId=element.get("element_forid"),
-                        mime=element.get("element_mime"),
+                    thread_dicts[thread_id]["elements"].append(  # type: ignore
+                        self._element_row_to_dict(element)
                     )
-                    thread_dicts[thread_id]["elements"].append(element_dict)  # type: ignore
 
         return list(thread_dicts.values())
+
+    def _step_row_to_dict(self, step_feedback: Dict[str, Any]) -> "StepDict":
+        feedback = None
+        if step_feedback["feedback_value"] is not None:
+            feedback = FeedbackDict(
+                forId=step_feedback["step_id"],
+                id=step_feedback.get("feedback_id"),
+                value=step_feedback["feedback_value"],
+                comment=step_feedback.get("feedback_comment"),
+            )
+        return StepDict(
+            id=step_feedback["step_id"],
+            name=step_feedback["step_name"],
+            type=step_feedback["step_type"],
+            threadId=step_feedback["step_threadid"],
+            parentId=step_feedback.get("step_parentid"),
+            streaming=step_feedback.get("step_streaming", False),
+            waitForAnswer=step_feedback.get("step_waitforanswer"),
+            isError=step_feedback.get("step_iserror"),
+            metadata=(
+                step_feedback["step_metadata"]
+                if step_feedback.get("step_metadata") is not None
+                else {}
+            ),
+            tags=step_feedback.get("step_tags"),
+            input=(
+                step_feedback.get("step_input", "")
+                if step_feedback.get("step_showinput") not in [None, "false"]
+                else ""
+            ),
+            output=step_feedback.get("step_output", ""),
+            createdAt=step_feedback.get("step_createdat"),
+            start=step_feedback.get("step_start"),
+            end=step_feedback.get("step_end"),
+            generation=step_feedback.get("step_generation"),
+            showInput=step_feedback.get("step_showinput"),
+            language=step_feedback.get("step_language"),
+            feedback=feedback,
+        )
+
+    def _element_row_to_dict(self, element: Dict[str, Any]) -> "ElementDict":
+        return ElementDict(
+            id=element["element_id"],
+            threadId=element["element_threadid"],
+            type=element["element_type"],
+            chainlitKey=element.get("element_chainlitkey"),
+            url=element.get("element_url"),
+            objectKey=element.get("element_objectkey"),
+            name=element["element_name"],
+            display=element["element_display"],
+            size=element.get("element_size"),
+            language=element.get("element_language"),
+            autoPlay=element.get("element_autoPlay"),
+            playerConfig=element.get("element_playerconfig"),
+            page=element.get("element_page"),
+            props=element.get("props", "{}"),
+            forId=element.get("element_forid"),
+            mime=element.get("element_mime"),
+        )
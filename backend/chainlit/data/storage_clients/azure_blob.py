@@ -1,15 +1,40 @@
+import base64
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Union
-
-from azure.storage.blob import BlobSasPermissions, ContentSettings, generate_blob_sas
-from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
-
-from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+from azure.core import MatchConditions
+from azure.storage.blob import (
+    BlobBlock,
+    BlobSasPermissions,
+    ContentSettings,
+    generate_blob_sas,
+)
+from azure.storage.blob.aio import (
+    BlobClient as AsyncBlobClient,
+    BlobServiceClient as AsyncBlobServiceClient,
+)
+
+from chainlit.data.storage_clients.base import (
+    BaseStorageClient,
+    iter_parts,
+    storage_expiry_time,
+    upload_parts,
+)
 from chainlit.logger import logger
 
 
 class AzureBlobStorageClient(BaseStorageClient):
-    def __init__(self, container_name: str, storage_account: str, storage_key: str):
+    def __init__(
+        self,
+        container_name: str,
+        storage_account: str,
+        storage_key: str,
+        block_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+    ):
+        # Streamed uploads hold at most `max_concurrency` blocks in memory
+        self.block_size = block_size
+        self.max_concurrency = max_concurrency
         self.container_name = container_name
         self.storage_account = storage_account
         self.storage_key = storage_key
@@ -66,21 +91,70 @@ class AzureBlobStorageClient(BaseStorageClient):
                 data, overwrite=overwrite, content_settings=content_settings
             )
 
-            properties = await blob_client.get_blob_properties()
+            return await self._uploaded_file(blob_client, object_key)
+
+        except Exception as e:
+            raise Exception(f"Failed to upload file to Azure Blob Storage: {e!s}")
+
+    async def _uploaded_file(
+        self, blob_client: AsyncBlobClient, object_key: str
+    ) -> Dict[str, Any]:
+        properties = await blob_client.get_blob_properties()
+
+        return {
+            "path": object_key,
+            "object_key": object_key,
+            "url": await self.get_read_url(object_key),
+            "size": properties.size,
+            "last_modified": properties.last_modified,
+            "etag": properties.etag,
+            "content_type": properties.content_settings.content_type,
+        }
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterator[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        try:
+            blob_client = self.container_client.get_blob_client(object_key)
+
+            async def stage_block(number: int, block: bytes) -> BlobBlock:
+                block_id = base64.b64encode(f"{number:08d}".encode()).decode()
+                await blob_client.stage_block(block_id, block, length=len(block))
+                return BlobBlock(block_id=block_id)
 
-            return {
-                "path": object_key,
-                "object_key": object_key,
-                "url": await self.get_read_url(object_key),
-                "size": properties.size,
-                "last_modified": properties.last_modified,
-                "etag": properties.etag,
-                "content_type": properties.content_settings.content_type,
-            }
+            # Staged blocks not committed are discarded after a week
+            blocks = await upload_parts(
+                iter_parts(stream, self.block_size), stage_block, self.max_concurrency
+            )
+            conditions: Dict[str, Any] = (
+                {} if overwrite else {"match_condition": MatchConditions.IfMissing}
+            )
+            await blob_client.commit_block_list(
+                blocks,
+                content_settings=ContentSettings(content_type=mime),
+                **conditions,
+            )
+
+            return await self._uploaded_file(blob_client, object_key)
 
         except Exception as e:
             raise Exception(f"Failed to upload file to Azure Blob Storage: {e!s}")
 
+    async def open_read(
+        self, object_key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        blob_client = self.container_client.get_blob_client(object_key)
+        downloader = await blob_client.download_blob(
+            offset=start, length=None if end is None else end - start + 1
+        )
+        async for chunk in downloader.chunks():
+            yield chunk
+
     async def delete_file(self, object_key: str) -> bool:
         try:
             blob_client = self.container_client.get_blob_client(blob=object_key)
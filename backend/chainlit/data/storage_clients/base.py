@@ -1,9 +1,90 @@
+import asyncio
 import os
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+import aiofiles
+import aiohttp
 
 storage_expiry_time = int(os.getenv("STORAGE_EXPIRY_TIME", 3600))
 
+# Size of the chunks read from files and downloads
+READ_CHUNK_SIZE = 1024 * 1024
+
+T = TypeVar("T")
+
+
+async def file_chunks(
+    path: str, chunk_size: int = READ_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Read a file chunk by chunk, to upload it with `upload_stream`."""
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            yield chunk
+
+
+async def iter_parts(
+    stream: AsyncIterator[bytes], part_size: int
+) -> AsyncIterator[bytes]:
+    """Regroup the chunks of a stream into parts of `part_size` bytes, but the last one."""
+    buffer = bytearray()
+    async for chunk in stream:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def upload_parts(
+    parts: AsyncIterator[bytes],
+    upload_part: Callable[[int, bytes], Awaitable[T]],
+    max_concurrency: int,
+) -> List[T]:
+    """
+    Upload the parts of a stream concurrently, numbered from 1. At most
+    `max_concurrency` parts are held in memory, the stream is read as they are sent.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks: List[asyncio.Future] = []
+    failed = False
+
+    async def upload(number: int, part: bytes) -> T:
+        nonlocal failed
+        try:
+            return await upload_part(number, part)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            semaphore.release()
+
+    try:
+        async for part in parts:
+            await semaphore.acquire()
+            if failed:
+                # No need to read the rest of the stream, the upload failed
+                break
+            tasks.append(asyncio.ensure_future(upload(len(tasks) + 1, part)))
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Let the parts being sent complete, so that nothing is uploaded once this
+        # returns (e.g. after a multipart upload is aborted). Cancelling them would
+        # not stop the threads sending them.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 
 class BaseStorageClient(ABC):
     """Base class for non-text data persistence like Azure Data Lake, S3, Google Storage, etc."""
@@ -18,6 +99,38 @@ class BaseStorageClient(ABC):
     ) -> Dict[str, Any]:
         pass
 
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterator[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Upload the chunks of a stream (e.g. `file_chunks(path)`), `size_hint` is its expected size if known.
+        Storage clients able to upload in parts should override it, it defaults to upload_file with the whole content.
+        """
+        data = b"".join([chunk async for chunk in stream])
+        return await self.upload_file(object_key, data, mime, overwrite)
+
+    async def open_read(
+        self, object_key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Download the bytes `start` to `end` (included, the last byte if None) of a file, chunk by chunk.
+        Storage clients should override it, it defaults to a ranged request of the read url.
+        """
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        url = await self.get_read_url(object_key)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+                    yield chunk
+
     @abstractmethod
     async def delete_file(self, object_key: str) -> bool:
         pass
@@ -1,12 +1,20 @@
-from typing import Any, Dict, Union
+from typing import Any, AsyncIterator, Dict, Optional, Union
 
 from google.cloud import storage  # type: ignore
 from google.oauth2 import service_account
 
 from chainlit import make_async
-from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
+from chainlit.data.storage_clients.base import (
+    READ_CHUNK_SIZE,
+    BaseStorageClient,
+    iter_parts,
+    storage_expiry_time,
+)
 from chainlit.logger import logger
 
+# Resumable uploads are sent by chunks, multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
 
 class GCSStorageClient(BaseStorageClient):
     def __init__(
@@ -74,6 +82,61 @@ class GCSStorageClient(BaseStorageClient):
             object_key, data, mime, overwrite
         )
 
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterator[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        try:
+            blob = self.bucket.blob(object_key)
+
+            if not overwrite and await make_async(blob.exists)():
+                raise Exception(
+                    f"File {object_key} already exists and overwrite is False"
+                )
+
+            # Resumable upload, a chunk is sent each time one is written
+            writer = await make_async(blob.open)(
+                "wb", content_type=mime, chunk_size=UPLOAD_CHUNK_SIZE
+            )
+            async for part in iter_parts(stream, UPLOAD_CHUNK_SIZE):
+                await make_async(writer.write)(part)
+            # Interrupted uploads are left unfinished, GCS discards them after a week
+            await make_async(writer.close)()
+
+            return {
+                "object_key": object_key,
+                "url": f"https://storage.googleapis.com/{self.bucket.name}/{object_key}",
+            }
+
+        except Exception as e:
+            raise Exception(f"Failed to upload file to GCS: {e!s}")
+
+    async def open_read(
+        self, object_key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        blob = self.bucket.blob(object_key)
+        # Range requests of READ_CHUNK_SIZE bytes
+        reader = await make_async(blob.open)("rb", chunk_size=READ_CHUNK_SIZE)
+        try:
+            if start:
+                await make_async(reader.seek)(start)
+            position = start
+            while end is None or position <= end:
+                size = READ_CHUNK_SIZE
+                if end is not None:
+                    size = min(size, end - position + 1)
+                chunk = await make_async(reader.read)(size)
+                if not chunk:
+                    break
+                position += len(chunk)
+                yield chunk
+        finally:
+            reader.close()
+
     def sync_delete_file(self, object_key: str) -> bool:
         try:
             self.bucket.blob(object_key).delete()
@@ -1,20 +1,49 @@
-from typing import Any, Dict, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
 import boto3  # type: ignore
+from botocore.exceptions import ClientError  # type: ignore
 
 from chainlit import make_async
-from chainlit.data.storage_clients.base import BaseStorageClient, storage_expiry_time
+from chainlit.data.storage_clients.base import (
+    READ_CHUNK_SIZE,
+    BaseStorageClient,
+    iter_parts,
+    storage_expiry_time,
+    upload_parts,
+)
 from chainlit.logger import logger
 
+# Parts of a multipart upload are at least 5 MiB, but the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# Error codes of conditional writes, when the object exists or they are not supported
+PRECONDITION_FAILED = "PreconditionFailed"
+NOT_SUPPORTED = ("NotImplemented", "InvalidArgument", "InvalidRequest")
+
 
 class S3StorageClient(BaseStorageClient):
     """
     Class to enable Amazon S3 storage provider
     """
 
-    def __init__(self, bucket: str, **kwargs: Any):
+    def __init__(
+        self,
+        bucket: str,
+        part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 4,
+        conditional_writes: bool = False,
+        **kwargs: Any,
+    ):
         try:
             self.bucket = bucket
+            # Streamed uploads hold at most `max_concurrency` parts in memory
+            self.part_size = max(part_size, MIN_PART_SIZE)
+            self.max_concurrency = max_concurrency
+            # Honour overwrite=False with conditional writes (If-None-Match), which
+            # some S3 compatible stores do not support. Objects are overwritten
+            # otherwise.
+            self.conditional_writes = conditional_writes
             self.client = boto3.client("s3", **kwargs)
             logger.info("S3StorageClient initialized")
         except Exception as e:
@@ -44,12 +73,16 @@ class S3StorageClient(BaseStorageClient):
     ) -> Dict[str, Any]:
         try:
             self.client.put_object(
-                Bucket=self.bucket, Key=object_key, Body=data, ContentType=mime
+                Bucket=self.bucket,
+                Key=object_key,
+                Body=data,
+                ContentType=mime,
+                **self._write_conditions(overwrite),
             )
             url = f"https://{self.bucket}.s3.amazonaws.com/{object_key}"
             return {"object_key": object_key, "url": url}
         except Exception as e:
-            logger.warn(f"S3StorageClient, upload_file error: {e}")
+            self._log_write_error("upload_file", object_key, e)
             return {}
 
     async def upload_file(
@@ -63,6 +96,123 @@ class S3StorageClient(BaseStorageClient):
             object_key, data, mime, overwrite
         )
 
+    def _write_conditions(self, overwrite: bool) -> Dict[str, Any]:
+        # Fails with a PreconditionFailed error if the object already exists
+        if overwrite or not self.conditional_writes:
+            return {}
+        return {"IfNoneMatch": "*"}
+
+    def _log_write_error(self, method: str, object_key: str, e: Exception):
+        code = (
+            e.response.get("Error", {}).get("Code")
+            if isinstance(e, ClientError)
+            else None
+        )
+        if code == PRECONDITION_FAILED:
+            logger.warning(
+                f"S3StorageClient, {method}: {object_key} already exists and overwrite is False"
+            )
+        elif code in NOT_SUPPORTED and self.conditional_writes:
+            logger.warning(
+                f"S3StorageClient, {method} error: {e}. The store may not support "
+                "conditional writes, disable conditional_writes."
+            )
+        else:
+            logger.warning(f"S3StorageClient, {method} error: {e}")
+
+    async def _upload_multipart(
+        self,
+        object_key: str,
+        parts: AsyncIterator[bytes],
+        mime: str,
+        overwrite: bool = True,
+    ):
+        upload = await make_async(self.client.create_multipart_upload)(
+            Bucket=self.bucket, Key=object_key, ContentType=mime
+        )
+        upload_id = upload["UploadId"]
+
+        async def upload_part(number: int, part: bytes) -> Dict[str, Any]:
+            response = await make_async(self.client.upload_part)(
+                Bucket=self.bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=part,
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+
+        try:
+            uploaded_parts = await upload_parts(
+                parts, upload_part, self.max_concurrency
+            )
+            await make_async(self.client.complete_multipart_upload)(
+                Bucket=self.bucket,
+                Key=object_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": uploaded_parts},
+                **self._write_conditions(overwrite),
+            )
+        except BaseException:
+            await make_async(self.client.abort_multipart_upload)(
+                Bucket=self.bucket, Key=object_key, UploadId=upload_id
+            )
+            raise
+
+    async def upload_stream(
+        self,
+        object_key: str,
+        stream: AsyncIterator[bytes],
+        mime: str = "application/octet-stream",
+        overwrite: bool = True,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        part_size = self.part_size
+        if size_hint:
+            # Larger parts for the files that would need more than MAX_PARTS
+            part_size = max(part_size, -(-size_hint // MAX_PARTS))
+
+        try:
+            parts = iter_parts(stream, part_size)
+            first_parts: List[bytes] = []
+            async for part in parts:
+                first_parts.append(part)
+                if len(first_parts) == 2:
+                    break
+            else:
+                # Not worth a multipart upload
+                data = b"".join(first_parts)
+                return await self.upload_file(object_key, data, mime, overwrite)
+
+            async def all_parts() -> AsyncIterator[bytes]:
+                for part in first_parts:
+                    yield part
+                async for part in parts:
+                    yield part
+
+            await self._upload_multipart(object_key, all_parts(), mime, overwrite)
+            url = f"https://{self.bucket}.s3.amazonaws.com/{object_key}"
+            return {"object_key": object_key, "url": url}
+        except Exception as e:
+            self._log_write_error("upload_stream", object_key, e)
+            return {}
+
+    async def open_read(
+        self, object_key: str, start: int = 0, end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        kwargs = {}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await make_async(self.client.get_object)(
+            Bucket=self.bucket, Key=object_key, **kwargs
+        )
+        body = response["Body"]
+        try:
+            while chunk := await make_async(body.read)(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
     def sync_delete_file(self, object_key: str) -> bool:
         try:
             self.client.delete_object(Bucket=self.bucket, Key=object_key)
@@ -1,8 +1,14 @@
 import functools
 from collections import deque
+from typing import TYPE_CHECKING, List, Optional
 
 from chainlit.context import context
 from chainlit.session import WebsocketSession
+from chainlit.types import ThreadStepsPage
+
+if TYPE_CHECKING:
+    from chainlit.element import ElementDict
+    from chainlit.step import StepDict
 
 
 def queue_until_user_message():
@@ -27,3 +33,41 @@ def queue_until_user_message():
         return wrapper
 
     return decorator
+
+
+def steps_window(
+    steps: List["StepDict"],
+    elements: List["ElementDict"],
+    before: Optional[str],
+    limit: int,
+) -> ThreadStepsPage:
+    """
+    Get the `limit` steps preceding the step `before` (or the last ones) out of the
+    steps of a thread, along with the ancestors they are nested in and the elements
+    of the steps. Elements not attached to a step come with the last steps.
+    """
+    ids = [step["id"] for step in steps]
+    if before is None:
+        end = len(ids)
+    else:
+        end = ids.index(before) if before in ids else 0
+    start = max(end - limit, 0)
+
+    parents = {step["id"]: step.get("parentId") for step in steps}
+    window = set(ids[start:end])
+    for step_id in ids[start:end]:
+        parent_id = parents[step_id]
+        while parent_id in parents and parent_id not in window:
+            window.add(parent_id)
+            parent_id = parents[parent_id]
+
+    return ThreadStepsPage(
+        steps=[step for step in steps if step["id"] in window],
+        elements=[
+            element
+            for element in elements
+            if element.get("forId") in window
+            or (not before and element.get("forId") not in parents)
+        ],
+        before=ids[start] if start > 0 else None,
+    )
@@ -18,10 +18,10 @@ from typing import (
 import filetype
 from pydantic import Field
 from pydantic.dataclasses import dataclass
-from syncer import asyncio
 
 from chainlit.context import context
 from chainlit.data import get_data_layer
+from chainlit.data.persistence_queue import persistence_queue
 from chainlit.logger import logger
 from chainlit.telemetry import trace_event
 
@@ -211,7 +211,7 @@ class Element:
 
         if (data_layer := get_data_layer()) and persist:
             try:
-                asyncio.create_task(data_layer.create_element(self))
+                await persistence_queue.create_element(data_layer, self)
             except Exception as e:
                 logger.error(f"Failed to create element: {e!s}")
         if not self.url and (not self.chainlit_key or self.updatable):
@@ -231,7 +231,7 @@ class Element:
         trace_event(f"remove {self.__class__.__name__}")
         data_layer = get_data_layer()
         if data_layer:
-            await data_layer.delete_element(self.id, self.thread_id)
+            await persistence_queue.delete_element(data_layer, self.id, self.thread_id)
         await context.emitter.emit("remove_element", {"id": self.id})
 
     async def send(self, for_id: str, persist=True):
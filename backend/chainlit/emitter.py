@@ -2,17 +2,18 @@ import asyncio
 import uuid
 from typing import Any, Dict, List, Literal, Optional, Union, cast, get_args
 
-from literalai.helper import utc_now
 from socketio.exceptions import TimeoutError
 
 from chainlit.chat_context import chat_context
+from chainlit.clock import utc_now
 from chainlit.config import config
 from chainlit.data import get_data_layer
 from chainlit.element import Element, ElementDict, File
 from chainlit.logger import logger
 from chainlit.message import Message
 from chainlit.session import BaseSession, WebsocketSession
-from chainlit.step import StepDict
+from chainlit.step import StepDict, diff_step_dict, snapshot_step_dict
+from chainlit.streaming import TokenCoalescer
 from chainlit.types import (
     AskActionResponse,
     AskSpec,
@@ -84,6 +85,10 @@ class BaseChainlitEmitter:
         """Stub method to delete a message in the UI."""
         pass
 
+    async def flush_tokens(self, id: Optional[str] = None):
+        """Stub method to send the buffered tokens to the UI."""
+        pass
+
     def send_timeout(self, event: Literal["ask_timeout", "call_fn_timeout"]):
         """Stub method to send a timeout to the UI."""
         pass
@@ -203,17 +208,58 @@ class ChainlitEmitter(BaseChainlitEmitter):
         """Stub method to send an element to the UI."""
         await self.emit("element", element_dict)
 
-    def send_step(self, step_dict: StepDict):
+    @property
+    def token_coalescer(self) -> Optional[TokenCoalescer]:
+        """Get the 'token_coalescer' property from the session, if any."""
+        return self._get_session_property("token_coalescer", raise_error=False)
+
+    async def flush_tokens(self, id: Optional[str] = None):
+        """Send the tokens buffered for a step (or for every step) to the UI."""
+        if coalescer := self.token_coalescer:
+            await coalescer.flush(id)
+
+    def _track_step(self, step_dict: StepDict) -> Optional[StepDict]:
+        """Remember the step sent to the UI and return its previous version, if known."""
+        sent_steps = self._get_session_property("sent_steps", raise_error=False)
+        if sent_steps is None:
+            return None
+        previous = sent_steps.get(step_dict["id"])
+        sent_steps.set(step_dict["id"], snapshot_step_dict(step_dict))
+        return previous
+
+    def _supports(self, capability: str) -> bool:
+        capabilities = self._get_session_property("capabilities", raise_error=False)
+        return bool(capabilities) and capability in capabilities
+
+    async def send_step(self, step_dict: StepDict):
         """Send a message to the UI."""
-        return self.emit("new_message", step_dict)
+        await self.flush_tokens(step_dict["id"])
+        self._track_step(step_dict)
+        await self.emit("new_message", step_dict)
 
-    def update_step(self, step_dict: StepDict):
-        """Update a message in the UI."""
-        return self.emit("update_message", step_dict)
+    async def update_step(self, step_dict: StepDict):
+        """
+        Update a message in the UI.
+        Only the fields changed since the step was last sent are emitted if the client supports it.
+        """
+        await self.flush_tokens(step_dict["id"])
+        previous = self._track_step(step_dict)
 
-    def delete_step(self, step_dict: StepDict):
+        if previous is None or not self._supports("patch_message"):
+            await self.emit("update_message", step_dict)
+            return
+
+        changes = diff_step_dict(previous, step_dict)
+        # The step id is always part of the changes
+        if len(changes) > 1:
+            await self.emit("patch_message", changes)
+
+    async def delete_step(self, step_dict: StepDict):
         """Delete a message in the UI."""
-        return self.emit("delete_message", step_dict)
+        await self.flush_tokens(step_dict["id"])
+        if sent_steps := self._get_session_property("sent_steps", raise_error=False):
+            sent_steps.discard(step_dict["id"])
+        await self.emit("delete_message", step_dict)
 
     def send_timeout(self, event: Literal["ask_timeout", "call_fn_timeout"]):
         return self.emit(event, {})
@@ -397,20 +443,28 @@ class ChainlitEmitter(BaseChainlitEmitter):
         """
         return self.emit("task_start", {})
 
-    def task_end(self):
+    async def task_end(self):
         """Send a task end signal to the UI."""
-        return self.emit("task_end", {})
+        await self.flush_tokens()
+        await self.emit("task_end", {})
 
     def stream_start(self, step_dict: StepDict):
         """Send a stream start signal to the UI."""
+        self._track_step(step_dict)
         return self.emit(
             "stream_start",
             step_dict,
         )
 
-    def send_token(self, id: str, token: str, is_sequence=False, is_input=False):
-        """Send a message token to the UI."""
-        return self.emit(
+    async def send_token(self, id: str, token: str, is_sequence=False, is_input=False):
+        """Send a message token to the UI. Tokens are coalesced per step when enabled."""
+        if coalescer := self.token_coalescer:
+            await coalescer.add(
+                id=id, token=token, is_sequence=is_sequence, is_input=is_input
+            )
+            return
+
+        await self.emit(
             "stream_token",
             {"id": id, "token": token, "isSequence": is_sequence, "isInput": is_input},
         )
@@ -1,21 +1,21 @@
 import asyncio
-import json
-import time
 import uuid
 from abc import ABC
 from typing import Dict, List, Optional, Union, cast
 
-from literalai.helper import utc_now
 from literalai.observability.step import MessageStepType
 
 from chainlit.action import Action
 from chainlit.chat_context import chat_context
+from chainlit.clock import utc_now
 from chainlit.config import config
 from chainlit.context import context, local_steps
 from chainlit.data import get_data_layer
+from chainlit.data.persistence_queue import persistence_queue
 from chainlit.element import ElementBased
 from chainlit.logger import logger
-from chainlit.step import StepDict
+from chainlit.serialization import dumps
+from chainlit.step import StepDict, diff_step_dict, snapshot_step_dict
 from chainlit.telemetry import trace_event
 from chainlit.types import (
     AskActionResponse,
@@ -44,6 +44,8 @@ class MessageBase(ABC):
     metadata: Optional[Dict] = None
     tags: Optional[List[str]] = None
     wait_for_answer = False
+    # Last version of the message handed to the data layer
+    _persisted_dict: Optional[StepDict] = None
 
     def __post_init__(self) -> None:
         trace_event(f"init {self.__class__.__name__}")
@@ -111,7 +113,19 @@ class MessageBase(ABC):
         data_layer = get_data_layer()
         if data_layer:
             try:
-                asyncio.create_task(data_layer.update_step(step_dict))
+                if self._persisted_dict is None:
+                    await persistence_queue.update_step(
+                        data_layer, step_dict, wait=self.fail_on_persist_error
+                    )
+                else:
+                    changes = diff_step_dict(self._persisted_dict, step_dict)
+                    await persistence_queue.patch_step(
+                        data_layer,
+                        step_dict,
+                        list(changes.keys()),
+                        wait=self.fail_on_persist_error,
+                    )
+                self._persisted_dict = snapshot_step_dict(step_dict)
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -131,7 +145,9 @@ class MessageBase(ABC):
         data_layer = get_data_layer()
         if data_layer:
             try:
-                asyncio.create_task(data_layer.delete_step(step_dict["id"]))
+                await persistence_queue.delete_step(
+                    data_layer, step_dict["id"], wait=self.fail_on_persist_error
+                )
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -146,8 +162,11 @@ class MessageBase(ABC):
         data_layer = get_data_layer()
         if data_layer and not self.persisted:
             try:
-                asyncio.create_task(data_layer.create_step(step_dict))
+                await persistence_queue.create_step(
+                    data_layer, step_dict, wait=self.fail_on_persist_error
+                )
                 self.persisted = True
+                self._persisted_dict = snapshot_step_dict(step_dict)
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -225,11 +244,10 @@ class Message(MessageBase):
         command: Optional[str] = None,
         created_at: Union[str, None] = None,
     ):
-        time.sleep(0.001)
         self.language = language
         if isinstance(content, dict):
             try:
-                self.content = json.dumps(content, indent=4, ensure_ascii=False)
+                self.content = dumps(content, indent=4)
                 self.language = "json"
             except TypeError:
                 self.content = str(content)
@@ -0,0 +1,75 @@
+import bisect
+from typing import Callable, Dict, List, Sequence
+
+# Upper bounds (in seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Distribution of observed values, by bucket."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = sorted(buckets)
+        # The last count is for the values above the highest bucket
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self, name: str) -> Dict[str, float]:
+        values: Dict[str, float] = {
+            f"{name}.count": self.count,
+            f"{name}.sum": self.sum,
+        }
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            values[f"{name}.le_{bound:g}"] = cumulative
+        return values
+
+
+class Metrics:
+    """
+    Process wide registry of internal counters, gauges and histograms.
+
+    Counters are incremented by Chainlit internals, gauges are computed when a
+    snapshot is taken and histograms count the observed values (e.g. latencies)
+    by bucket. Use `metrics.snapshot()` to export them to your monitoring.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def register_gauge(self, name: str, func: Callable[[], float]):
+        self.gauges[name] = func
+
+    def observe(
+        self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        if (histogram := self.histograms.get(name)) is None:
+            histogram = self.histograms[name] = Histogram(buckets)
+        histogram.observe(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        values = dict(self.counters)
+        for name, func in self.gauges.items():
+            values[name] = func()
+        for name, histogram in self.histograms.items():
+            values.update(histogram.snapshot(name))
+        return values
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from chainlit.logger import logger
+from chainlit.metrics import metrics
+
+
+class SessionReaper:
+    """
+    Clear the disconnected sessions once their timeout expires.
+
+    A single background task sleeps until the next expiry of a heap of deadlines
+    and clears all the expired sessions in one batch. Scheduling a session again
+    replaces its deadline, cancelling it (e.g. when the client reconnects) keeps
+    the session alive.
+    """
+
+    def __init__(self, reap: Callable[[List[str]], Awaitable[None]]) -> None:
+        self.reap = reap
+
+        # Deadline of each scheduled session, the heap may contain outdated entries
+        self._deadlines: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, session_id: str, timeout: float):
+        """Clear the session in `timeout` seconds, unless cancelled before."""
+        expires_at = time.monotonic() + timeout
+        self._deadlines[session_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, session_id))
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        else:
+            self._wakeup.set()
+
+    def cancel(self, session_id: str) -> bool:
+        """Keep the session alive, return True if it was scheduled."""
+        if self._deadlines.pop(session_id, None) is None:
+            return False
+        metrics.incr("session_reaper.cancelled")
+        if not self._deadlines:
+            # Nothing left to clear, let the task stop
+            self._wakeup.set()
+        return True
+
+    def pop_expired(self, now: float) -> List[str]:
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._heap)
+            # Skip the cancelled and rescheduled sessions
+            if self._deadlines.get(session_id) == expires_at:
+                del self._deadlines[session_id]
+                expired.append(session_id)
+        return expired
+
+    async def _run(self):
+        while self._deadlines:
+            self._wakeup.clear()
+
+            if expired := self.pop_expired(time.monotonic()):
+                try:
+                    await self.reap(expired)
+                except Exception as e:
+                    logger.error(f"Error clearing expired sessions: {e!s}")
+                metrics.incr("session_reaper.reaped", len(expired))
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
+
+        self._heap.clear()
@@ -0,0 +1,80 @@
+import json
+from typing import Any, Callable, Optional, Union
+
+from starlette.responses import JSONResponse as StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+Default = Optional[Callable[[Any], Any]]
+
+if orjson:
+    # Leave the types the standard library does not serialize to `default`, so the
+    # output does not depend on the backend.
+    ORJSON_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+
+def dumps_bytes(
+    obj: Any, indent: Optional[int] = None, default: Default = None
+) -> bytes:
+    """
+    Serialize `obj` to UTF-8 encoded JSON, indented by `indent` spaces if provided.
+
+    Uses orjson when it is installed and falls back to the standard library for
+    what orjson cannot serialize (e.g. integers over 64 bits) and for indents
+    other than 2 spaces.
+    """
+    if orjson and indent in (None, 2):
+        option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else ORJSON_OPTIONS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+
+    return json.dumps(
+        obj,
+        default=default,
+        ensure_ascii=False,
+        indent=indent,
+        separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def dumps(obj: Any, indent: Optional[int] = None, default: Default = None) -> str:
+    """Serialize `obj` to a JSON string."""
+    return dumps_bytes(obj, indent=indent, default=default).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Deserialize a JSON document."""
+    if orjson:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+class SocketIOJSON:
+    """JSON module used by python-socketio to encode and decode the packets."""
+
+    @staticmethod
+    def dumps(obj: Any, *args, **kwargs) -> str:
+        return dumps(obj)
+
+    @staticmethod
+    def loads(data: Union[str, bytes], *args, **kwargs) -> Any:
+        return loads(data)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON response rendered with the fast serializer."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
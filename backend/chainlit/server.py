@@ -25,17 +25,24 @@ from fastapi import (
     UploadFile,
     status,
 )
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette.datastructures import URL
 from starlette.middleware.cors import CORSMiddleware
 from typing_extensions import Annotated
 from watchfiles import awatch
 
-from chainlit.auth import create_jwt, decode_jwt, get_configuration, get_current_user
+from chainlit.auth import (
+    create_jwt,
+    decode_jwt,
+    evict_jwt,
+    get_configuration,
+    get_current_user,
+)
 from chainlit.auth.cookie import (
     clear_auth_cookie,
     clear_oauth_state_cookie,
+    get_token_from_cookies,
     set_auth_cookie,
     set_oauth_state_cookie,
     validate_oauth_state_cookie,
@@ -53,10 +60,13 @@ from chainlit.config import (
 )
 from chainlit.data import get_data_layer
 from chainlit.data.acl import is_thread_author
+from chainlit.data.persistence_queue import persistence_queue
 from chainlit.logger import logger
 from chainlit.markdown import get_markdown_str
 from chainlit.oauth_providers import get_oauth_provider
 from chainlit.secret import random_secret
+from chainlit.serialization import JSONResponse, SocketIOJSON
+from chainlit.socket_serializer import NegotiatedSerializerServer
 from chainlit.types import (
     CallActionRequest,
     ConnectMCPRequest,
@@ -83,6 +93,12 @@ async def lifespan(app: FastAPI):
     if config.code.on_app_startup:
         await config.code.on_app_startup()
 
+    if data_layer := get_data_layer():
+        try:
+            await data_layer.connect()
+        except Exception as e:
+            logger.error(f"Failed to connect the data layer: {e!s}")
+
     host = config.run.host
     port = config.run.port
     root_path = os.getenv("CHAINLIT_ROOT_PATH", "")
@@ -151,6 +167,11 @@ async def lifespan(app: FastAPI):
             if config.code.on_app_shutdown:
                 await config.code.on_app_shutdown()
 
+            # Write the steps and elements still waiting to be persisted
+            await persistence_queue.flush()
+            if data_layer:
+                await data_layer.close()
+
             if watch_task:
                 stop_event.set()
                 watch_task.cancel()
@@ -199,9 +220,28 @@ def get_build_dir(local_target: str, packaged_target: str) -> str:
 build_dir = get_build_dir("frontend", "frontend")
 copilot_build_dir = get_build_dir(os.path.join("libs", "copilot"), "copilot")
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=JSONResponse)
 
-sio = socketio.AsyncServer(cors_allowed_origins=[], async_mode="asgi")
+
+def get_client_manager() -> Optional[socketio.AsyncManager]:
+    """
+    Get the socket.io client manager.
+
+    When CHAINLIT_REDIS_URL is set, events are published through Redis so any worker
+    can emit to a socket connected to another worker.
+    """
+    if redis_url := os.environ.get("CHAINLIT_REDIS_URL"):
+        return socketio.AsyncRedisManager(redis_url)
+    return None
+
+
+sio = NegotiatedSerializerServer(
+    cors_allowed_origins=[],
+    async_mode="asgi",
+    client_manager=get_client_manager(),
+    json=SocketIOJSON,
+    msgpack=config.project.msgpack_serializer,
+)
 
 asgi_app = socketio.ASGIApp(socketio_server=sio, socketio_path="")
 
@@ -509,6 +549,8 @@ async def login(
 @router.post("/logout")
 async def logout(request: Request, response: Response):
     """Logout the user by calling the on_logout callback."""
+    if token := get_token_from_cookies(request.cookies):
+        evict_jwt(token)
     clear_auth_cookie(request, response)
 
     if config.code.on_logout:
@@ -892,6 +934,29 @@ async def get_thread(
     return JSONResponse(content=res)
 
 
+@router.get("/project/thread/{thread_id}/steps")
+async def get_thread_steps(
+    request: Request,
+    thread_id: str,
+    current_user: UserParam,
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Get the steps of a thread preceding a step, page by page."""
+    data_layer = get_data_layer()
+
+    if not data_layer:
+        raise HTTPException(status_code=400, detail="Data persistence is not enabled")
+
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    await is_thread_author(current_user.identifier, thread_id)
+
+    res = await data_layer.get_thread_steps(thread_id, before=before, limit=limit)
+    return JSONResponse(content=res)
+
+
 @router.get("/project/thread/{thread_id}/element/{element_id}")
 async def get_thread_element(
     request: Request,
@@ -1,46 +1,57 @@
 import asyncio
-import json
 import mimetypes
 import shutil
 import uuid
 from contextlib import AsyncExitStack
-from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Literal, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
 
 import aiofiles
 
 from chainlit.logger import logger
+from chainlit.metrics import metrics
+from chainlit.serialization import dumps_bytes, loads
+from chainlit.streaming import OutboundQueue, ReplayBuffer, SentSteps, TokenCoalescer
 from chainlit.types import FileReference
 
 if TYPE_CHECKING:
     from mcp import ClientSession
 
+    from chainlit.audio import AudioStream
+    from chainlit.session_store import SessionState
     from chainlit.types import FileDict
     from chainlit.user import PersistedUser, User
 
 ClientType = Literal["webapp", "copilot", "teams", "slack", "discord"]
 
+# Number of steps per session for which only the changed fields are sent on update
+SENT_STEPS_MAXSIZE = 1000
 
-class JSONEncoderIgnoreNonSerializable(json.JSONEncoder):
-    def default(self, o):
-        try:
-            return super().default(o)
-        except TypeError:
-            return None
+# Seconds the new events of a reconnected client wait for the events it missed to
+# be replayed, before they are sent without them
+REPLAY_TIMEOUT = 10
 
 
 def clean_metadata(metadata: Dict, max_size: int = 1048576):
-    cleaned_metadata = json.loads(
-        json.dumps(metadata, cls=JSONEncoderIgnoreNonSerializable, ensure_ascii=False)
-    )
+    # Non serializable values are replaced by null
+    encoded = dumps_bytes(metadata, default=lambda o: None)
 
-    metadata_size = len(json.dumps(cleaned_metadata).encode("utf-8"))
-    if metadata_size > max_size:
+    if len(encoded) > max_size:
         # Redact the metadata if it exceeds the maximum size
-        cleaned_metadata = {
+        return {
             "message": f"Metadata size exceeds the limit of {max_size} bytes. Redacted."
         }
 
-    return cleaned_metadata
+    return loads(encoded)
 
 
 class BaseSession:
@@ -228,6 +239,8 @@ class WebsocketSession(BaseSession):
         token: Optional[str] = None,
         # Chat profile selected before the session was created
         chat_profile: Optional[str] = None,
+        # Optional protocol features supported by the client (e.g. "patch_message")
+        capabilities: Optional[List[str]] = None,
     ):
         super().__init__(
             id=id,
@@ -241,17 +254,97 @@ class WebsocketSession(BaseSession):
         )
 
         self.socket_id = socket_id
-        self.emit_call = emit_call
-        self.emit = emit
+        # Functions writing to the socket, replaced when the client reconnects
+        self.socket_emit = emit
+        self.socket_emit_call = emit_call
 
+        self.capabilities = set(capabilities or [])
         self.restored = False
+        # Last sequence number received by the client before it reconnected
+        self.resume_seq: Optional[int] = None
 
         self.thread_queues: Dict[str, ThreadQueue] = {}
         self.mcp_sessions = {}
+        # Audio of the current (or last) audio session
+        self.audio_stream: Optional[AudioStream] = None
+
+        from chainlit.config import config
+
+        self.outbound_queue = OutboundQueue(
+            send=self._socket_send, maxsize=config.project.outbound_queue_size
+        )
+        self.sent_steps = SentSteps(maxsize=SENT_STEPS_MAXSIZE)
+        self.replay_buffer = ReplayBuffer(maxsize=config.project.replay_buffer_size)
+        self._send_lock = asyncio.Lock()
+        # Cleared while a reconnected client waits for the events it missed
+        self._replayed = asyncio.Event()
+        self._replayed.set()
+        self.token_coalescer = TokenCoalescer(
+            self,
+            interval=config.project.stream_flush_interval_ms / 1000,
+            max_size=config.project.stream_flush_max_size,
+        )
 
         ws_sessions_id[self.id] = self
         ws_sessions_sid[socket_id] = self
 
+    async def _socket_send(self, event: str, data: Any):
+        while True:
+            try:
+                await asyncio.wait_for(self._replayed.wait(), REPLAY_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.info(
+                    f"Events of session {self.id} were not replayed in time, sending new events."
+                )
+                self.cancel_replay()
+            async with self._send_lock:
+                if not self._replayed.is_set():
+                    # The client reconnected while the event was waiting for the lock
+                    continue
+                if "event_seq" not in self.capabilities:
+                    return await self.socket_emit(event, data)
+                # The sequence number is sent as an extra argument to keep the payloads as is
+                seq = self.replay_buffer.append(event, data)
+                return await self.socket_emit(event, (data, seq))
+
+    def resume_from(self, last_seq: Optional[int]):
+        """
+        Hold the new events of a reconnected client until the events it missed since
+        `last_seq` are replayed, so it gets every event once and in order.
+        """
+        self.resume_seq = last_seq
+        if last_seq is not None and "event_seq" in self.capabilities:
+            self._replayed.clear()
+
+    def cancel_replay(self):
+        """Stop holding the new events, when the missed events will not be replayed."""
+        self.resume_seq = None
+        self._replayed.set()
+
+    async def replay(self, last_seq: int) -> bool:
+        """Send again the events sent after `last_seq`, missed by a reconnecting client."""
+        try:
+            async with self._send_lock:
+                events = self.replay_buffer.since(last_seq)
+                if events is None:
+                    return False
+                for seq, event, data in events:
+                    await self.socket_emit(event, (data, seq))
+            return True
+        finally:
+            self._replayed.set()
+
+    def emit(self, event: str, data: Any):
+        """Queue an event to send to the client."""
+        return self.outbound_queue.put(event, data)
+
+    async def emit_call(
+        self, event: Literal["ask", "call_fn"], data: Any, timeout: Optional[int]
+    ):
+        """Send an event to the client once the queue is drained and wait for the response."""
+        await self.outbound_queue.join()
+        return await self.socket_emit_call(event, data, timeout)
+
     def restore(self, new_socket_id: str):
         """Associate a new socket id to the session."""
         ws_sessions_sid.pop(self.socket_id, None)
@@ -259,13 +352,44 @@ class WebsocketSession(BaseSession):
         self.socket_id = new_socket_id
         self.restored = True
 
-    async def delete(self):
+    def to_state(self, chat_context: List[Dict]) -> "SessionState":
+        """Snapshot of the session that can be restored by another worker."""
+        return {
+            "id": self.id,
+            "threadId": self.thread_id,
+            "threadIdToResume": self.thread_id_to_resume,
+            "userIdentifier": self.user.identifier if self.user else None,
+            "clientType": self.client_type,
+            "chatProfile": self.chat_profile,
+            "chatSettings": self.chat_settings,
+            "hasFirstInteraction": self.has_first_interaction,
+            "userSession": self.to_persistable(),
+            "chatContext": chat_context,
+        }
+
+    def load_state(self, state: "SessionState"):
+        """Restore a session snapshot taken by another worker."""
+        self.thread_id = state["threadId"]
+        self.thread_id_to_resume = state.get("threadIdToResume")
+        self.client_type = state.get("clientType") or self.client_type
+        self.chat_profile = state.get("chatProfile")
+        self.chat_settings = state.get("chatSettings") or {}
+        self.has_first_interaction = state.get("hasFirstInteraction", False)
+        self.restored = True
+
+    async def delete(self, remove_files: bool = True):
         """Delete the session."""
-        if self.files_dir.is_dir():
+        if remove_files and self.files_dir.is_dir():
             shutil.rmtree(self.files_dir)
         ws_sessions_sid.pop(self.socket_id, None)
         ws_sessions_id.pop(self.id, None)
 
+        self.cancel_replay()
+        self.token_coalescer.close()
+        self.outbound_queue.close()
+        if self.audio_stream:
+            self.audio_stream.cancel()
+
         for _, exit_stack in self.mcp_sessions.values():
             try:
                 await exit_stack.aclose()
@@ -273,7 +397,26 @@ class WebsocketSession(BaseSession):
                 pass
 
     async def flush_method_queue(self):
+        from chainlit.data.persistence_queue import BULK_METHODS
+
         for method_name, queue in self.thread_queues.items():
+            if (bulk_method_name := BULK_METHODS.get(method_name)) and len(queue) > 1:
+                # Replay the queued creations at once
+                data_layer = queue[0][1]
+                if all(
+                    call[1] is data_layer and len(call[2]) == 1 and not call[3]
+                    for call in queue
+                ):
+                    calls = list(queue)
+                    queue.clear()
+                    try:
+                        await getattr(data_layer, bulk_method_name)(
+                            [call[2][0] for call in calls]
+                        )
+                    except Exception as e:
+                        logger.error(f"Error while flushing {method_name}: {e}")
+                    continue
+
             while queue:
                 method, self, args, kwargs = queue.popleft()
                 try:
@@ -301,3 +444,8 @@ class WebsocketSession(BaseSession):
 
 ws_sessions_sid: Dict[str, WebsocketSession] = {}
 ws_sessions_id: Dict[str, WebsocketSession] = {}
+
+metrics.register_gauge(
+    "outbound_queue.depth",
+    lambda: sum(session.outbound_queue.depth for session in ws_sessions_id.values()),
+)
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+
+from chainlit.logger import logger
+
+
+class SessionState(TypedDict, total=False):
+    """Serializable snapshot of a websocket session."""
+
+    id: str
+    threadId: str
+    threadIdToResume: Optional[str]
+    userIdentifier: Optional[str]
+    clientType: str
+    chatProfile: Optional[str]
+    chatSettings: Dict[str, Any]
+    hasFirstInteraction: bool
+    userSession: Dict[str, Any]
+    chatContext: List[Dict[str, Any]]
+
+
+class BaseSessionStore(ABC):
+    """
+    Base class for session stores.
+
+    Live websocket sessions are tied to a socket and stay in the memory of the worker
+    handling it. The session store keeps a snapshot of the disconnected sessions so a
+    reconnection landing on another worker (or node) can restore them.
+    """
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        pass
+
+    @abstractmethod
+    async def set(self, session_id: str, state: SessionState, ttl: int):
+        pass
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        pass
+
+
+class InMemorySessionStore(BaseSessionStore):
+    """
+    Process local session store, only useful with a single worker. Disconnected
+    sessions are not saved to it, they stay in memory until they are cleared.
+    """
+
+    def __init__(self) -> None:
+        self._states: Dict[str, Tuple[float, SessionState]] = {}
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        if entry := self._states.get(session_id):
+            expires_at, state = entry
+            if expires_at > time.monotonic():
+                return state
+            self._states.pop(session_id, None)
+        return None
+
+    async def set(self, session_id: str, state: SessionState, ttl: int):
+        self._states[session_id] = (time.monotonic() + ttl, state)
+
+    async def delete(self, session_id: str):
+        self._states.pop(session_id, None)
+
+
+class RedisSessionStore(BaseSessionStore):
+    """
+    Session store backed by Redis, shared by all the workers.
+
+    Accepts any client exposing the `redis.asyncio` `get`/`set`/`delete` coroutines.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        client: Optional[Any] = None,
+        prefix: str = "chainlit:session:",
+    ) -> None:
+        if client is None:
+            if not url:
+                raise ValueError("Either url or client must be provided")
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise ImportError(
+                    "The redis package is required to use RedisSessionStore. Install it with `pip install chainlit[redis]`."
+                ) from e
+            client = Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        raw = await self.client.get(self._key(session_id))
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            logger.error(f"Invalid session state for {session_id}: {e!s}")
+            return None
+
+    async def set(self, session_id: str, state: SessionState, ttl: int):
+        await self.client.set(
+            self._key(session_id), json.dumps(state, ensure_ascii=False), ex=ttl
+        )
+
+    async def delete(self, session_id: str):
+        await self.client.delete(self._key(session_id))
+
+
+_session_store: Optional[BaseSessionStore] = None
+
+
+def get_session_store() -> BaseSessionStore:
+    global _session_store
+
+    if _session_store is None:
+        from chainlit.config import config
+
+        if config.code.session_store:
+            # When @session_store is configured, call it to get the session store.
+            _session_store = config.code.session_store()
+        elif redis_url := os.environ.get("CHAINLIT_REDIS_URL"):
+            _session_store = RedisSessionStore(url=redis_url)
+        else:
+            _session_store = InMemorySessionStore()
+
+    return _session_store
@@ -1,24 +1,29 @@
 import asyncio
 import json
-from typing import Any, Dict, Literal, Optional, Tuple, Union
+import shutil
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 from urllib.parse import unquote
 
 from starlette.requests import cookie_parser
 from typing_extensions import TypeAlias
 
+from chainlit.audio import AudioStream, audio_stream
 from chainlit.auth import (
     get_current_user,
     get_token_from_cookies,
     require_login,
 )
-from chainlit.chat_context import chat_context
+from chainlit.chat_context import chat_context, chat_contexts
 from chainlit.config import config
 from chainlit.context import init_ws_context
 from chainlit.data import get_data_layer
 from chainlit.logger import logger
 from chainlit.message import ErrorMessage, Message
+from chainlit.metrics import metrics
+from chainlit.reaper import SessionReaper
 from chainlit.server import sio
 from chainlit.session import WebsocketSession
+from chainlit.session_store import InMemorySessionStore, get_session_store
 from chainlit.telemetry import trace_event
 from chainlit.types import InputAudioChunk, InputAudioChunkPayload, MessagePayload
 from chainlit.user import PersistedUser, User
@@ -27,17 +32,76 @@ from chainlit.user_session import user_sessions
 WSGIEnvironment: TypeAlias = dict[str, Any]
 
 
-def restore_existing_session(sid, session_id, emit_fn, emit_call_fn):
+async def clear_sessions(session_ids: List[str]):
+    """
+    Clear the sessions and everything attached to them.
+
+    Their snapshots in the session store expire on their own: the client may have
+    reconnected to another worker since, which saved a newer one.
+    """
+    files_dirs = []
+
+    for session_id in session_ids:
+        user_sessions.pop(session_id, None)
+        chat_contexts.pop(session_id, None)
+        try:
+            if session := WebsocketSession.get_by_id(session_id):
+                if session.files_dir.is_dir():
+                    files_dirs.append(session.files_dir)
+                await session.delete(remove_files=False)
+        except Exception as e:
+            logger.error(f"Error clearing session {session_id}: {e!s}")
+
+    def remove_files_dirs():
+        for files_dir in files_dirs:
+            shutil.rmtree(files_dir, ignore_errors=True)
+
+    if files_dirs:
+        await asyncio.to_thread(remove_files_dirs)
+
+
+session_reaper = SessionReaper(reap=clear_sessions)
+metrics.register_gauge("session_reaper.pending", lambda: session_reaper.pending)
+
+
+def restore_existing_session(
+    sid, session_id, emit_fn, emit_call_fn, capabilities, last_seq=None
+):
     """Restore a session from the sessionId provided by the client."""
     if session := WebsocketSession.get_by_id(session_id):
         session.restore(new_socket_id=sid)
-        session.emit = emit_fn
-        session.emit_call = emit_call_fn
+        session.socket_emit = emit_fn
+        session.socket_emit_call = emit_call_fn
+        session.capabilities = set(capabilities)
+        session.resume_from(last_seq)
+        session_reaper.cancel(session.id)
         trace_event("session_restored")
         return True
     return False
 
 
+async def restore_stored_session(session: WebsocketSession) -> bool:
+    """Restore a session snapshot saved by another worker in the session store."""
+    state = await get_session_store().get(session.id)
+    if not state:
+        return False
+
+    user_identifier = session.user.identifier if session.user else None
+    if state.get("userIdentifier") != user_identifier:
+        logger.warning(f"Session {session.id} belongs to another user, not restored.")
+        return False
+
+    session.load_state(state)
+    user_sessions[session.id] = state.get("userSession") or {}
+
+    init_ws_context(session)
+    for step_dict in state.get("chatContext") or []:
+        chat_context.add(Message.from_dict(step_dict))
+
+    trace_event("session_restored_from_store")
+    return True
+
+
 async def persist_user_session(thread_id: str, metadata: Dict):
     if data_layer := get_data_layer():
         await data_layer.update_thread(thread_id=thread_id, metadata=metadata)
@@ -47,7 +111,11 @@ async def resume_thread(session: WebsocketSession):
     data_layer = get_data_layer()
     if not data_layer or not session.user or not session.thread_id_to_resume:
         return
-    thread = await data_layer.get_thread(thread_id=session.thread_id_to_resume)
+    if limit := config.project.resume_steps_limit:
+        # The previous steps are loaded by the client as the user scrolls up
+        thread = await data_layer.get_thread_window(session.thread_id_to_resume, limit)
+    else:
+        thread = await data_layer.get_thread(thread_id=session.thread_id_to_resume)
     if not thread:
         return
 
@@ -134,7 +202,16 @@ async def connect(sid, environ, auth):
         return sio.call(event, data, timeout=timeout, to=sid)
 
     session_id = auth.get("sessionId")
-    if restore_existing_session(sid, session_id, emit_fn, emit_call_fn):
+    capabilities = auth.get("capabilities") or []
+    last_seq = auth.get("lastSeq")
+    if not isinstance(last_seq, int):
+        last_seq = None
+    if "event_seq" in capabilities:
+        # Sent before any other event, tells the client the events carry a sequence number
+        await sio.emit("event_seq", to=sid)
+    if restore_existing_session(
+        sid, session_id, emit_fn, emit_call_fn, capabilities, last_seq
+    ):
         return True
 
     user_env_string = auth.get("userEnv")
@@ -146,7 +223,7 @@ async def connect(sid, environ, auth):
         unquote(url_encoded_chat_profile) if url_encoded_chat_profile else None
     )
 
-    WebsocketSession(
+    session = WebsocketSession(
         id=session_id,
         socket_id=sid,
         emit=emit_fn,
@@ -158,8 +235,14 @@ async def connect(sid, environ, auth):
         chat_profile=chat_profile,
         thread_id=auth.get("threadId"),
         environ=environ,
+        capabilities=capabilities,
     )
 
+    try:
+        await restore_stored_session(session)
+    except Exception as e:
+        logger.error(f"Error restoring session from the session store: {e!s}")
+
     trace_event("connection_successful")
     return True
 
@@ -168,6 +251,14 @@ async def connect(sid, environ, auth):
 async def connection_successful(sid):
     context = init_ws_context(sid)
 
+    if context.session.resume_seq is not None:
+        # Send the events emitted while the client was disconnected first
+        last_seq, context.session.resume_seq = context.session.resume_seq, None
+        if not await context.session.replay(last_seq):
+            logger.info(
+                f"Events of session {context.session.id} since {last_seq} are no longer available."
+            )
+
     await context.emitter.task_end()
     await context.emitter.clear("clear_ask")
     await context.emitter.clear("clear_call_fn")
@@ -214,6 +305,8 @@ async def disconnect(sid):
         return
 
     init_ws_context(session)
+    # The client will not ask for the events it missed on this connection
+    session.cancel_replay()
 
     if config.code.on_chat_end:
         await config.code.on_chat_end()
@@ -221,23 +314,29 @@ async def disconnect(sid):
     if session.thread_id and session.has_first_interaction:
         await persist_user_session(session.thread_id, session.to_persistable())
 
-    async def clear(_sid):
-        if session := WebsocketSession.get(_sid):
-            # Clean up the user session
-            if session.id in user_sessions:
-                user_sessions.pop(session.id)
-            # Clean up the session
-            await session.delete()
-
+    session_store = get_session_store()
     if session.to_clear:
-        await clear(sid)
+        session_reaper.cancel(session.id)
+        await clear_sessions([session.id])
+        try:
+            await session_store.delete(session.id)
+        except Exception as e:
+            logger.error(f"Error deleting session from the session store: {e!s}")
     else:
-
-        async def clear_on_timeout(_sid):
-            await asyncio.sleep(config.project.session_timeout)
-            await clear(_sid)
-
-        asyncio.ensure_future(clear_on_timeout(sid))
+        # With a single worker, the live session is restored as is
+        if not isinstance(session_store, InMemorySessionStore):
+            try:
+                # Save the session so a reconnection on another worker can restore it
+                state = session.to_state(
+                    chat_context=[message.to_dict() for message in chat_context.get()]
+                )
+                await session_store.set(
+                    session.id, state, ttl=config.project.session_timeout
+                )
+            except Exception as e:
+                logger.error(f"Error saving session to the session store: {e!s}")
+
+        session_reaper.schedule(session.id, config.project.session_timeout)
 
 
 @sio.on("stop")  # pyright: ignore [reportOptionalCall]
@@ -334,6 +433,14 @@ async def audio_start(sid):
     session = WebsocketSession.require(sid)
 
     context = init_ws_context(session)
+
+    if session.audio_stream:
+        session.audio_stream.cancel()
+    session.audio_stream = AudioStream(
+        maxsize=config.features.audio.chunk_queue_size,
+        max_buffer_size=config.features.audio.max_buffer_size_mb * 1024 * 1024,
+    )
+
     if config.code.on_audio_start:
         connected = bool(await config.code.on_audio_start())
         connection_state = "on" if connected else "off"
@@ -347,8 +454,8 @@ async def audio_chunk(sid, payload: InputAudioChunkPayload):
 
     init_ws_context(session)
 
-    if config.code.on_audio_chunk:
-        asyncio.create_task(config.code.on_audio_chunk(InputAudioChunk(**payload)))
+    # Chunks are processed in order by the audio stream consumer
+    await audio_stream().put(InputAudioChunk(**payload))
 
 
 @sio.on("audio_end")
@@ -363,6 +470,9 @@ async def audio_end(sid):
             session.has_first_interaction = True
             asyncio.create_task(context.emitter.init_thread("audio"))
 
+        if session.audio_stream:
+            await session.audio_stream.close()
+
         if config.code.on_audio_end:
             await config.code.on_audio_end()
 
@@ -0,0 +1,87 @@
+from typing import Optional, Set, Type
+from urllib.parse import parse_qs
+
+import socketio
+from socketio import packet
+
+from chainlit.logger import logger
+
+
+class NegotiatedSerializerServer(socketio.AsyncServer):
+    """
+    Socket.IO server speaking JSON or MessagePack, depending on the client.
+
+    Clients supporting MessagePack add `serializer=msgpack` to the connection query.
+    When `msgpack` is enabled, the packets sent to those clients are encoded with
+    MessagePack, and binary packets received from them are decoded with it. A client
+    switches to MessagePack once it receives a MessagePack packet, so clients not
+    asking for it, or connected to a server without it, keep using JSON.
+    """
+
+    def __init__(self, *args, msgpack: bool = False, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.msgpack_packet_class: Optional[Type[packet.Packet]] = None
+        if msgpack:
+            try:
+                from socketio.msgpack_packet import MsgPackPacket
+
+                self.msgpack_packet_class = MsgPackPacket
+            except ImportError:
+                logger.error(
+                    "The msgpack package is required to use the msgpack serializer. Install it with `pip install msgpack`."
+                )
+
+        self._msgpack_eio_sids: Set[str] = set()
+
+    def uses_msgpack(self, eio_sid: str) -> bool:
+        return eio_sid in self._msgpack_eio_sids
+
+    async def _handle_eio_connect(self, eio_sid, environ):
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        if self.msgpack_packet_class and "msgpack" in query.get("serializer", []):
+            self._msgpack_eio_sids.add(eio_sid)
+        return await super()._handle_eio_connect(eio_sid, environ)
+
+    async def _handle_eio_disconnect(self, eio_sid, reason):
+        try:
+            await super()._handle_eio_disconnect(eio_sid, reason)
+        finally:
+            self._msgpack_eio_sids.discard(eio_sid)
+
+    async def _handle_eio_message(self, eio_sid, data):
+        # Binary messages are JSON packet attachments, unless no packet awaits one
+        if (
+            self.msgpack_packet_class
+            and self.uses_msgpack(eio_sid)
+            and isinstance(data, bytes)
+            and eio_sid not in self._binary_packet
+        ):
+            pkt = self.msgpack_packet_class(encoded_packet=data)
+            if pkt.packet_type == packet.CONNECT:
+                await self._handle_connect(eio_sid, pkt.namespace, pkt.data)
+            elif pkt.packet_type == packet.DISCONNECT:
+                await self._handle_disconnect(
+                    eio_sid, pkt.namespace, self.reason.CLIENT_DISCONNECT
+                )
+            elif pkt.packet_type == packet.EVENT:
+                await self._handle_event(eio_sid, pkt.namespace, pkt.id, pkt.data)
+            elif pkt.packet_type == packet.ACK:
+                await self._handle_ack(eio_sid, pkt.namespace, pkt.id, pkt.data)
+            else:
+                raise ValueError("Unexpected packet type.")
+            return
+
+        await super()._handle_eio_message(eio_sid, data)
+
+    async def _send_packet(self, eio_sid, pkt):
+        if self.msgpack_packet_class and self.uses_msgpack(eio_sid):
+            # MessagePack carries binary data as is, no need for attachments
+            packet_type = {
+                packet.BINARY_EVENT: packet.EVENT,
+                packet.BINARY_ACK: packet.ACK,
+            }.get(pkt.packet_type, pkt.packet_type)
+            pkt = self.msgpack_packet_class(
+                packet_type, data=pkt.data, namespace=pkt.namespace, id=pkt.id
+            )
+        await super()._send_packet(eio_sid, pkt)
@@ -1,21 +1,21 @@
 import asyncio
 import inspect
-import json
-import time
 import uuid
 from copy import deepcopy
 from functools import wraps
-from typing import Callable, Dict, List, Optional, TypedDict, Union
+from typing import Callable, Dict, List, Optional, TypedDict, Union, cast
 
 from literalai import BaseGeneration
-from literalai.helper import utc_now
 from literalai.observability.step import StepType, TrueStepType
 
+from chainlit.clock import utc_now
 from chainlit.config import config
 from chainlit.context import CL_RUN_NAMES, context, local_steps
 from chainlit.data import get_data_layer
+from chainlit.data.persistence_queue import persistence_queue
 from chainlit.element import Element
 from chainlit.logger import logger
+from chainlit.serialization import dumps
 from chainlit.telemetry import trace_event
 from chainlit.types import FeedbackDict
 
@@ -67,6 +67,29 @@ class StepDict(TypedDict, total=False):
     feedback: Optional[FeedbackDict]
 
 
+def snapshot_step_dict(step_dict: StepDict) -> StepDict:
+    """Copy a step dict so later in place changes (metadata, tags...) can be detected."""
+    return cast(
+        StepDict,
+        {
+            key: deepcopy(value) if isinstance(value, (dict, list)) else value
+            for key, value in step_dict.items()
+        },
+    )
+
+
+def diff_step_dict(previous: StepDict, current: StepDict) -> StepDict:
+    """Return the fields of a step dict that changed since `previous`, and the step id."""
+    changes = {
+        key: value
+        for key, value in current.items()
+        if key not in previous
+        or (previous[key] is not value and previous[key] != value)  # type: ignore[literal-required]
+    }
+    changes["id"] = current["id"]
+    return cast(StepDict, changes)
+
+
 def flatten_args_kwargs(func, args, kwargs):
     signature = inspect.signature(func)
     bound_arguments = signature.bind(*args, **kwargs)
@@ -202,7 +225,6 @@ class Step:
         thread_id: Optional[str] = None,
     ):
         trace_event(f"init {self.__class__.__name__} {type}")
-        time.sleep(0.001)
         self._input = ""
         self._output = ""
         self.thread_id = thread_id or context.session.thread_id
@@ -227,6 +249,12 @@ class Step:
         self.streaming = False
         self.persisted = False
         self.fail_on_persist_error = False
+        # Last version of the step handed to the data layer
+        self._persisted_dict: Optional[StepDict] = None
+        # Hidden steps (see `check_add_step_in_cot`) are only shown as a stub, sent
+        # when the step starts and when it ends, and persisted once they end.
+        self._stub_sent = False
+        self._defer_persist = False
 
     def _clean_content(self, content):
         """
@@ -257,7 +285,7 @@ class Step:
             or isinstance(content, tuple)
         ):
             try:
-                processed_content = json.dumps(content, indent=4, ensure_ascii=False)
+                processed_content = dumps(content, indent=4)
                 if set_language:
                     self.language = "json"
             except TypeError:
@@ -325,7 +353,25 @@ class Step:
 
         if data_layer:
             try:
-                asyncio.create_task(data_layer.update_step(step_dict.copy()))
+                if self._defer_persist and not self.persisted:
+                    await persistence_queue.create_step(
+                        data_layer, step_dict.copy(), wait=self.fail_on_persist_error
+                    )
+                    self.persisted = True
+                elif self._persisted_dict is None:
+                    await persistence_queue.update_step(
+                        data_layer, step_dict.copy(), wait=self.fail_on_persist_error
+                    )
+                else:
+                    changes = diff_step_dict(self._persisted_dict, step_dict)
+                    await persistence_queue.patch_step(
+                        data_layer,
+                        step_dict.copy(),
+                        list(changes.keys()),
+                        wait=self.fail_on_persist_error,
+                    )
+                self._persisted_dict = snapshot_step_dict(step_dict)
+                self._defer_persist = False
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -352,7 +398,9 @@ class Step:
 
         if data_layer:
             try:
-                asyncio.create_task(data_layer.delete_step(self.id))
+                await persistence_queue.delete_step(
+                    data_layer, self.id, wait=self.fail_on_persist_error
+                )
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -363,7 +411,7 @@ class Step:
         return True
 
     async def send(self):
-        if self.persisted:
+        if self.persisted or (self._defer_persist and self._stub_sent):
             return self
 
         if config.code.author_rename:
@@ -376,10 +424,13 @@ class Step:
 
         data_layer = get_data_layer()
 
-        if data_layer:
+        if data_layer and not self._defer_persist:
             try:
-                asyncio.create_task(data_layer.create_step(step_dict.copy()))
+                await persistence_queue.create_step(
+                    data_layer, step_dict.copy(), wait=self.fail_on_persist_error
+                )
                 self.persisted = True
+                self._persisted_dict = snapshot_step_dict(step_dict)
             except Exception as e:
                 if self.fail_on_persist_error:
                     raise e
@@ -389,12 +440,19 @@ class Step:
         await asyncio.gather(*tasks)
 
         if not check_add_step_in_cot(self):
-            await context.emitter.send_step(stub_step(self))
+            await self._send_stub()
         else:
             await context.emitter.send_step(step_dict)
 
         return self
 
+    async def _send_stub(self):
+        """Show a hidden step in the UI, once."""
+        if self._stub_sent:
+            return
+        self._stub_sent = True
+        await context.emitter.send_step(stub_step(self))
+
     async def stream_token(self, token: str, is_sequence=False, is_input=False):
         """
         Sends a token to the UI.
@@ -417,7 +475,8 @@ class Step:
         assert self.id
 
         if not check_add_step_in_cot(self):
-            await context.emitter.send_step(stub_step(self))
+            # The content of hidden steps is not sent, only the stub on first token
+            await self._send_stub()
             return
 
         if not self.streaming:
@@ -450,6 +509,7 @@ class Step:
             if parent_step:
                 self.parent_id = parent_step.id
         local_steps.set(previous_steps + [self])
+        self._defer_persist = not check_add_step_in_cot(self)
         await self.send()
         return self
 
@@ -478,6 +538,7 @@ class Step:
                 self.parent_id = parent_step.id
         local_steps.set(previous_steps + [self])
 
+        self._defer_persist = not check_add_step_in_cot(self)
         asyncio.create_task(self.send())
         return self
 
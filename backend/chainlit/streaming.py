@@ -0,0 +1,283 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from chainlit.logger import logger
+from chainlit.metrics import metrics
+
+if TYPE_CHECKING:
+    from chainlit.session import WebsocketSession
+
+
+class TokenBuffer:
+    """Tokens of a step waiting to be sent to the UI."""
+
+    def __init__(self) -> None:
+        self.parts: List[str] = []
+        self.size = 0
+        self.is_sequence = False
+
+    def append(self, token: str, is_sequence=False):
+        if is_sequence:
+            # A sequence replaces the whole content, previous tokens are obsolete
+            self.parts = [token]
+            self.size = len(token)
+            self.is_sequence = True
+        else:
+            self.parts.append(token)
+            self.size += len(token)
+
+    @property
+    def token(self) -> str:
+        return "".join(self.parts)
+
+
+class TokenCoalescer:
+    """
+    Coalesce the `stream_token` events of a websocket session.
+
+    The first token of a burst is sent right away. Tokens streamed for the same step
+    within `interval` seconds are concatenated and sent as a single `stream_token`
+    event, either when the interval elapses or once `max_size` characters are buffered.
+    The payload keeps the `isSequence`/`isInput` semantics of individual tokens.
+    """
+
+    def __init__(
+        self, session: "WebsocketSession", interval: float, max_size: int
+    ) -> None:
+        self.session = session
+        self.interval = interval
+        self.max_size = max_size
+
+        self._buffers: Dict[Tuple[str, bool], TokenBuffer] = {}
+        self._last_sent: Dict[Tuple[str, bool], float] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def _send(self, id: str, token: str, is_sequence: bool, is_input: bool):
+        self._last_sent[(id, is_input)] = time.monotonic()
+        await self.session.emit(
+            "stream_token",
+            {"id": id, "token": token, "isSequence": is_sequence, "isInput": is_input},
+        )
+
+    async def add(self, id: str, token: str, is_sequence=False, is_input=False):
+        """Buffer a token, sending it immediately if the step stream is idle."""
+        if not self.enabled:
+            await self._send(id, token, is_sequence, is_input)
+            return
+
+        key = (id, is_input)
+        buffer = self._buffers.get(key)
+
+        if buffer is None:
+            last_sent = self._last_sent.get(key)
+            if last_sent is None or time.monotonic() - last_sent >= self.interval:
+                async with self._lock:
+                    await self._send(id, token, is_sequence, is_input)
+                return
+            buffer = self._buffers[key] = TokenBuffer()
+
+        buffer.append(token, is_sequence)
+
+        if buffer.size >= self.max_size:
+            async with self._lock:
+                await self._send_buffers([key])
+        elif not self._timer:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.interval, self._on_timer
+            )
+
+    def _on_timer(self):
+        self._timer = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def _send_buffers(self, keys: List[Tuple[str, bool]]):
+        for key in keys:
+            if buffer := self._buffers.pop(key, None):
+                await self._send(key[0], buffer.token, buffer.is_sequence, key[1])
+
+    async def flush(self, id: Optional[str] = None):
+        """Send the buffered tokens of a step, or of every step if no id is provided."""
+        async with self._lock:
+            if id is None:
+                await self._send_buffers(list(self._buffers.keys()))
+            else:
+                await self._send_buffers([(id, False), (id, True)])
+                # The step stream ended, no need to remember it
+                self._last_sent.pop((id, False), None)
+                self._last_sent.pop((id, True), None)
+
+    def close(self):
+        """Drop the buffered tokens and cancel the pending flush."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._buffers.clear()
+        self._last_sent.clear()
+
+
+class OutboundQueue:
+    """
+    Bounded queue of the events sent to a websocket client.
+
+    Events are written to the socket by a single writer task, in order, so a slow
+    client does not slow down the code producing the events. `stream_token` events
+    for a step still waiting in the queue are merged into a single event. Other
+    events are never dropped: when the queue is full, `put` waits for the writer.
+    """
+
+    def __init__(self, send: Callable[[str, Any], Awaitable], maxsize: int) -> None:
+        self.send = send
+        self.maxsize = maxsize
+
+        self._queue: Deque[Tuple[str, Any]] = deque()
+        # Queued stream_token payloads that can still be merged, by step and field
+        self._tokens: Dict[Tuple[str, bool], Dict] = {}
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def _merge_token(self, data: Dict) -> bool:
+        key = (data["id"], data.get("isInput", False))
+        if (pending := self._tokens.get(key)) is None:
+            return False
+        if data.get("isSequence"):
+            pending["token"] = data["token"]
+            pending["isSequence"] = True
+        else:
+            pending["token"] += data["token"]
+        metrics.incr("outbound_queue.merged_tokens")
+        return True
+
+    async def put(self, event: str, data: Any):
+        """Queue an event, waiting for the writer if the queue is full."""
+        while True:
+            if event == "stream_token":
+                if self._merge_token(data):
+                    return
+            else:
+                # Merging a token across another event would change the ordering
+                self._tokens.clear()
+
+            if len(self._queue) < self.maxsize:
+                break
+
+            metrics.incr("outbound_queue.full")
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        if event == "stream_token":
+            data = dict(data)
+            self._tokens[(data["id"], data.get("isInput", False))] = data
+
+        self._queue.append((event, data))
+        self._idle.clear()
+
+        if not self._writer:
+            self._writer = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        try:
+            while self._queue:
+                event, data = self._queue.popleft()
+                if event == "stream_token":
+                    key = (data["id"], data.get("isInput", False))
+                    if self._tokens.get(key) is data:
+                        del self._tokens[key]
+                self._not_full.set()
+
+                try:
+                    await self.send(event, data)
+                except Exception as e:
+                    logger.error(f"Error sending '{event}' event: {e!s}")
+        finally:
+            self._writer = None
+            self._idle.set()
+
+    async def join(self):
+        """Wait until all the queued events are written to the socket."""
+        await self._idle.wait()
+
+    def close(self):
+        """Drop the queued events and stop the writer."""
+        self._queue.clear()
+        self._tokens.clear()
+        self._not_full.set()
+        if self._writer:
+            self._writer.cancel()
+
+
+class SentSteps:
+    """Last version of the steps sent to a client, bounded to the most recent ones."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._steps: OrderedDict[str, Dict] = OrderedDict()
+
+    def get(self, id: str) -> Optional[Dict]:
+        return self._steps.get(id)
+
+    def set(self, id: str, step_dict: Dict):
+        self._steps[id] = step_dict
+        self._steps.move_to_end(id)
+        while len(self._steps) > self.maxsize:
+            self._steps.popitem(last=False)
+
+    def discard(self, id: str):
+        self._steps.pop(id, None)
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the last events sent to a client, by sequence number.
+
+    Events are stamped with a per-session sequence number as they are written to the
+    socket. A client reconnecting with the last sequence number it received gets the
+    events it missed, as long as they are still in the buffer.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.seq = 0
+        self._events: Deque[Tuple[int, str, Any]] = deque(maxlen=maxsize)
+
+    def append(self, event: str, data: Any) -> int:
+        self.seq += 1
+        self._events.append((self.seq, event, data))
+        return self.seq
+
+    def since(self, seq: int) -> Optional[List[Tuple[int, str, Any]]]:
+        """Events sent after `seq`, or None if some of them are not in the buffer."""
+        if seq == self.seq:
+            return []
+        if seq > self.seq:
+            # Sequence from a previous incarnation of the session
+            return None
+        if not self._events or self._events[0][0] > seq + 1:
+            return None
+        return [entry for entry in self._events if entry[0] > seq]
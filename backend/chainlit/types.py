@@ -21,6 +21,7 @@ if TYPE_CHECKING:
 from dataclasses_json import DataClassJsonMixin
 from pydantic import BaseModel
 from pydantic.dataclasses import dataclass
+from typing_extensions import NotRequired
 
 InputWidgetType = Literal[
     "switch", "slider", "select", "textinput", "tags", "numberinput"
@@ -31,6 +32,8 @@ ToastType = Literal["info", "success", "warning", "error"]
 class ThreadDict(TypedDict):
     id: str
     createdAt: str
+    # Last activity, if tracked by the data layer
+    updatedAt: NotRequired[str]
     name: Optional[str]
     userId: Optional[str]
     userIdentifier: Optional[str]
@@ -38,6 +41,18 @@ class ThreadDict(TypedDict):
     metadata: Optional[Dict]
     steps: List["StepDict"]
     elements: Optional[List["ElementDict"]]
+    # Cursor of the steps before the ones of the thread, when only the most recent
+    # ones are loaded (see BaseDataLayer.get_thread_steps)
+    stepsBefore: NotRequired[Optional[str]]
+
+
+class ThreadStepsPage(TypedDict):
+    """Steps of a thread, from the oldest to the most recent, and their elements."""
+
+    steps: List["StepDict"]
+    elements: List["ElementDict"]
+    # Cursor of the steps before these ones, None if there are none
+    before: Optional[str]
 
 
 class Pagination(BaseModel):
@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+import jwt as pyjwt
+import pytest
+
+from chainlit.auth import create_jwt, decode_jwt, evict_jwt
+from chainlit.auth.jwt import _decoded_tokens
+from chainlit.metrics import metrics
+from chainlit.user import User
+
+
+@pytest.fixture(autouse=True)
+def jwt_secret(monkeypatch):
+    monkeypatch.setenv("CHAINLIT_AUTH_SECRET", "test-secret-of-at-least-32-bytes!")
+    metrics.reset()
+    _decoded_tokens.clear()
+    yield
+    _decoded_tokens.clear()
+
+
+@pytest.fixture
+def token():
+    return create_jwt(User(identifier="test_user", metadata={"role": "admin"}))
+
+
+def test_verified_tokens_are_cached(token):
+    user = decode_jwt(token)
+    user.metadata["role"] = "Changed by the caller"
+
+    with patch("chainlit.auth.jwt.pyjwt.decode") as verify:
+        cached_user = decode_jwt(token)
+
+    verify.assert_not_called()
+    assert cached_user.identifier == "test_user"
+    assert cached_user.metadata == {"role": "admin"}
+    assert metrics.snapshot()["jwt_cache.hits"] == 1
+
+
+def test_invalid_tokens_are_not_cached():
+    forged = pyjwt.encode(
+        {"identifier": "admin"}, "wrong-secret-of-at-least-32-bytes!", algorithm="HS256"
+    )
+
+    with pytest.raises(pyjwt.InvalidSignatureError):
+        decode_jwt(forged)
+
+    assert metrics.snapshot()["jwt_cache.tokens"] == 0
+
+
+def test_tokens_are_verified_again_once_expired(token):
+    decode_jwt(token)
+
+    with (
+        patch("chainlit.auth.jwt.time.time", return_value=2**40),
+        patch(
+            "chainlit.auth.jwt.pyjwt.decode", side_effect=pyjwt.ExpiredSignatureError
+        ),
+        pytest.raises(pyjwt.ExpiredSignatureError),
+    ):
+        decode_jwt(token)
+
+
+def test_tokens_are_verified_again_with_a_new_secret(token, monkeypatch):
+    decode_jwt(token)
+    monkeypatch.setenv("CHAINLIT_AUTH_SECRET", "rotated-secret-of-at-least-32-bytes")
+
+    with pytest.raises(pyjwt.InvalidSignatureError):
+        decode_jwt(token)
+
+
+def test_evicted_tokens_are_verified_again(token):
+    decode_jwt(token)
+    evict_jwt(token)
+    decode_jwt(token)
+
+    assert metrics.snapshot()["jwt_cache.misses"] == 2
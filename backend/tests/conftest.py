@@ -11,11 +11,19 @@ from chainlit import config
 from chainlit.callbacks import data_layer
 from chainlit.context import ChainlitContext, context_var
 from chainlit.data.base import BaseDataLayer
+from chainlit.data.persistence_queue import persistence_queue
 from chainlit.session import HTTPSession, WebsocketSession
 from chainlit.user import PersistedUser
 from chainlit.user_session import UserSession
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def flush_persistence_queue():
+    """Write what a test queued and stop the writer task before its event loop closes."""
+    yield
+    await persistence_queue.flush()
+
+
 @pytest.fixture
 def persisted_test_user():
     return PersistedUser(
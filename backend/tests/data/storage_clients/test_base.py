@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+
+from chainlit import make_async
+from chainlit.data.storage_clients.base import (
+    BaseStorageClient,
+    file_chunks,
+    iter_parts,
+    upload_parts,
+)
+
+
+class MemoryStorageClient(BaseStorageClient):
+    def __init__(self):
+        self.files = {}
+
+    async def upload_file(self, object_key, data, mime="", overwrite=True):
+        self.files[object_key] = data
+        return {"object_key": object_key, "url": f"memory://{object_key}"}
+
+    async def delete_file(self, object_key):
+        return self.files.pop(object_key, None) is not None
+
+    async def get_read_url(self, object_key):
+        return f"memory://{object_key}"
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_iter_parts():
+    parts = [part async for part in iter_parts(stream(b"abc", b"defgh", b"i"), 4)]
+
+    assert parts == [b"abcd", b"efgh", b"i"]
+
+
+async def test_upload_parts_bounds_the_parts_in_memory():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def upload_part(number: int, part: bytes):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return number, part
+
+    parts = stream(*(bytes([i]) for i in range(10)))
+    uploaded = await upload_parts(parts, upload_part, max_concurrency=3)
+
+    assert uploaded == [(i + 1, bytes([i])) for i in range(10)]
+    assert max_in_flight == 3
+
+
+async def test_upload_parts_raises_the_first_failure():
+    async def upload_part(number: int, part: bytes):
+        if number == 2:
+            raise ValueError("Part rejected")
+        return number
+
+    with pytest.raises(ValueError, match="Part rejected"):
+        await upload_parts(stream(b"a", b"b", b"c"), upload_part, max_concurrency=2)
+
+
+async def test_upload_parts_waits_for_the_parts_in_flight_on_failure():
+    uploaded = []
+
+    def send(number: int):
+        time.sleep(0.05)
+        uploaded.append(number)
+
+    async def upload_part(number: int, part: bytes):
+        if number == 2:
+            raise ValueError("Part rejected")
+        # Sent from a thread, like the storage clients do
+        await make_async(send)(number)
+
+    parts = stream(*(bytes([i]) for i in range(10)))
+    with pytest.raises(ValueError, match="Part rejected"):
+        await upload_parts(parts, upload_part, max_concurrency=2)
+
+    # The part sent along with the failed one completed, no other part was sent
+    assert uploaded == [1]
+
+
+async def test_upload_stream_defaults_to_upload_file(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"x" * 3000)
+    client = MemoryStorageClient()
+
+    result = await client.upload_stream("file.bin", file_chunks(str(path), 1024))
+
+    assert result["object_key"] == "file.bin"
+    assert client.files["file.bin"] == b"x" * 3000
@@ -1,7 +1,9 @@
 import os
+from unittest.mock import patch
 
 import boto3  # type: ignore
 import pytest
+from botocore.exceptions import ClientError  # type: ignore
 from moto import mock_aws
 
 from chainlit.data.storage_clients.s3 import S3StorageClient
@@ -45,3 +47,117 @@ async def test_upload_file(s3_mock):
     # Verify that the file exists in the mock S3
     response = s3_mock.get_object(Bucket="my-test-bucket", Key="test.txt")
     assert response["Body"].read().decode() == "This is a test file"
+
+
+async def chunks(data: bytes, chunk_size: int = 1024 * 1024):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_upload_stream_in_parts(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket", part_size=5 * 1024 * 1024)
+    data = bytes(range(256)) * 4096 * 11  # 11 MiB, 3 parts
+
+    with patch.object(
+        client.client, "upload_part", wraps=client.client.upload_part
+    ) as upload_part:
+        result = await client.upload_stream(
+            object_key="video.mp4", stream=chunks(data), mime="video/mp4"
+        )
+
+    assert result["object_key"] == "video.mp4"
+    assert upload_part.call_count == 3
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="video.mp4")
+    assert response["ContentType"] == "video/mp4"
+    assert response["Body"].read() == data
+
+
+@pytest.mark.asyncio
+async def test_upload_small_stream_at_once(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket")
+
+    with patch.object(client.client, "create_multipart_upload") as multipart:
+        await client.upload_stream(object_key="small.txt", stream=chunks(b"small"))
+
+    multipart.assert_not_called()
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="small.txt")
+    assert response["Body"].read() == b"small"
+
+
+@pytest.mark.asyncio
+async def test_failed_multipart_upload_is_aborted(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket", part_size=5 * 1024 * 1024)
+
+    with patch.object(client.client, "upload_part", side_effect=Exception("Timeout")):
+        result = await client.upload_stream(
+            object_key="video.mp4", stream=chunks(b"0" * 11 * 1024 * 1024)
+        )
+
+    assert result == {}
+    uploads = s3_mock.list_multipart_uploads(Bucket="my-test-bucket")
+    assert not uploads.get("Uploads")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [10, 11 * 1024 * 1024])
+async def test_upload_stream_without_overwrite(s3_mock, size):
+    s3_mock.put_object(Bucket="my-test-bucket", Key="video.mp4", Body=b"existing")
+    client = S3StorageClient(
+        bucket="my-test-bucket", part_size=5 * 1024 * 1024, conditional_writes=True
+    )
+
+    result = await client.upload_stream(
+        object_key="video.mp4", stream=chunks(b"0" * size), overwrite=False
+    )
+
+    assert result == {}
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="video.mp4")
+    assert response["Body"].read() == b"existing"
+
+
+@pytest.mark.asyncio
+async def test_overwrite_is_ignored_without_conditional_writes(s3_mock):
+    s3_mock.put_object(Bucket="my-test-bucket", Key="test.txt", Body=b"existing")
+    client = S3StorageClient(bucket="my-test-bucket")
+
+    with patch.object(client.client, "put_object", wraps=client.client.put_object):
+        result = await client.upload_file("test.txt", b"new", overwrite=False)
+        assert "IfNoneMatch" not in client.client.put_object.call_args.kwargs
+
+    assert result["object_key"] == "test.txt"
+    response = s3_mock.get_object(Bucket="my-test-bucket", Key="test.txt")
+    assert response["Body"].read() == b"new"
+
+
+@pytest.mark.asyncio
+async def test_unsupported_conditional_writes_are_reported(s3_mock):
+    client = S3StorageClient(bucket="my-test-bucket", conditional_writes=True)
+    error = ClientError(
+        {"Error": {"Code": "NotImplemented", "Message": "If-None-Match"}},
+        "PutObject",
+    )
+
+    with (
+        patch.object(client.client, "put_object", side_effect=error),
+        patch("chainlit.data.storage_clients.s3.logger") as logger,
+    ):
+        result = await client.upload_file("test.txt", b"new", overwrite=False)
+
+    assert result == {}
+    assert "disable conditional_writes" in logger.warning.call_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_open_read_range(s3_mock):
+    s3_mock.put_object(Bucket="my-test-bucket", Key="test.txt", Body=b"0123456789")
+    client = S3StorageClient(bucket="my-test-bucket")
+
+    async def read(**kwargs):
+        return b"".join(
+            [chunk async for chunk in client.open_read("test.txt", **kwargs)]
+        )
+
+    assert await read() == b"0123456789"
+    assert await read(start=2, end=4) == b"234"
+    assert await read(start=7) == b"789"
@@ -0,0 +1,288 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from chainlit.data import get_data_layer
+from chainlit.data.base import BaseDataLayer
+from chainlit.data.cache import CachedDataLayer
+from chainlit.metrics import metrics
+from chainlit.types import Feedback
+
+
+def make_thread(thread_id: str, output: str = "hello"):
+    return {
+        "id": thread_id,
+        "createdAt": "2024-01-01T00:00:00Z",
+        "name": "Thread",
+        "userId": "user",
+        "userIdentifier": "user",
+        "tags": None,
+        "metadata": {},
+        "steps": [
+            {"id": f"{thread_id}-step", "threadId": thread_id, "output": output},
+            {
+                "id": f"{thread_id}-answer",
+                "threadId": thread_id,
+                "parentId": f"{thread_id}-step",
+                "feedback": {"id": f"{thread_id}-feedback", "value": 1},
+            },
+        ],
+        "elements": [{"id": f"{thread_id}-element", "threadId": thread_id}],
+    }
+
+
+@pytest.fixture
+def data_layer():
+    data_layer = AsyncMock(spec=BaseDataLayer)
+    data_layer.get_thread.side_effect = lambda thread_id: make_thread(thread_id)
+    return data_layer
+
+
+@pytest.fixture
+def cache(data_layer):
+    metrics.reset()
+    return CachedDataLayer(data_layer, max_size=10_000, ttl=60)
+
+
+async def test_threads_are_read_through(cache, data_layer):
+    thread = await cache.get_thread("t1")
+    thread["name"] = "Changed by the caller"
+
+    assert await cache.get_thread("t1") == make_thread("t1")
+    data_layer.get_thread.assert_awaited_once_with("t1")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["thread_cache.hits"] == 1
+    assert snapshot["thread_cache.misses"] == 1
+    assert snapshot["thread_cache.threads"] == 1
+
+
+async def test_threads_not_found_are_not_cached(cache, data_layer):
+    data_layer.get_thread.side_effect = None
+    data_layer.get_thread.return_value = None
+
+    await cache.get_thread("t1")
+    await cache.get_thread("t1")
+
+    assert data_layer.get_thread.await_count == 2
+
+
+async def test_writes_invalidate_their_thread_only(
+    cache, data_layer, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        writes = [
+            cache.create_step({"id": "new", "threadId": "t1"}),  # type: ignore[typeddict-item]
+            cache.update_step({"id": "t1-step", "threadId": "t1"}),  # type: ignore[typeddict-item]
+            cache.delete_step("t1-answer"),
+            cache.create_element(Mock(thread_id="t1")),
+            cache.delete_element("t1-element"),
+            cache.upsert_feedback(Feedback(forId="t1-answer", value=0)),
+            cache.delete_feedback("t1-feedback"),
+            cache.update_thread("t1", name="Renamed"),
+            cache.delete_thread("t1"),
+        ]
+        for write in writes:
+            await cache.get_thread("t1")
+            await cache.get_thread("t2")
+            await write
+
+    await cache.get_thread("t1")
+    await cache.get_thread("t2")
+
+    assert [call.args for call in data_layer.get_thread.await_args_list] == [
+        ("t1",),
+        ("t2",),
+        *[("t1",)] * len(writes),
+    ]
+    assert metrics.snapshot()["thread_cache.invalidations"] == len(writes)
+
+
+async def test_failed_writes_invalidate_their_thread(cache, data_layer):
+    data_layer.update_thread.side_effect = Exception("Database unavailable")
+    await cache.get_thread("t1")
+
+    with pytest.raises(Exception, match="Database unavailable"):
+        await cache.update_thread("t1", name="Renamed")
+    await cache.get_thread("t1")
+
+    assert data_layer.get_thread.await_count == 2
+
+
+async def test_thread_invalidated_while_loading_is_not_cached(cache, data_layer):
+    loading = asyncio.Event()
+
+    async def get_thread(thread_id):
+        loading.set()
+        await asyncio.sleep(0.01)
+        return make_thread(thread_id, output="before the update")
+
+    data_layer.get_thread.side_effect = get_thread
+    load = asyncio.create_task(cache.get_thread("t1"))
+    await loading.wait()
+    await cache.update_thread("t1", name="Renamed")
+    await load
+
+    data_layer.get_thread.side_effect = lambda thread_id: make_thread(thread_id)
+    thread = await cache.get_thread("t1")
+
+    assert thread["steps"][0]["output"] == "hello"
+
+
+async def test_least_recently_used_threads_are_evicted(data_layer):
+    metrics.reset()
+    size = len(json.dumps(make_thread("t1")))
+    cache = CachedDataLayer(data_layer, max_size=int(size * 2.5), ttl=60)
+
+    for thread_id in ["t1", "t2", "t1", "t3", "t1", "t2"]:
+        await cache.get_thread(thread_id)
+
+    assert [call.args for call in data_layer.get_thread.await_args_list] == [
+        ("t1",),
+        ("t2",),
+        ("t3",),
+        ("t2",),
+    ]
+    assert metrics.snapshot()["thread_cache.evictions"] == 2
+    assert metrics.snapshot()["thread_cache.size_bytes"] <= cache.max_size
+
+
+async def test_threads_expire(data_layer):
+    cache = CachedDataLayer(data_layer, max_size=10_000, ttl=0)
+
+    await cache.get_thread("t1")
+    await cache.get_thread("t1")
+
+    assert data_layer.get_thread.await_count == 2
+
+
+async def test_pages_are_served_from_the_cached_thread(cache, data_layer):
+    await cache.get_thread("t1")
+
+    page = await cache.get_thread_steps("t1", limit=1)
+    window = await cache.get_thread_window("t1", limit=1)
+
+    assert [step["id"] for step in page["steps"]] == ["t1-step", "t1-answer"]
+    assert window is not None
+    assert window["stepsBefore"] == "t1-answer"
+    data_layer.get_thread_steps.assert_not_awaited()
+    data_layer.get_thread_window.assert_not_awaited()
+
+
+async def test_elements_are_cached_with_their_thread(cache, data_layer):
+    data_layer.get_element.return_value = {"id": "t1-element", "threadId": "t1"}
+
+    await cache.get_element("t1", "t1-element")
+    assert await cache.get_element("t1", "t1-element") == {
+        "id": "t1-element",
+        "threadId": "t1",
+    }
+    await cache.delete_thread("t1")
+    await cache.get_element("t1", "t1-element")
+
+    assert data_layer.get_element.await_count == 2
+
+
+def test_get_data_layer_wraps_the_data_layer_in_the_cache(monkeypatch, data_layer):
+    monkeypatch.setattr("chainlit.data._data_layer", None)
+    monkeypatch.setattr("chainlit.data._data_layer_initialized", False)
+    monkeypatch.setattr("chainlit.config.config.code.data_layer", lambda: data_layer)
+    monkeypatch.setattr("chainlit.config.config.project.thread_cache_size_mb", 16)
+
+    cached = get_data_layer()
+
+    assert isinstance(cached, CachedDataLayer)
+    assert cached.data_layer is data_layer
+    assert cached.max_size == 16 * 1024 * 1024
+
+
+@pytest.fixture
+def identity_cache(data_layer, persisted_test_user):
+    metrics.reset()
+
+    async def get_user(identifier):
+        await asyncio.sleep(0.01)
+        return persisted_test_user
+
+    data_layer.get_user.side_effect = get_user
+    data_layer.create_user.return_value = persisted_test_user
+    data_layer.get_thread_author.return_value = "test_user_identifier"
+    return CachedDataLayer(data_layer, max_size=0, ttl=60, identity_ttl=60)
+
+
+async def test_concurrent_user_lookups_make_one_query(identity_cache, data_layer):
+    users = await asyncio.gather(
+        *(identity_cache.get_user("test_user_identifier") for _ in range(10))
+    )
+    users[0].display_name = "Changed by the caller"
+
+    assert [user.identifier for user in users] == ["test_user_identifier"] * 10
+    assert (await identity_cache.get_user("test_user_identifier")).display_name is None
+    data_layer.get_user.assert_awaited_once()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["user_cache.misses"] == 1
+    assert snapshot["user_cache.coalesced"] == 9
+    assert snapshot["user_cache.hits"] == 1
+
+
+async def test_failed_user_lookup_is_raised_to_every_caller(identity_cache, data_layer):
+    async def get_user(identifier):
+        await asyncio.sleep(0.01)
+        raise Exception("Database unavailable")
+
+    data_layer.get_user.side_effect = get_user
+
+    results = await asyncio.gather(
+        identity_cache.get_user("test_user_identifier"),
+        identity_cache.get_user("test_user_identifier"),
+        return_exceptions=True,
+    )
+    data_layer.get_user.side_effect = None
+    data_layer.get_user.return_value = None
+
+    assert [str(result) for result in results] == ["Database unavailable"] * 2
+    assert await identity_cache.get_user("test_user_identifier") is None
+    assert data_layer.get_user.await_count == 2
+
+
+async def test_created_users_are_cached(identity_cache, data_layer, test_user):
+    await identity_cache.create_user(test_user)
+    user = await identity_cache.get_user(test_user.identifier)
+
+    assert user is not None
+    assert user.id == "test_user_id"
+    data_layer.get_user.assert_not_awaited()
+
+
+async def test_thread_authors_are_cached_until_changed(identity_cache, data_layer):
+    for update in [
+        identity_cache.update_thread("t1", name="Renamed"),
+        identity_cache.update_thread("t1", user_id="other_user"),
+        identity_cache.delete_thread("t1"),
+    ]:
+        assert await identity_cache.get_thread_author("t1") == "test_user_identifier"
+        await update
+
+    await identity_cache.get_thread_author("t1")
+
+    assert data_layer.get_thread_author.await_count == 3
+
+
+async def test_cancelled_user_lookup_is_made_again_by_the_waiting_callers(
+    identity_cache, data_layer
+):
+    first = asyncio.create_task(identity_cache.get_user("test_user_identifier"))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(identity_cache.get_user("test_user_identifier"))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    user = await waiting
+
+    assert first.cancelled()
+    assert user is not None
+    assert user.identifier == "test_user_identifier"
+    assert data_layer.get_user.await_count == 2
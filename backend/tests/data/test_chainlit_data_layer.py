@@ -0,0 +1,581 @@
+from datetime import datetime
+from typing import Any, Dict, List
+from unittest.mock import AsyncMock, MagicMock, Mock
+
+import asyncpg
+import pytest
+
+from chainlit.data.chainlit_data_layer import (
+    GET_USER_QUERY,
+    ChainlitDataLayer,
+    encode_thread_cursor,
+)
+from chainlit.element import Text
+from chainlit.metrics import metrics
+from chainlit.step import StepDict
+from chainlit.types import Pagination, ThreadFilter
+
+
+@pytest.fixture
+def data_layer() -> ChainlitDataLayer:
+    data_layer = ChainlitDataLayer(database_url="postgresql://localhost/test")
+    data_layer.execute_query = AsyncMock(return_value=[{"id": "step_id"}])  # type: ignore[method-assign]
+    return data_layer
+
+
+@pytest.fixture
+def step_dict() -> StepDict:
+    return {
+        "id": "step_id",
+        "threadId": "thread_id",
+        "type": "tool",
+        "name": "tool",
+        "output": "output",
+        "metadata": {"key": "value"},
+        "isError": False,
+    }
+
+
+async def test_patch_step_updates_changed_columns(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.patch_step(step_dict, ["id", "output", "metadata", "end"])
+
+        query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+        assert 'UPDATE "Step" SET "output" = $3, "metadata" = $4' in query
+        assert list(params.values())[2:] == ["output", '{"key":"value"}']
+
+
+async def test_patch_step_merges_like_the_upsert(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        patch: StepDict = {
+            **step_dict,
+            "createdAt": "2024-01-01T12:00:00.000000Z",
+            "type": "run",
+            "name": "renamed",
+            "output": None,  # type: ignore[typeddict-item]
+            "metadata": {},
+        }
+        fields = ["type", "name", "output", "metadata"]
+
+        await data_layer.patch_step(patch, fields)
+        patch_query, patch_params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+
+        data_layer.known_ids.add("thread_id", "thread_id")
+        await data_layer.update_step(patch)
+        upsert_query, upsert_params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+
+        # The upsert keeps the stored type, output and metadata of these values
+        assert "WHEN EXCLUDED.type = 'run' THEN \"Step\".type" in upsert_query
+        assert 'output = COALESCE(EXCLUDED.output, "Step".output)' in upsert_query
+        assert "WHEN EXCLUDED.metadata <> '{}' THEN EXCLUDED.metadata" in upsert_query
+        # so the patch only writes the name
+        assert 'UPDATE "Step" SET "name" = $3' in patch_query
+        assert patch_params["name"] == upsert_params["name"] == "renamed"
+        assert set(patch_params) == {"id", "timestamp", "name"}
+
+
+async def test_patch_step_bumps_the_thread_activity_of_messages(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        message: StepDict = {
+            **step_dict,
+            "type": "assistant_message",
+            "createdAt": "2024-01-01T12:00:00.000000Z",
+        }
+
+        await data_layer.patch_step(message, ["output"])
+        query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+
+        assert 'UPDATE "Thread" SET "updatedAt" = $2' in query
+        assert "patched.type IN ('user_message', 'assistant_message')" in query
+        # Same activity as the full upsert of the step
+        assert params["timestamp"] == datetime(2024, 1, 1, 12)
+        assert (
+            params["timestamp"]
+            == (await data_layer._step_params(message))["start_time"]
+        )
+
+
+async def test_patch_step_skips_unpersisted_fields(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.patch_step(step_dict, ["id", "end", "streaming"])
+
+        data_layer.execute_query.assert_not_called()  # type: ignore[attr-defined]
+
+
+async def test_patch_step_creates_missing_step(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        data_layer.execute_query.return_value = []  # type: ignore[attr-defined]
+        data_layer.create_step = AsyncMock()  # type: ignore[method-assign]
+
+        await data_layer.patch_step(step_dict, ["id", "output"])
+
+        data_layer.create_step.assert_awaited_once_with(step_dict)
+
+
+async def test_create_step_upserts_thread_and_parent_in_one_query(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.create_step({**step_dict, "parentId": "parent_id"})
+
+        data_layer.execute_query.assert_awaited_once()  # type: ignore[attr-defined]
+        query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+        assert 'INSERT INTO "Thread"' in query
+        assert "parent AS" in query
+        assert params["thread_id"] == "thread_id"
+        assert params["parent_id"] == "parent_id"
+
+
+async def test_create_step_skips_known_thread_and_parent(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.create_step(step_dict)
+        await data_layer.create_step(
+            {**step_dict, "id": "child_id", "parentId": "step_id"}
+        )
+
+        query, _ = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+        assert 'INSERT INTO "Thread"' not in query
+        assert "parent AS" not in query
+        assert data_layer.execute_query.await_count == 2  # type: ignore[attr-defined]
+
+
+async def test_create_step_recreates_deleted_thread(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        data_layer.known_ids.add("thread_id", "thread_id")
+        data_layer.execute_query.side_effect = [  # type: ignore[attr-defined]
+            asyncpg.ForeignKeyViolationError("Thread does not exist"),
+            [],
+        ]
+
+        await data_layer.create_step(step_dict)
+
+        query, _ = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+        assert 'INSERT INTO "Thread"' in query
+
+
+async def test_delete_thread_forgets_its_steps(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.create_step(step_dict)
+        assert "step_id" in data_layer.known_ids
+
+        await data_layer.delete_thread("thread_id")
+
+        assert "thread_id" not in data_layer.known_ids
+        assert "step_id" not in data_layer.known_ids
+
+
+def thread_row(id: str, updated_at: datetime) -> Dict[str, Any]:
+    return {
+        "id": id,
+        "createdAt": updated_at,
+        "updatedAt": updated_at,
+        "name": id,
+        "userId": "user_id",
+        "user_identifier": "user",
+        "metadata": "{}",
+    }
+
+
+async def test_list_threads_pages_by_last_activity(data_layer: ChainlitDataLayer):
+    updated_at = datetime(2024, 1, 1, 12)
+    data_layer.execute_query.return_value = [  # type: ignore[attr-defined]
+        thread_row("2", updated_at),
+        thread_row("1", updated_at),
+        thread_row("0", updated_at),
+    ]
+
+    page = await data_layer.list_threads(
+        Pagination(first=2), ThreadFilter(userId="user_id")
+    )
+
+    query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+    assert "COUNT" not in query
+    assert (
+        'ORDER BY COALESCE(t."updatedAt", t."createdAt") DESC, t.id DESC LIMIT $2'
+        in query
+    )
+    assert params == {"user_id": "user_id", "limit": 3}
+    assert [thread["id"] for thread in page.data] == ["2", "1"]
+    assert page.pageInfo.hasNextPage
+    assert page.pageInfo.endCursor == encode_thread_cursor(thread_row("1", updated_at))
+
+    await data_layer.list_threads(
+        Pagination(first=2, cursor=page.pageInfo.endCursor),
+        ThreadFilter(userId="user_id"),
+    )
+
+    query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+    assert 'AND (COALESCE(t."updatedAt", t."createdAt"), t.id) < ($2, $3)' in query
+    assert params["cursor_updated_at"] == updated_at
+    assert params["cursor_id"] == "1"
+
+
+async def test_list_threads_accepts_thread_id_cursor(data_layer: ChainlitDataLayer):
+    data_layer.execute_query.return_value = []  # type: ignore[attr-defined]
+
+    page = await data_layer.list_threads(
+        Pagination(first=2, cursor="thread_id"), ThreadFilter()
+    )
+
+    query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+    assert 'FROM "Thread" WHERE id = $1' in query
+    assert params["cursor"] == "thread_id"
+    assert page.data == []
+    assert not page.pageInfo.hasNextPage
+
+
+async def test_list_threads_ranks_full_text_search_results(
+    data_layer: ChainlitDataLayer,
+):
+    data_layer.full_text_search = "english"
+    data_layer.execute_query.return_value = []  # type: ignore[attr-defined]
+
+    await data_layer.list_threads(
+        Pagination(
+            first=2, cursor=encode_thread_cursor(thread_row("1", datetime.now()))
+        ),
+        ThreadFilter(userId="user_id", search="invoice"),
+    )
+
+    query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+    assert "websearch_to_tsquery('english', $2)" in query
+    assert "to_tsvector('english', COALESCE(s.output, ''))" in query
+    assert "ILIKE" not in query
+    assert (
+        'AND (r.rank, COALESCE(t."updatedAt", t."createdAt"), t.id) < '
+        "((SELECT rank FROM ranked WHERE id = $4), $3, $4)"
+    ) in query
+    assert (
+        'ORDER BY r.rank DESC, COALESCE(t."updatedAt", t."createdAt") DESC, t.id DESC'
+        in query
+    )
+    assert list(params) == [
+        "user_id",
+        "search",
+        "cursor_updated_at",
+        "cursor_id",
+        "limit",
+    ]
+
+
+def test_full_text_search_configuration_is_validated():
+    with pytest.raises(ValueError, match="Invalid text search configuration"):
+        ChainlitDataLayer(
+            database_url="postgresql://localhost/test",
+            full_text_search='english\'); DROP TABLE "Thread"; --',
+        )
+
+
+def step_row(id: str, parent_id=None, second=0) -> Dict[str, Any]:
+    return {
+        "id": id,
+        "threadId": "thread_id",
+        "parentId": parent_id,
+        "name": id,
+        "type": "tool",
+        "input": None,
+        "output": None,
+        "metadata": "{}",
+        "startTime": datetime(2024, 1, 1, 0, 0, second),
+        "endTime": None,
+        "showInput": None,
+        "isError": False,
+        "feedback_id": None,
+    }
+
+
+async def test_get_thread_steps_loads_the_ancestors_of_the_window(
+    data_layer: ChainlitDataLayer,
+):
+    data_layer.execute_query.side_effect = [  # type: ignore[attr-defined]
+        # Most recent first, one more than the limit
+        [
+            step_row("tool_2", "run", 2),
+            step_row("tool_1", "run", 1),
+            step_row("run", None, 0),
+        ],
+        [step_row("run", None, 0)],
+        [],
+    ]
+
+    page = await data_layer.get_thread_steps("thread_id", before="answer", limit=2)
+
+    (query, params), (ancestors_query, ancestors_params), (elements_query, _) = (
+        call.args
+        for call in data_layer.execute_query.await_args_list  # type: ignore[attr-defined]
+    )
+    assert '(s."startTime", s.id) < (' in query
+    assert params == {"thread_id": "thread_id", "before": "answer", "limit": 3}
+    assert "WITH RECURSIVE ancestors" in ancestors_query
+    assert ancestors_params == {"parent_ids": ["run"], "ids": ["tool_2", "tool_1"]}
+    assert '"stepId" IS NULL' not in elements_query
+    assert [step["id"] for step in page["steps"]] == ["run", "tool_1", "tool_2"]
+    assert page["before"] == "tool_1"
+
+
+@pytest.fixture
+def connection(data_layer: ChainlitDataLayer) -> MagicMock:
+    connection = MagicMock()
+    connection.fetch = AsyncMock(return_value=[])
+    connection.executemany = AsyncMock()
+    connection.execute = AsyncMock()
+    connection.prepared_statements = {}
+    data_layer.pool = MagicMock()
+    data_layer.pool.acquire = AsyncMock(return_value=connection)
+    data_layer.pool.release = AsyncMock()
+    return connection
+
+
+@pytest.fixture
+def pooled_data_layer(
+    data_layer: ChainlitDataLayer, connection: MagicMock
+) -> ChainlitDataLayer:
+    pooled_data_layer = ChainlitDataLayer(database_url="postgresql://localhost/test")
+    pooled_data_layer.pool = data_layer.pool
+    return pooled_data_layer
+
+
+async def test_create_steps_writes_in_one_transaction(
+    data_layer: ChainlitDataLayer,
+    step_dict: StepDict,
+    connection: MagicMock,
+    mock_chainlit_context,
+):
+    async with mock_chainlit_context:
+        await data_layer.create_steps(
+            [
+                {**step_dict, "parentId": "run_id"},
+                {
+                    **step_dict,
+                    "id": "child_id",
+                    "parentId": "step_id",
+                    "type": "assistant_message",
+                },
+            ]
+        )
+
+        connection.transaction.assert_called_once()
+        (_, threads), (_, parents), (_, steps), (_, activity) = (
+            call.args for call in connection.executemany.await_args_list
+        )
+        assert threads == [("thread_id",)]
+        # The parent created in the same batch needs no placeholder
+        assert [parent[0] for parent in parents] == ["run_id"]
+        assert [step[0] for step in steps] == ["step_id", "child_id"]
+        assert [thread_id for thread_id, _ in activity] == ["thread_id"]
+        assert "child_id" in data_layer.known_ids
+
+
+async def test_create_elements_uploads_and_writes_in_one_transaction(
+    data_layer: ChainlitDataLayer,
+    connection: MagicMock,
+    mock_storage_client,
+    mock_chainlit_context,
+):
+    data_layer.storage_client = mock_storage_client
+    data_layer.known_ids.add("thread_id", "thread_id")
+    data_layer.known_ids.add("step_id", "thread_id")
+    elements = [
+        Text(content=f"content {i}", thread_id="thread_id", for_id="step_id")
+        for i in range(3)
+    ]
+
+    async with mock_chainlit_context:
+        await data_layer.create_elements(elements)
+
+        assert mock_storage_client.upload_file.await_count == 3
+        connection.executemany.assert_awaited_once()
+        query, rows = connection.executemany.await_args.args
+        assert 'INSERT INTO "Element"' in query
+        assert [row[0] for row in rows] == [element.id for element in elements]
+
+
+async def test_failed_element_uploads_are_not_written(
+    data_layer: ChainlitDataLayer,
+    connection: MagicMock,
+    mock_storage_client,
+    mock_chainlit_context,
+):
+    data_layer.storage_client = mock_storage_client
+    data_layer.known_ids.add("thread_id", "thread_id")
+    data_layer.known_ids.add("step_id", "thread_id")
+    elements = [
+        Text(content=f"content {i}", thread_id="thread_id", for_id="step_id")
+        for i in range(2)
+    ]
+    # The storage clients return an empty dict when the upload failed
+    mock_storage_client.upload_file.side_effect = [{}, {"object_key": "key"}]
+
+    async with mock_chainlit_context:
+        await data_layer.create_elements(elements)
+
+        _, rows = connection.executemany.await_args.args
+        assert [row[0] for row in rows] == [elements[1].id]
+
+        mock_storage_client.upload_file.side_effect = None
+        mock_storage_client.upload_file.return_value = {}
+        with pytest.raises(Exception, match="Failed to upload"):
+            await data_layer.create_element(elements[0])
+
+
+async def test_execute_query_uses_prepared_statements(
+    pooled_data_layer: ChainlitDataLayer, connection: MagicMock
+):
+    statement = MagicMock()
+    statement.fetch = AsyncMock(return_value=[{"id": "user_id"}])
+    connection.prepared_statements[GET_USER_QUERY] = statement
+
+    result = await pooled_data_layer.execute_query(GET_USER_QUERY, {"id": "user"})
+    await pooled_data_layer.execute_query("SELECT 1")
+
+    assert result == [{"id": "user_id"}]
+    statement.fetch.assert_awaited_once_with("user")
+    connection.fetch.assert_awaited_once_with("SELECT 1")
+    assert pooled_data_layer.pool.release.await_count == 2  # type: ignore[union-attr]
+
+
+async def test_acquire_records_the_pool_wait(
+    pooled_data_layer: ChainlitDataLayer, connection: MagicMock
+):
+    metrics.reset()
+
+    async with pooled_data_layer.acquire() as acquired:
+        assert acquired is connection
+
+    assert metrics.snapshot()["database.pool.acquire_seconds.count"] == 1
+    pooled_data_layer.pool.release.assert_awaited_once_with(connection)  # type: ignore[union-attr]
+
+
+async def test_connect_configures_the_pool(monkeypatch):
+    create_pool = AsyncMock(
+        return_value=Mock(
+            get_size=Mock(return_value=2), get_idle_size=Mock(return_value=1)
+        )
+    )
+    monkeypatch.setattr(asyncpg, "create_pool", create_pool)
+    data_layer = ChainlitDataLayer(
+        database_url="postgresql://localhost/test",
+        pool_min_size=2,
+        pool_max_size=20,
+        command_timeout=5,
+        statement_cache_size=0,
+    )
+
+    await data_layer.connect()
+    await data_layer.connect()
+
+    create_pool.assert_awaited_once()
+    kwargs = create_pool.await_args.kwargs
+    assert kwargs["min_size"] == 2
+    assert kwargs["max_size"] == 20
+    assert kwargs["command_timeout"] == 5
+    assert kwargs["statement_cache_size"] == 0
+    assert metrics.snapshot()["database.pool.in_use"] == 1
+
+
+async def test_steps_other_than_messages_do_not_bump_the_thread_activity(
+    data_layer: ChainlitDataLayer, step_dict: StepDict, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.create_step(step_dict)
+
+        query, params = data_layer.execute_query.call_args.args  # type: ignore[attr-defined]
+        assert "WHERE id = $2 AND $8 IN ('user_message', 'assistant_message')" in query
+        # Nor the activity of the thread they create
+        assert (
+            "CASE WHEN $8 IN ('user_message', 'assistant_message') THEN $9 END" in query
+        )
+        assert params["type"] == "tool"
+
+
+async def test_list_threads_without_activity(data_layer: ChainlitDataLayer):
+    created_at = datetime(2024, 1, 1, 12)
+    data_layer.execute_query.return_value = [  # type: ignore[attr-defined]
+        {**thread_row("1", created_at), "updatedAt": None}
+    ]
+
+    page = await data_layer.list_threads(Pagination(first=2), ThreadFilter())
+
+    assert page.data[0]["updatedAt"] == created_at.isoformat()
+    assert page.pageInfo.endCursor == f"{created_at.isoformat()}|1"
+
+
+def executed(connection: MagicMock) -> List[str]:
+    return [call.args[0] for call in connection.execute.await_args_list]
+
+
+async def test_create_thread_indexes(
+    data_layer: ChainlitDataLayer, connection: MagicMock
+):
+    # Locked, the index does not exist
+    connection.fetchval = AsyncMock(side_effect=[True, None])
+
+    await data_layer.create_thread_indexes()
+
+    create, unlock = executed(connection)
+    assert create == (
+        'CREATE INDEX CONCURRENTLY "Thread_userId_activity_idx" '
+        'ON "Thread" ("userId", COALESCE("updatedAt", "createdAt") DESC, id DESC)'
+    )
+    assert "pg_advisory_unlock" in unlock
+
+
+async def test_create_thread_indexes_replaces_an_invalid_index(
+    data_layer: ChainlitDataLayer, connection: MagicMock
+):
+    connection.fetchval = AsyncMock(side_effect=[True, False])
+
+    await data_layer.create_thread_indexes()
+
+    drop, create, _ = executed(connection)
+    assert drop == 'DROP INDEX CONCURRENTLY "Thread_userId_activity_idx"'
+    assert create.startswith("CREATE INDEX CONCURRENTLY")
+
+
+@pytest.mark.parametrize("fetched", [[True, True], [False]])
+async def test_create_thread_indexes_skips_valid_or_locked_index(
+    data_layer: ChainlitDataLayer, connection: MagicMock, fetched: List[bool]
+):
+    connection.fetchval = AsyncMock(side_effect=fetched)
+
+    await data_layer.create_thread_indexes()
+
+    assert not any("CREATE INDEX" in query for query in executed(connection))
+
+
+def test_indexes_are_not_created_by_default(data_layer: ChainlitDataLayer):
+    assert data_layer.create_indexes is False
+
+
+async def test_create_search_indexes(
+    data_layer: ChainlitDataLayer, connection: MagicMock
+):
+    data_layer.full_text_search = "simple"
+    # Each index is locked and does not exist yet
+    connection.fetchval = AsyncMock(side_effect=[True, None, True, None])
+
+    await data_layer.create_search_indexes()
+
+    thread_index, _, step_index, _ = executed(connection)
+    assert thread_index.startswith(
+        'CREATE INDEX CONCURRENTLY "Thread_name_simple_search_idx"'
+    )
+    assert "to_tsvector('simple', COALESCE(name, ''))" in thread_index
+    assert "to_tsvector('simple', COALESCE(output, ''))" in step_index
+    assert "WHERE type IN ('user_message', 'assistant_message')" in step_index
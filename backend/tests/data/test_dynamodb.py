@@ -0,0 +1,180 @@
+import threading
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from chainlit.data.dynamodb import DynamoDBDataLayer
+from chainlit.element import Text
+from chainlit.step import StepDict
+from chainlit.types import Pagination, ThreadFilter
+from chainlit.user import User
+
+TABLE_NAME = "chainlit"
+
+
+@pytest.fixture
+def dynamodb_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("dynamodb", region_name="us-east-1")
+        client.create_table(
+            TableName=TABLE_NAME,
+            AttributeDefinitions=[
+                {"AttributeName": name, "AttributeType": "S"}
+                for name in ["PK", "SK", "UserThreadPK", "UserThreadSK"]
+            ],
+            KeySchema=[
+                {"AttributeName": "PK", "KeyType": "HASH"},
+                {"AttributeName": "SK", "KeyType": "RANGE"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "UserThread",
+                    "KeySchema": [
+                        {"AttributeName": "UserThreadPK", "KeyType": "HASH"},
+                        {"AttributeName": "UserThreadSK", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield client
+
+
+@pytest.fixture
+async def data_layer(dynamodb_client, mock_storage_client):
+    data_layer = DynamoDBDataLayer(
+        table_name=TABLE_NAME,
+        client=dynamodb_client,
+        storage_provider=mock_storage_client,
+    )
+    yield data_layer
+    await data_layer.close()
+
+
+def make_step(thread_id: str, index: int) -> StepDict:
+    return {
+        "id": f"step-{index:03}",
+        "threadId": thread_id,
+        "name": "Assistant",
+        "type": "assistant_message",
+        "output": f"Message {index}",
+        "createdAt": f"2024-01-01T00:00:{index // 10:02}.{index % 10}Z",
+    }  # type: ignore[typeddict-item]
+
+
+def count_items(dynamodb_client, thread_id: str) -> int:
+    response = dynamodb_client.query(
+        TableName=TABLE_NAME,
+        KeyConditionExpression="PK = :pk",
+        ExpressionAttributeValues={":pk": {"S": f"THREAD#{thread_id}"}},
+        Select="COUNT",
+    )
+    return response["Count"]
+
+
+async def test_client_calls_do_not_block_the_event_loop(data_layer, test_user):
+    threads = []
+    get_item = data_layer.client.get_item
+
+    def record_thread(**kwargs):
+        threads.append(threading.current_thread())
+        return get_item(**kwargs)
+
+    with patch.object(data_layer.client, "get_item", side_effect=record_thread):
+        await data_layer.create_user(test_user)
+        user = await data_layer.get_user(test_user.identifier)
+
+    assert user is not None
+    assert user.identifier == test_user.identifier
+    assert threads
+    assert threading.current_thread() not in threads
+
+
+async def test_steps_and_elements_are_written_in_batches(
+    data_layer, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.update_thread("t1", name="Thread", user_id="user")
+        steps = [make_step("t1", i) for i in range(60)]
+        elements = [
+            Text(id=f"element-{i}", for_id="step-000", thread_id="t1", content="text")
+            for i in range(3)
+        ]
+
+        with patch.object(
+            data_layer.client,
+            "batch_write_item",
+            wraps=data_layer.client.batch_write_item,
+        ) as batch_write_item:
+            await data_layer.create_steps(steps)
+            await data_layer.create_elements(elements)
+
+        thread = await data_layer.get_thread("t1")
+
+    # 60 steps in batches of 25, then the elements
+    assert batch_write_item.call_count == 4
+    assert thread is not None
+    assert [step["id"] for step in thread["steps"]] == [step["id"] for step in steps]
+    assert sorted(element["id"] for element in thread["elements"]) == [
+        "element-0",
+        "element-1",
+        "element-2",
+    ]
+
+
+async def test_get_thread_reads_every_page(data_layer, mock_chainlit_context):
+    async with mock_chainlit_context:
+        await data_layer.update_thread("t1", name="Thread", user_id="user")
+        await data_layer.create_steps([make_step("t1", i) for i in range(30)])
+
+        query = data_layer.client.query
+
+        def paginated_query(**kwargs):
+            return query(Limit=7, **kwargs)
+
+        with patch.object(data_layer.client, "query", side_effect=paginated_query):
+            thread = await data_layer.get_thread("t1")
+
+    assert thread is not None
+    assert thread["name"] == "Thread"
+    assert len(thread["steps"]) == 30
+
+
+async def test_get_thread_without_thread_item(data_layer, mock_chainlit_context):
+    async with mock_chainlit_context:
+        await data_layer.create_step(make_step("orphan", 1))
+
+    assert await data_layer.get_thread("orphan") is None
+    assert await data_layer.get_thread("unknown") is None
+
+
+async def test_delete_thread_deletes_all_its_items(
+    data_layer, dynamodb_client, mock_chainlit_context
+):
+    async with mock_chainlit_context:
+        await data_layer.update_thread("t1", name="Thread", user_id="user")
+        await data_layer.update_thread("t2", name="Other", user_id="user")
+        await data_layer.create_steps([make_step("t1", i) for i in range(60)])
+        await data_layer.create_step(make_step("t2", 1))
+
+        await data_layer.delete_thread("t1")
+
+    assert count_items(dynamodb_client, "t1") == 0
+    assert count_items(dynamodb_client, "t2") == 2
+
+
+async def test_list_threads(data_layer):
+    await data_layer.create_user(User(identifier="user"))
+    await data_layer.update_thread("t1", name="First", user_id="user")
+    await data_layer.update_thread("t2", name="Second", user_id="user")
+
+    threads = await data_layer.list_threads(
+        Pagination(first=10), ThreadFilter(userId="user")
+    )
+
+    assert sorted(thread["name"] for thread in threads.data) == ["First", "Second"]
@@ -1,6 +1,7 @@
 from unittest.mock import AsyncMock, Mock
 
 from chainlit.data import get_data_layer
+from chainlit.data.chainlit_data_layer import ChainlitDataLayer
 
 
 async def test_get_data_layer(
@@ -16,3 +17,22 @@ async def test_get_data_layer(
     assert mock_data_layer == get_data_layer()
 
     mock_get_data_layer.assert_called_once()
+
+
+def test_get_data_layer_options(monkeypatch):
+    monkeypatch.setattr("chainlit.data._data_layer", None)
+    monkeypatch.setattr("chainlit.data._data_layer_initialized", False)
+    monkeypatch.setattr("chainlit.config.config.code.data_layer", None)
+    monkeypatch.delenv("LITERAL_API_KEY", raising=False)
+    monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/test")
+    monkeypatch.setenv("DATABASE_POOL_MAX_SIZE", "50")
+    monkeypatch.setenv("DATABASE_COMMAND_TIMEOUT", "2.5")
+    monkeypatch.setenv("DATABASE_FULL_TEXT_SEARCH", "english")
+
+    data_layer = get_data_layer()
+
+    assert isinstance(data_layer, ChainlitDataLayer)
+    assert data_layer.pool_min_size == 10
+    assert data_layer.pool_max_size == 50
+    assert data_layer.command_timeout == 2.5
+    assert data_layer.full_text_search == "english"
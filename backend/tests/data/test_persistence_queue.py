@@ -0,0 +1,203 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from chainlit.config import config
+from chainlit.context import context
+from chainlit.data.base import BaseDataLayer
+from chainlit.data.persistence_queue import PersistenceQueue
+from chainlit.metrics import metrics
+
+
+@pytest.fixture
+def data_layer():
+    return AsyncMock(spec=BaseDataLayer)
+
+
+@pytest.fixture
+def project_config(monkeypatch):
+    monkeypatch.setattr(config.project, "persistence_flush_interval_ms", 10)
+    monkeypatch.setattr(config.project, "persistence_batch_size", 100)
+    monkeypatch.setattr(config.project, "persistence_queue_size", 100)
+    return config.project
+
+
+@pytest.fixture
+def queue(project_config):
+    metrics.reset()
+    return PersistenceQueue()
+
+
+def method_calls(data_layer):
+    return [(name, args) for name, args, _ in data_layer.method_calls]
+
+
+async def test_writes_of_a_step_are_coalesced(queue, data_layer):
+    await queue.create_step(data_layer, {"id": "1", "output": ""})
+    for output in ["a", "ab", "abc"]:
+        await queue.patch_step(data_layer, {"id": "1", "output": output}, ["output"])
+    await queue.flush()
+
+    assert method_calls(data_layer) == [
+        ("create_step", ({"id": "1", "output": "abc"},))
+    ]
+    assert metrics.snapshot()["persistence.coalesced"] == 3
+
+
+async def test_patches_are_merged(queue, data_layer):
+    await queue.patch_step(data_layer, {"id": "1", "output": "a"}, ["output"])
+    await queue.patch_step(data_layer, {"id": "1", "output": "a", "end": "t"}, ["end"])
+    await queue.update_step(data_layer, {"id": "2"})
+    await queue.patch_step(data_layer, {"id": "2", "output": "b"}, ["output"])
+    await queue.flush()
+
+    assert method_calls(data_layer) == [
+        ("patch_step", ({"id": "1", "output": "a", "end": "t"}, ["output", "end"])),
+        ("update_step", ({"id": "2", "output": "b"},)),
+    ]
+
+
+async def test_writes_are_made_in_order(queue, data_layer):
+    await queue.create_step(data_layer, {"id": "parent"})
+    await queue.create_step(data_layer, {"id": "child"})
+    await queue.update_step(data_layer, {"id": "parent", "output": "done"})
+    await queue.delete_step(data_layer, "child")
+    await queue.create_step(data_layer, {"id": "child"})
+    await queue.flush()
+
+    assert method_calls(data_layer) == [
+        ("create_step", ({"id": "parent", "output": "done"},)),
+        ("delete_step", ("child",)),
+        ("create_step", ({"id": "child"},)),
+    ]
+
+
+async def test_consecutive_creations_are_made_at_once(queue, data_layer):
+    await queue.create_step(data_layer, {"id": "1"})
+    await queue.create_step(data_layer, {"id": "2"})
+    await queue.delete_step(data_layer, "3")
+    await queue.create_step(data_layer, {"id": "4"})
+    await queue.flush()
+
+    assert method_calls(data_layer) == [
+        ("create_steps", ([{"id": "1"}, {"id": "2"}],)),
+        ("delete_step", ("3",)),
+        ("create_step", ({"id": "4"},)),
+    ]
+
+
+async def test_writes_are_made_in_the_background(queue, data_layer):
+    await queue.create_step(data_layer, {"id": "1"})
+    assert queue.pending == 1
+
+    await asyncio.sleep(0.05)
+
+    data_layer.create_step.assert_awaited_once()
+    assert queue.pending == 0
+    assert metrics.snapshot()["persistence.written"] == 1
+
+
+async def test_full_queue_waits_for_the_writes(project_config, queue, data_layer):
+    project_config.persistence_queue_size = 2
+    project_config.persistence_flush_interval_ms = 10_000
+
+    for i in range(5):
+        await asyncio.wait_for(queue.create_step(data_layer, {"id": str(i)}), 1)
+    await queue.flush()
+
+    assert metrics.snapshot()["persistence.written"] == 5
+
+
+async def test_failed_writes_are_counted(queue, data_layer):
+    data_layer.create_step.side_effect = Exception("Database unavailable")
+
+    await queue.create_step(data_layer, {"id": "1"})
+    await queue.create_element(data_layer, AsyncMock(id="element"))
+    await queue.flush()
+
+    data_layer.create_element.assert_awaited_once()
+    assert metrics.snapshot()["persistence.failed"] == 1
+
+
+async def test_writes_run_in_the_caller_context(
+    queue, data_layer, mock_chainlit_context
+):
+    sessions = []
+    data_layer.create_step.side_effect = lambda step_dict: sessions.append(
+        context.session
+    )
+
+    async with mock_chainlit_context as caller_context:
+        await queue.create_step(data_layer, {"id": "1"})
+    await queue.flush()
+
+    assert sessions == [caller_context.session]
+
+
+def test_queue_is_used_from_another_event_loop(project_config, data_layer):
+    queue = PersistenceQueue()
+    stopped_loop = asyncio.new_event_loop()
+    # The writer task of the first loop is left pending when it stops
+    stopped_loop.run_until_complete(queue.create_step(data_layer, {"id": "1"}))
+    stopped_task = queue._task
+
+    async def write():
+        await queue.create_step(data_layer, {"id": "2"})
+        await asyncio.wait_for(queue.flush(), timeout=1)
+
+    try:
+        asyncio.run(write())
+    finally:
+        assert stopped_task is not None
+        stopped_task.cancel()
+        stopped_loop.run_until_complete(asyncio.sleep(0))
+        stopped_loop.close()
+
+    assert method_calls(data_layer) == [("create_steps", ([{"id": "1"}, {"id": "2"}],))]
+
+
+def test_full_queue_starts_the_writer_of_another_event_loop(project_config, data_layer):
+    project_config.persistence_queue_size = 1
+    project_config.persistence_flush_interval_ms = 10_000
+    queue = PersistenceQueue()
+    stopped_loop = asyncio.new_event_loop()
+    # The queue is full when the first loop stops
+    stopped_loop.run_until_complete(queue.create_step(data_layer, {"id": "1"}))
+    stopped_task = queue._task
+
+    async def write():
+        await asyncio.wait_for(queue.create_step(data_layer, {"id": "2"}), 1)
+        await asyncio.wait_for(queue.flush(), timeout=1)
+
+    try:
+        asyncio.run(write())
+    finally:
+        assert stopped_task is not None
+        stopped_task.cancel()
+        stopped_loop.run_until_complete(asyncio.sleep(0))
+        stopped_loop.close()
+
+    assert method_calls(data_layer) == [
+        ("create_step", ({"id": "1"},)),
+        ("create_step", ({"id": "2"},)),
+    ]
+
+
+async def test_waited_writes_raise_the_errors(project_config, queue, data_layer):
+    project_config.persistence_flush_interval_ms = 10_000
+    data_layer.create_step.side_effect = Exception("Database unavailable")
+
+    # Also raised for a write merged into a later one
+    first = asyncio.create_task(queue.create_step(data_layer, {"id": "1"}, wait=True))
+    await asyncio.sleep(0)
+    with pytest.raises(Exception, match="Database unavailable"):
+        await asyncio.wait_for(
+            queue.update_step(data_layer, {"id": "1", "output": "a"}, wait=True), 1
+        )
+    with pytest.raises(Exception, match="Database unavailable"):
+        await first
+
+    data_layer.create_step.side_effect = None
+    await asyncio.wait_for(queue.create_step(data_layer, {"id": "2"}, wait=True), 1)
+    data_layer.create_step.assert_awaited_with({"id": "2"})
@@ -1,3 +1,4 @@
+import sqlite3
 import uuid
 from pathlib import Path
 
@@ -6,9 +7,10 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 
 from chainlit import User
-from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
+from chainlit.data.sql_alchemy import SQLITE_SEARCH_SCHEMA, SQLAlchemyDataLayer
 from chainlit.data.storage_clients.base import BaseStorageClient
 from chainlit.element import Text
+from chainlit.types import Feedback, Pagination, ThreadFilter
 
 
 @pytest.fixture
@@ -97,7 +99,8 @@ async def data_layer(mock_storage_client: BaseStorageClient, tmp_path: Path):
                     "page" INT,
                     "language" TEXT,
                     "forId" UUID,
-                    "mime" TEXT
+                    "mime" TEXT,
+                    "props" JSONB
                 );
         """
             )
@@ -216,3 +219,192 @@ async def test_delete_thread(test_user: User, data_layer: SQLAlchemyDataLayer):
     await data_layer.delete_thread("test_thread")
     thread = await data_layer.get_thread("test_thread")
     assert thread is None
+
+
+async def test_list_threads(
+    test_user: User, data_layer: SQLAlchemyDataLayer, mock_chainlit_context
+):
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    thread_ids = [str(uuid.uuid4()) for _ in range(3)]
+    step_ids = [str(uuid.uuid4()) for _ in range(3)]
+    async with mock_chainlit_context:
+        for i, (thread_id, step_id) in enumerate(zip(thread_ids, step_ids)):
+            await data_layer.update_thread(thread_id, user_id=persisted_user.id)
+            await data_layer.create_step(
+                {
+                    "id": step_id,
+                    "threadId": thread_id,
+                    "name": "step",
+                    "type": "assistant_message",
+                    "output": f"Answer 100% #{i}",
+                    "streaming": False,
+                    "disableFeedback": False,  # type: ignore[typeddict-unknown-key]
+                }
+            )
+    await data_layer.upsert_feedback(
+        Feedback(forId=step_ids[2], threadId=thread_ids[2], value=0)
+    )
+
+    def list_threads(first=10, **filters):
+        return data_layer.list_threads(
+            Pagination(first=first, cursor=filters.pop("cursor", None)),
+            ThreadFilter(userId=persisted_user.id, **filters),
+        )
+
+    page = await list_threads(first=2)
+    assert [thread["id"] for thread in page.data] == thread_ids[::-1][:2]
+    assert page.pageInfo.hasNextPage
+
+    page = await list_threads(first=2, cursor=page.pageInfo.endCursor)
+    assert [thread["id"] for thread in page.data] == thread_ids[:1]
+    assert not page.pageInfo.hasNextPage
+
+    # The thread of the cursor was deleted since
+    page = await list_threads(first=2, cursor=str(uuid.uuid4()))
+    assert [thread["id"] for thread in page.data] == thread_ids[::-1][:2]
+
+    page = await list_threads(search="100% #1")
+    assert [thread["id"] for thread in page.data] == [thread_ids[1]]
+
+    page = await list_threads(search="100_")
+    assert page.data == []
+
+    page = await list_threads(feedback=0)
+    assert [thread["id"] for thread in page.data] == [thread_ids[2]]
+
+    page = await list_threads(feedback=1)
+    assert page.data == []
+
+
+async def test_list_threads_full_text_search(
+    test_user: User, data_layer: SQLAlchemyDataLayer, mock_chainlit_context
+):
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    async def create_thread(name: str, *outputs: str, type="assistant_message"):
+        thread_id = str(uuid.uuid4())
+        await data_layer.update_thread(thread_id, name, user_id=persisted_user.id)
+        for output in outputs:
+            await data_layer.create_step(
+                {
+                    "id": str(uuid.uuid4()),
+                    "threadId": thread_id,
+                    "name": "step",
+                    "type": type,
+                    "output": output,
+                    "streaming": False,
+                    "disableFeedback": False,  # type: ignore[typeddict-unknown-key]
+                }
+            )
+        return thread_id
+
+    def search(search: str, first=10, cursor=None):
+        return data_layer.list_threads(
+            Pagination(first=first, cursor=cursor),
+            ThreadFilter(userId=persisted_user.id, search=search),
+        )
+
+    async with mock_chainlit_context:
+        # Written before the search is enabled, indexed when it is
+        backfilled = await create_thread("Invoices", "The invoice is paid")
+
+        data_layer.full_text_search = True
+        await data_layer.connect()
+
+        once = await create_thread("Weather", "An invoice was sent yesterday")
+        twice = await create_thread("Invoice", "Invoice total", "invoice due")
+        await create_thread("Tools", "invoice", type="tool")
+        renamed = await create_thread("Invoice draft")
+        await data_layer.update_thread(renamed, "Drafts")
+
+    page = await search("invoice")
+    ids = [thread["id"] for thread in page.data]
+    assert set(ids) == {backfilled, once, twice}
+
+    page = await search("invoice", first=2)
+    assert page.pageInfo.hasNextPage
+    next_page = await search("invoice", first=2, cursor=page.pageInfo.endCursor)
+    assert [thread["id"] for thread in page.data + next_page.data] == ids
+
+    page = await search("invo yesterd")
+    assert [thread["id"] for thread in page.data] == [once]
+
+
+def test_full_text_search_skips_steps_outside_of_threads():
+    connection = sqlite3.connect(":memory:")
+    connection.execute('CREATE TABLE threads ("id" TEXT PRIMARY KEY, "name" TEXT)')
+    connection.execute(
+        """CREATE TABLE steps (
+            "id" TEXT PRIMARY KEY, "threadId" TEXT, "type" TEXT, "output" TEXT
+        )"""
+    )
+    for statement in SQLITE_SEARCH_SCHEMA:
+        connection.execute(statement)
+
+    connection.execute(
+        "INSERT INTO steps VALUES ('step', NULL, 'assistant_message', 'invoice')"
+    )
+    assert connection.execute("SELECT * FROM search_documents").fetchall() == []
+
+    connection.execute("""UPDATE steps SET "threadId" = 'thread' WHERE id = 'step'""")
+    assert connection.execute("SELECT * FROM search_documents").fetchall() == [
+        (1, "step", "thread")
+    ]
+
+
+async def test_get_thread_steps(
+    test_user: User, data_layer: SQLAlchemyDataLayer, mock_chainlit_context
+):
+    persisted_user = await data_layer.create_user(test_user)
+    assert persisted_user
+
+    thread_id = str(uuid.uuid4())
+    # A run with 3 tool steps, then a message with an element
+    step_ids = [str(uuid.uuid4()) for _ in range(5)]
+    async with mock_chainlit_context:
+        await data_layer.update_thread(thread_id, user_id=persisted_user.id)
+        for i, step_id in enumerate(step_ids):
+            await data_layer.create_step(
+                {
+                    "id": step_id,
+                    "threadId": thread_id,
+                    "parentId": step_ids[0] if 0 < i < 4 else None,
+                    "name": "step",
+                    "type": "tool" if 0 < i < 4 else "run",
+                    "createdAt": f"2024-01-01T00:00:0{i}Z",
+                    "streaming": False,
+                    "disableFeedback": False,  # type: ignore[typeddict-unknown-key]
+                }
+            )
+        await data_layer.create_element(
+            Text(
+                id=str(uuid.uuid4()),
+                name="answer.txt",
+                content="answer",
+                thread_id=thread_id,
+                for_id=step_ids[4],
+            )
+        )
+
+    page = await data_layer.get_thread_steps(thread_id, limit=2)
+    # The run the last tool step is nested in comes along
+    assert [step["id"] for step in page["steps"]] == [
+        step_ids[0],
+        step_ids[3],
+        step_ids[4],
+    ]
+    assert [element["forId"] for element in page["elements"]] == [step_ids[4]]
+    assert page["before"] == step_ids[3]
+
+    page = await data_layer.get_thread_steps(thread_id, before=page["before"])
+    assert [step["id"] for step in page["steps"]] == step_ids[:3]
+    assert page["elements"] == []
+    assert page["before"] is None
+
+    thread = await data_layer.get_thread_window(thread_id, 2)
+    assert thread
+    assert len(thread["steps"]) == 3
+    assert thread.get("stepsBefore") == step_ids[3]
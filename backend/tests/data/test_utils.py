@@ -0,0 +1,33 @@
+from chainlit.data.utils import steps_window
+
+
+def test_steps_window():
+    steps = [
+        {"id": "run", "parentId": None},
+        {"id": "tool_1", "parentId": "run"},
+        {"id": "tool_2", "parentId": "run"},
+        {"id": "answer", "parentId": None},
+    ]
+    elements = [
+        {"id": "image", "forId": "tool_1"},
+        {"id": "file", "forId": "answer"},
+        {"id": "tasklist", "forId": None},
+    ]
+
+    page = steps_window(steps, elements, None, 2)  # type: ignore[arg-type]
+
+    assert [step["id"] for step in page["steps"]] == ["run", "tool_2", "answer"]
+    assert [element["id"] for element in page["elements"]] == ["file", "tasklist"]
+    assert page["before"] == "tool_2"
+
+    page = steps_window(steps, elements, page["before"], 2)  # type: ignore[arg-type]
+
+    assert [step["id"] for step in page["steps"]] == ["run", "tool_1"]
+    assert [element["id"] for element in page["elements"]] == ["image"]
+    assert page["before"] is None
+
+
+def test_steps_window_of_unknown_cursor():
+    page = steps_window([{"id": "step"}], [], "unknown", 2)  # type: ignore[list-item]
+
+    assert page == {"steps": [], "elements": [], "before": None}
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from chainlit.audio import INITIAL_BUFFER_SIZE, AudioStream, audio_stream
+from chainlit.config import config
+from chainlit.types import InputAudioChunk
+
+
+def make_chunk(data: bytes, is_start: bool = False) -> InputAudioChunk:
+    return InputAudioChunk(isStart=is_start, mimeType="pcm16", elapsedTime=0, data=data)
+
+
+@pytest.fixture
+def on_audio_chunk(monkeypatch):
+    received = []
+
+    async def hook(chunk: InputAudioChunk):
+        # Yield so that out of order processing would show
+        await asyncio.sleep(0)
+        received.append(chunk.data)
+
+    monkeypatch.setattr(config.code, "on_audio_chunk", hook)
+    return received
+
+
+async def test_chunks_are_processed_in_order(on_audio_chunk):
+    stream = AudioStream(maxsize=2)
+
+    chunks = [bytes([i]) * 4 for i in range(10)]
+    await asyncio.gather(
+        *(
+            stream.put(make_chunk(data, is_start=i == 0))
+            for i, data in enumerate(chunks)
+        )
+    )
+    await stream.close()
+
+    assert on_audio_chunk == chunks
+    assert stream.mime_type == "pcm16"
+    assert bytes(stream.data) == b"".join(chunks)
+
+
+async def test_buffer_grows_without_invalidating_views(on_audio_chunk):
+    stream = AudioStream(maxsize=4)
+
+    await stream.put(make_chunk(b"a" * INITIAL_BUFFER_SIZE))
+    await stream.put(make_chunk(b"b"))
+    while len(stream.data) < INITIAL_BUFFER_SIZE + 1:
+        await asyncio.sleep(0)
+    view = stream.data
+
+    await stream.put(make_chunk(b"c" * INITIAL_BUFFER_SIZE))
+    await stream.close()
+
+    assert len(view) == INITIAL_BUFFER_SIZE + 1
+    assert len(stream.data) == 2 * INITIAL_BUFFER_SIZE + 1
+    assert bytes(stream.data[INITIAL_BUFFER_SIZE:]).startswith(b"bc")
+
+
+async def test_iterate_frames(on_audio_chunk):
+    stream = AudioStream(maxsize=4)
+
+    async def collect():
+        return [bytes(frame) async for frame in stream]
+
+    frames = asyncio.create_task(collect())
+    for data in (b"one", b"two", b"three"):
+        await stream.put(make_chunk(data))
+        await asyncio.sleep(0)
+    await stream.close()
+
+    assert await frames == [b"one", b"two", b"three"]
+
+
+async def test_chunks_after_close_are_dropped(on_audio_chunk):
+    stream = AudioStream(maxsize=4)
+    await stream.put(make_chunk(b"one"))
+    await stream.close()
+    await stream.put(make_chunk(b"two"))
+
+    assert bytes(stream.data) == b"one"
+
+
+async def test_audio_stream_is_created_per_session(mock_chainlit_context):
+    async with mock_chainlit_context as context:
+        stream = audio_stream()
+
+        assert audio_stream() is stream
+        assert context.session.audio_stream is stream
+
+
+async def test_failing_hook_does_not_stop_the_stream(monkeypatch):
+    received = []
+
+    async def hook(chunk: InputAudioChunk):
+        received.append(chunk.data)
+        raise ValueError("Transcription failed")
+
+    monkeypatch.setattr(config.code, "on_audio_chunk", hook)
+    stream = AudioStream(maxsize=1)
+
+    for data in (b"one", b"two", b"three"):
+        await stream.put(make_chunk(data))
+    await asyncio.wait_for(stream.close(), timeout=1)
+
+    assert received == [b"one", b"two", b"three"]
+
+
+async def test_oldest_chunks_are_dropped_past_the_maximum_size(on_audio_chunk):
+    stream = AudioStream(maxsize=4, max_buffer_size=8)
+
+    for data in (b"aaa", b"bbb", b"ccc", b"ddd"):
+        await stream.put(make_chunk(data))
+    await stream.close()
+
+    assert bytes(stream.data) == b"cccddd"
+    # A late reader only gets the chunks still in the buffer
+    assert [bytes(frame) async for frame in stream] == [b"ccc", b"ddd"]
@@ -0,0 +1,73 @@
+from unittest.mock import Mock
+
+from chainlit.chat_context import chat_context, chat_contexts
+from chainlit.message import Message
+
+
+def make_message(content: str, type="user_message") -> Message:
+    message = Message(content=content)
+    message.type = type
+    return message
+
+
+async def test_chat_context_add_update_remove(mock_chainlit_context):
+    async with mock_chainlit_context as context:
+        first = make_message("Hello")
+        second = make_message("Hi!", type="assistant_message")
+        chat_context.add(first)
+        chat_context.add(second)
+
+        # Adding an updated message keeps its position
+        first.content = "Hello there"
+        chat_context.add(first)
+        assert chat_context.get() == [first, second]
+
+        assert chat_context.remove(first)
+        assert not chat_context.remove(first)
+        assert chat_context.get() == [second]
+
+        chat_context.clear()
+        assert chat_context.get() == []
+        chat_contexts.pop(context.session.id)
+
+
+async def test_chat_context_to_openai_token_budget(mock_chainlit_context):
+    async with mock_chainlit_context as context:
+        for i, content in enumerate(["a" * 10, "b" * 10, "c" * 5]):
+            chat_context.add(
+                make_message(content, "user_message" if i % 2 else "assistant_message")
+            )
+
+        tokenizer = Mock(side_effect=len)
+
+        assert chat_context.to_openai(max_tokens=15, tokenizer=tokenizer) == [
+            {"role": "user", "content": "b" * 10},
+            {"role": "assistant", "content": "c" * 5},
+        ]
+        assert len(chat_context.to_openai()) == 3
+
+        # Token counts are cached until the content changes
+        tokenizer.reset_mock()
+        chat_context.to_openai(max_tokens=15, tokenizer=tokenizer)
+        tokenizer.assert_not_called()
+
+        last = chat_context.get()[-1]
+        last.content = "c" * 6
+        assert len(chat_context.to_openai(max_tokens=15, tokenizer=tokenizer)) == 1
+        tokenizer.assert_called_once_with("c" * 6)
+
+        chat_contexts.pop(context.session.id)
+
+
+async def test_chat_context_to_openai_keeps_latest_message_over_budget(
+    mock_chainlit_context,
+):
+    async with mock_chainlit_context as context:
+        chat_context.add(make_message("a" * 5, "user_message"))
+        chat_context.add(make_message("b" * 20, "assistant_message"))
+
+        assert chat_context.to_openai(max_tokens=10, tokenizer=len) == [
+            {"role": "assistant", "content": "b" * 20},
+        ]
+
+        chat_contexts.pop(context.session.id)
@@ -0,0 +1,30 @@
+from datetime import datetime
+from unittest.mock import patch
+
+from chainlit.clock import MonotonicClock, utc_now
+
+
+def test_utc_now_is_strictly_increasing():
+    timestamps = [utc_now() for _ in range(1000)]
+
+    assert timestamps == sorted(timestamps)
+    assert len(set(timestamps)) == len(timestamps)
+
+
+def test_utc_now_format():
+    timestamp = utc_now()
+
+    assert timestamp.endswith("Z")
+    assert datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def test_clock_does_not_go_backward():
+    clock = MonotonicClock()
+    first = clock.now()
+
+    with patch("chainlit.clock.datetime") as mock_datetime:
+        mock_datetime.now.return_value = datetime(2000, 1, 1)
+        second = clock.now()
+
+    assert second > first
+    assert (second - first).microseconds == 1
@@ -1,10 +1,13 @@
-from unittest.mock import MagicMock
+import asyncio
+import time
+from unittest.mock import MagicMock, call
 
 import pytest
 
 from chainlit.element import ElementDict
 from chainlit.emitter import ChainlitEmitter
 from chainlit.step import StepDict
+from chainlit.streaming import SentSteps, TokenCoalescer
 
 
 @pytest.fixture
@@ -69,6 +72,54 @@ async def test_update_step(
     mock_websocket_session.emit.assert_called_once_with("update_message", step_dict)
 
 
+async def test_update_step_patch(
+    emitter: ChainlitEmitter, mock_websocket_session: MagicMock
+) -> None:
+    mock_websocket_session.sent_steps = SentSteps(maxsize=10)
+    mock_websocket_session.capabilities = {"patch_message"}
+    step_dict: StepDict = {
+        "id": "test_step",
+        "type": "tool",
+        "name": "Test Step",
+        "output": "A large tool output",
+        "metadata": {"key": "value"},
+        "end": None,
+    }
+
+    await emitter.send_step(step_dict)
+    await emitter.update_step({**step_dict, "end": "2025-01-01T00:00:00.000000Z"})
+    # Nothing changed, nothing is sent
+    await emitter.update_step({**step_dict, "end": "2025-01-01T00:00:00.000000Z"})
+    step_dict["metadata"]["key"] = "other value"
+    await emitter.update_step({**step_dict, "end": "2025-01-01T00:00:00.000000Z"})
+
+    assert mock_websocket_session.emit.call_args_list[1:] == [
+        call(
+            "patch_message",
+            {"id": "test_step", "end": "2025-01-01T00:00:00.000000Z"},
+        ),
+        call(
+            "patch_message",
+            {"id": "test_step", "metadata": {"key": "other value"}},
+        ),
+    ]
+
+
+async def test_update_step_full_without_capability(
+    emitter: ChainlitEmitter, mock_websocket_session: MagicMock
+) -> None:
+    mock_websocket_session.sent_steps = SentSteps(maxsize=10)
+    mock_websocket_session.capabilities = set()
+    step_dict: StepDict = {"id": "test_step", "type": "tool", "output": "output"}
+
+    await emitter.send_step(step_dict)
+    await emitter.update_step({**step_dict, "output": "new output"})
+
+    mock_websocket_session.emit.assert_called_with(
+        "update_message", {**step_dict, "output": "new output"}
+    )
+
+
 async def test_delete_step(
     emitter: ChainlitEmitter, mock_websocket_session: MagicMock
 ) -> None:
@@ -104,6 +155,112 @@ async def test_send_token(
     )
 
 
+async def test_send_token_coalesced(
+    emitter: ChainlitEmitter, mock_websocket_session: MagicMock
+) -> None:
+    mock_websocket_session.token_coalescer = TokenCoalescer(
+        mock_websocket_session, interval=0.01, max_size=4096
+    )
+
+    for token in ["Hello", " ", "world", "!"]:
+        await emitter.send_token("test_id", token)
+
+    # The first token is sent right away, the others are buffered
+    mock_websocket_session.emit.assert_called_once_with(
+        "stream_token",
+        {"id": "test_id", "token": "Hello", "isSequence": False, "isInput": False},
+    )
+
+    await asyncio.sleep(0.05)
+
+    assert mock_websocket_session.emit.call_args_list[1] == call(
+        "stream_token",
+        {"id": "test_id", "token": " world!", "isSequence": False, "isInput": False},
+    )
+
+
+async def test_send_token_sequence_replaces_buffer(
+    emitter: ChainlitEmitter, mock_websocket_session: MagicMock
+) -> None:
+    mock_websocket_session.token_coalescer = TokenCoalescer(
+        mock_websocket_session, interval=10, max_size=4096
+    )
+
+    await emitter.send_token("test_id", "first")
+    await emitter.send_token("test_id", "a")
+    await emitter.send_token("test_id", "input", is_input=True)
+    await emitter.send_token("test_id", "b", is_sequence=True)
+    await emitter.send_token("test_id", "c")
+    await emitter.update_step({"id": "test_id", "output": "bc"})
+
+    assert mock_websocket_session.emit.call_args_list[1:] == [
+        # Input and output are buffered separately
+        call(
+            "stream_token",
+            {"id": "test_id", "token": "input", "isSequence": False, "isInput": True},
+        ),
+        call(
+            "stream_token",
+            {"id": "test_id", "token": "bc", "isSequence": True, "isInput": False},
+        ),
+        call("update_message", {"id": "test_id", "output": "bc"}),
+    ]
+
+
+async def test_send_token_flushed_on_max_size(
+    emitter: ChainlitEmitter, mock_websocket_session: MagicMock
+) -> None:
+    mock_websocket_session.token_coalescer = TokenCoalescer(
+        mock_websocket_session, interval=10, max_size=4
+    )
+
+    for token in ["a", "bb", "cc", "d"]:
+        await emitter.send_token("test_id", token)
+
+    assert mock_websocket_session.emit.call_count == 2
+    assert mock_websocket_session.emit.call_args == call(
+        "stream_token",
+        {"id": "test_id", "token": "bbcc", "isSequence": False, "isInput": False},
+    )
+
+    await emitter.task_end()
+
+    assert mock_websocket_session.emit.call_args_list[2:] == [
+        call(
+            "stream_token",
+            {"id": "test_id", "token": "d", "isSequence": False, "isInput": False},
+        ),
+        call("task_end", {}),
+    ]
+
+
+async def test_token_coalescer_close_cancels_pending_flush(
+    mock_websocket_session: MagicMock,
+) -> None:
+    released = asyncio.Event()
+
+    async def emit(event, data):
+        await released.wait()
+
+    mock_websocket_session.emit.side_effect = emit
+    coalescer = TokenCoalescer(mock_websocket_session, interval=0.01, max_size=4096)
+
+    # The step stream just sent a token, the next one is buffered
+    coalescer._last_sent[("test_id", False)] = time.monotonic()
+    await coalescer.add("test_id", "a")
+    # The timer fired, the flush is stuck sending the buffered token
+    await asyncio.sleep(0.05)
+    flush_task = coalescer._flush_task
+    assert flush_task
+    assert not flush_task.done()
+
+    coalescer.close()
+    await asyncio.sleep(0)
+
+    assert flush_task.cancelled()
+    assert coalescer._flush_task is None
+
+
 async def test_set_chat_settings(emitter, mock_websocket_session):
     settings = {"key": "value"}
     emitter.set_chat_settings(settings)
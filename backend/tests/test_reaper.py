@@ -0,0 +1,65 @@
+import asyncio
+from typing import List
+
+from chainlit.metrics import metrics
+from chainlit.reaper import SessionReaper
+
+
+class Reaped:
+    def __init__(self):
+        self.batches: List[List[str]] = []
+
+    async def __call__(self, session_ids: List[str]):
+        self.batches.append(session_ids)
+
+
+async def test_reaper_clears_expired_sessions_in_batch():
+    reaped = Reaped()
+    reaper = SessionReaper(reap=reaped)
+    metrics.reset()
+
+    reaper.schedule("a", 0.01)
+    reaper.schedule("b", 0.01)
+    reaper.schedule("c", 10)
+    assert reaper.pending == 3
+
+    await asyncio.sleep(0.05)
+
+    assert reaped.batches == [["a", "b"]]
+    assert reaper.pending == 1
+    assert metrics.snapshot()["session_reaper.reaped"] == 2
+
+    reaper.cancel("c")
+
+
+async def test_reaper_cancel_and_reschedule():
+    reaped = Reaped()
+    reaper = SessionReaper(reap=reaped)
+
+    reaper.schedule("a", 0.01)
+    reaper.schedule("b", 0.01)
+    assert reaper.cancel("a")
+    assert not reaper.cancel("unknown")
+    # Rescheduling replaces the previous deadline
+    reaper.schedule("b", 0.05)
+
+    await asyncio.sleep(0.03)
+    assert reaped.batches == []
+
+    await asyncio.sleep(0.05)
+    assert reaped.batches == [["b"]]
+    assert reaper.pending == 0
+
+
+async def test_reaper_wakes_up_for_earlier_deadline():
+    reaped = Reaped()
+    reaper = SessionReaper(reap=reaped)
+
+    reaper.schedule("late", 10)
+    await asyncio.sleep(0)
+    reaper.schedule("early", 0.01)
+
+    await asyncio.sleep(0.05)
+    assert reaped.batches == [["early"]]
+
+    reaper.cancel("late")
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from chainlit import serialization
+from chainlit.serialization import dumps, dumps_bytes, loads
+from chainlit.session import clean_metadata
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch: pytest.MonkeyPatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_dumps_is_backend_independent(backend):
+    data = {"text": "héllo", "values": [1, 2.5, None, True], 1: "key"}
+
+    assert dumps(data) == '{"text":"héllo","values":[1,2.5,null,true],"1":"key"}'
+    assert dumps({"a": [1]}, indent=2) == '{\n  "a": [\n    1\n  ]\n}'
+    assert dumps({"a": [1]}, indent=4) == json.dumps({"a": [1]}, indent=4)
+    assert dumps_bytes("é") == '"é"'.encode()
+
+
+def test_dumps_default(backend):
+    with pytest.raises(TypeError):
+        dumps({"date": datetime(2024, 1, 1)})
+
+    assert dumps({"date": datetime(2024, 1, 1)}, default=str) == (
+        '{"date":"2024-01-01 00:00:00"}'
+    )
+    # Integers over 64 bits are not supported by orjson
+    assert dumps(2**70) == str(2**70)
+
+
+def test_loads(backend):
+    assert loads('{"a": [1, "é"]}') == {"a": [1, "é"]}
+    assert loads(b'{"a": 1}') == {"a": 1}
+    assert loads(str(2**70)) == 2**70
+
+
+def test_clean_metadata(backend):
+    assert clean_metadata({"a": 1, "b": object()}) == {"a": 1, "b": None}
+    assert clean_metadata({"a": "x" * 100}, max_size=50) == {
+        "message": "Metadata size exceeds the limit of 50 bytes. Redacted."
+    }
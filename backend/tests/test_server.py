@@ -687,3 +687,35 @@ def test_project_translations_file_path_traversal(
 
     # Should give error status
     assert response.status_code == 422
+
+
+def test_get_thread_steps(
+    test_client: TestClient,
+    mock_data_layer: AsyncMock,
+    mock_get_current_user: Mock,
+    persisted_test_user: PersistedUser,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr("chainlit.server.get_data_layer", lambda: mock_data_layer)
+    monkeypatch.setattr("chainlit.data.acl.get_data_layer", lambda: mock_data_layer)
+    mock_get_current_user.return_value = persisted_test_user
+    mock_data_layer.get_thread_author.return_value = persisted_test_user.identifier
+    mock_data_layer.get_thread_steps.return_value = {
+        "steps": [{"id": "step_id"}],
+        "elements": [],
+        "before": "step_id",
+    }
+
+    response = test_client.get(
+        "/project/thread/thread_id/steps", params={"before": "cursor", "limit": 50}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["before"] == "step_id"
+    mock_data_layer.get_thread_steps.assert_awaited_once_with(
+        "thread_id", before="cursor", limit=50
+    )
+
+    mock_data_layer.get_thread_author.return_value = "someone_else"
+    response = test_client.get("/project/thread/thread_id/steps")
+    assert response.status_code == 401
@@ -0,0 +1,125 @@
+import time
+from typing import Dict, Optional, Tuple
+from unittest.mock import patch
+
+import pytest
+
+from chainlit.session_store import (
+    InMemorySessionStore,
+    RedisSessionStore,
+    SessionState,
+)
+
+
+class FakeRedis:
+    """Local stand-in for the redis.asyncio client."""
+
+    def __init__(self):
+        self.data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def get(self, key: str):
+        if entry := self.data.get(key):
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                return value.encode()
+            del self.data[key]
+        return None
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None):
+        self.data[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def state() -> SessionState:
+    return {
+        "id": "session_id",
+        "threadId": "thread_id",
+        "userIdentifier": "user",
+        "clientType": "webapp",
+        "chatSettings": {"temperature": 0.5},
+        "hasFirstInteraction": True,
+        "userSession": {"key": "value"},
+        "chatContext": [{"id": "step_id", "type": "user_message", "output": "Hi"}],
+    }
+
+
+@pytest.mark.parametrize(
+    "store_factory",
+    [InMemorySessionStore, lambda: RedisSessionStore(client=FakeRedis())],
+)
+async def test_session_store(store_factory, state: SessionState):
+    store = store_factory()
+
+    assert await store.get("session_id") is None
+
+    await store.set("session_id", state, ttl=60)
+    assert await store.get("session_id") == state
+
+    await store.delete("session_id")
+    assert await store.get("session_id") is None
+
+
+@pytest.mark.parametrize(
+    "store_factory",
+    [InMemorySessionStore, lambda: RedisSessionStore(client=FakeRedis())],
+)
+async def test_session_store_expiry(store_factory, state: SessionState):
+    store = store_factory()
+
+    await store.set("session_id", state, ttl=60)
+
+    with patch("time.monotonic", return_value=time.monotonic() + 61):
+        assert await store.get("session_id") is None
+
+
+async def test_redis_session_store_prefix(state: SessionState):
+    client = FakeRedis()
+    store = RedisSessionStore(client=client, prefix="app:")
+
+    await store.set("session_id", state, ttl=60)
+
+    assert list(client.data.keys()) == ["app:session_id"]
+
+
+def test_redis_session_store_requires_url_or_client():
+    with pytest.raises(ValueError, match="url or client"):
+        RedisSessionStore()
+
+
+async def test_reaped_sessions_keep_the_snapshot_saved_by_another_worker(
+    state: SessionState,
+):
+    from chainlit.socket import clear_sessions
+
+    store = RedisSessionStore(client=FakeRedis())
+    await store.set("session_id", state, ttl=60)
+
+    with patch("chainlit.session_store._session_store", store):
+        await clear_sessions(["session_id"])
+
+    assert await store.get("session_id") == state
+
+
+async def test_load_state_restores_the_client_type(state: SessionState):
+    from chainlit.session import WebsocketSession
+
+    session = WebsocketSession(
+        id="session_id",
+        socket_id="socket_id",
+        emit=lambda *args: None,
+        emit_call=lambda *args: None,
+        client_type="copilot",
+        user_env={},
+    )
+
+    try:
+        session.load_state(state)
+
+        assert session.client_type == "webapp"
+        assert session.thread_id == "thread_id"
+        assert session.has_first_interaction
+    finally:
+        await session.delete()
@@ -0,0 +1,56 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from socketio import packet
+
+from chainlit.socket_serializer import NegotiatedSerializerServer
+
+msgpack = pytest.importorskip("msgpack")
+
+MSGPACK_QUERY = "EIO=4&transport=websocket&serializer=msgpack"
+
+
+@pytest.fixture
+def server() -> NegotiatedSerializerServer:
+    server = NegotiatedSerializerServer(async_mode="asgi", msgpack=True)
+    server.eio.send = AsyncMock()  # type: ignore[method-assign]
+    return server
+
+
+async def test_msgpack_client(server: NegotiatedSerializerServer):
+    await server._handle_eio_connect("eio_sid", {"QUERY_STRING": MSGPACK_QUERY})
+    assert server.uses_msgpack("eio_sid")
+
+    data = ["audio_chunk", {"data": b"\x00\x01"}]
+    await server._send_packet(
+        "eio_sid", packet.Packet(packet.EVENT, data=data, namespace="/")
+    )
+
+    encoded = server.eio.send.call_args.args[1]  # type: ignore[attr-defined]
+    assert msgpack.loads(encoded) == {"type": packet.EVENT, "data": data, "nsp": "/"}
+
+    server._handle_event = AsyncMock()  # type: ignore[method-assign]
+    await server._handle_eio_message(
+        "eio_sid",
+        msgpack.dumps({"type": packet.EVENT, "data": ["stop"], "nsp": "/", "id": 1}),
+    )
+    server._handle_event.assert_awaited_once_with("eio_sid", "/", 1, ["stop"])
+
+    await server._handle_eio_disconnect("eio_sid", "client disconnect")
+    assert not server.uses_msgpack("eio_sid")
+
+
+async def test_json_client(server: NegotiatedSerializerServer):
+    await server._handle_eio_connect("eio_sid", {"QUERY_STRING": "EIO=4"})
+
+    await server._send_packet("eio_sid", packet.Packet(packet.EVENT, data=["task_end"]))
+
+    server.eio.send.assert_awaited_once_with("eio_sid", '2["task_end"]')  # type: ignore[attr-defined]
+
+
+async def test_msgpack_disabled():
+    server = NegotiatedSerializerServer(async_mode="asgi")
+
+    await server._handle_eio_connect("eio_sid", {"QUERY_STRING": MSGPACK_QUERY})
+
+    assert not server.uses_msgpack("eio_sid")
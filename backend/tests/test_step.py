@@ -0,0 +1,90 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from chainlit.data.base import BaseDataLayer
+from chainlit.data.persistence_queue import persistence_queue
+from chainlit.step import Step
+
+
+@pytest.fixture
+def data_layer():
+    data_layer = AsyncMock(spec=BaseDataLayer)
+    with patch("chainlit.step.get_data_layer", Mock(return_value=data_layer)):
+        yield data_layer
+
+
+@pytest.fixture
+def hidden_cot():
+    with patch("chainlit.config.config.ui.cot", "hidden"):
+        yield
+
+
+async def test_hidden_step_sends_stub_once_and_persists_at_end(
+    mock_chainlit_context, data_layer, hidden_cot
+):
+    async with mock_chainlit_context as context:
+        context.emitter.send_step = AsyncMock()
+        context.emitter.update_step = AsyncMock()
+        context.emitter.send_token = AsyncMock()
+
+        async with Step(name="tool", type="tool") as step:
+            for token in ["a", "b", "c"]:
+                await step.stream_token(token)
+        await persistence_queue.flush()
+
+        assert step.output == "abc"
+        context.emitter.send_step.assert_awaited_once()
+        assert context.emitter.send_step.await_args.args[0]["output"] == ""
+        context.emitter.update_step.assert_awaited_once()
+        context.emitter.send_token.assert_not_awaited()
+
+        data_layer.create_step.assert_awaited_once()
+        assert data_layer.create_step.await_args.args[0]["output"] == "abc"
+        data_layer.update_step.assert_not_awaited()
+        data_layer.patch_step.assert_not_awaited()
+
+
+async def test_hidden_step_stub_is_sent_on_first_token(
+    mock_chainlit_context, data_layer, hidden_cot
+):
+    async with mock_chainlit_context as context:
+        context.emitter.send_step = AsyncMock()
+
+        step = Step(name="tool", type="tool")
+        await step.stream_token("a")
+        await step.stream_token("b")
+        await step.send()
+        await persistence_queue.flush()
+
+        context.emitter.send_step.assert_awaited_once()
+        data_layer.create_step.assert_awaited_once()
+
+
+async def test_visible_step_is_persisted_on_start(mock_chainlit_context, data_layer):
+    async with mock_chainlit_context as context:
+        context.emitter.send_step = AsyncMock()
+        context.emitter.update_step = AsyncMock()
+
+        async with Step(name="tool", type="tool") as step:
+            await persistence_queue.flush()
+            data_layer.create_step.assert_awaited_once()
+
+            step.output = "done"
+        await persistence_queue.flush()
+
+        data_layer.patch_step.assert_awaited_once()
+        assert data_layer.patch_step.await_args.args[1] == ["output", "end", "id"]
+
+
+async def test_step_raises_persist_errors_on_request(mock_chainlit_context, data_layer):
+    data_layer.create_step.side_effect = Exception("Database unavailable")
+
+    async with mock_chainlit_context as context:
+        context.emitter.send_step = AsyncMock()
+
+        step = Step(name="tool", type="tool")
+        step.fail_on_persist_error = True
+        with pytest.raises(Exception, match="Database unavailable"):
+            await step.send()
+        assert not step.persisted
@@ -0,0 +1,218 @@
+import asyncio
+from typing import Any, List, Tuple
+
+from chainlit.metrics import metrics
+from chainlit.session import WebsocketSession
+from chainlit.streaming import OutboundQueue, ReplayBuffer
+
+
+class SlowSocket:
+    """Socket stand-in that only writes events when released."""
+
+    def __init__(self):
+        self.sent: List[Tuple[str, Any]] = []
+        self.release = asyncio.Event()
+
+    async def send(self, event: str, data: Any):
+        await self.release.wait()
+        self.sent.append((event, data))
+
+
+def token(id: str, value: str, is_sequence=False, is_input=False):
+    return {"id": id, "token": value, "isSequence": is_sequence, "isInput": is_input}
+
+
+async def test_outbound_queue_preserves_order():
+    socket = SlowSocket()
+    socket.release.set()
+    queue = OutboundQueue(send=socket.send, maxsize=10)
+
+    await queue.put("new_message", {"id": "a"})
+    await queue.put("task_end", {})
+    await queue.join()
+
+    assert socket.sent == [("new_message", {"id": "a"}), ("task_end", {})]
+    assert queue.depth == 0
+
+
+async def test_outbound_queue_merges_pending_tokens():
+    socket = SlowSocket()
+    queue = OutboundQueue(send=socket.send, maxsize=10)
+    metrics.reset()
+
+    await queue.put("stream_start", {"id": "a"})
+    await asyncio.sleep(0)
+    for value in ["Hello", " ", "world"]:
+        await queue.put("stream_token", token("a", value))
+    await queue.put("stream_token", token("b", "other"))
+
+    # stream_start is being written, the tokens of each step are merged
+    assert queue.depth == 2
+    assert metrics.snapshot()["outbound_queue.merged_tokens"] == 2
+
+    socket.release.set()
+    await queue.join()
+
+    assert socket.sent == [
+        ("stream_start", {"id": "a"}),
+        ("stream_token", token("a", "Hello world")),
+        ("stream_token", token("b", "other")),
+    ]
+
+
+async def test_outbound_queue_does_not_merge_across_events():
+    socket = SlowSocket()
+    queue = OutboundQueue(send=socket.send, maxsize=10)
+
+    await queue.put("task_start", {})
+    await queue.put("stream_token", token("a", "Hello"))
+    await queue.put("update_message", {"id": "a", "output": "Hello"})
+    await queue.put("stream_token", token("a", "!"))
+    await queue.put("stream_token", token("a", "?", is_sequence=True))
+
+    socket.release.set()
+    await queue.join()
+
+    assert socket.sent == [
+        ("task_start", {}),
+        ("stream_token", token("a", "Hello")),
+        ("update_message", {"id": "a", "output": "Hello"}),
+        ("stream_token", token("a", "?", is_sequence=True)),
+    ]
+
+
+async def test_outbound_queue_backpressure():
+    socket = SlowSocket()
+    queue = OutboundQueue(send=socket.send, maxsize=2)
+    metrics.reset()
+
+    await queue.put("new_message", {"id": "0"})
+    await asyncio.sleep(0)
+    await queue.put("new_message", {"id": "1"})
+    await queue.put("new_message", {"id": "2"})
+
+    # The queue is full, structural events wait for the writer
+    put = asyncio.ensure_future(queue.put("new_message", {"id": "3"}))
+    await asyncio.sleep(0)
+    assert not put.done()
+    assert metrics.snapshot()["outbound_queue.full"] == 1
+
+    socket.release.set()
+    await put
+    await queue.join()
+
+    assert [data["id"] for _, data in socket.sent] == ["0", "1", "2", "3"]
+
+
+def test_replay_buffer_since():
+    buffer = ReplayBuffer(maxsize=3)
+    for i in range(5):
+        buffer.append("stream_token", token("a", str(i)))
+
+    assert buffer.since(3) == [
+        (4, "stream_token", token("a", "3")),
+        (5, "stream_token", token("a", "4")),
+    ]
+    assert [seq for seq, _, _ in buffer.since(2) or []] == [3, 4, 5]
+    assert buffer.since(5) == []
+    # Evicted events cannot be replayed
+    assert buffer.since(1) is None
+    # Sequence number unknown to this buffer
+    assert buffer.since(8) is None
+
+
+async def test_session_replays_missed_events():
+    socket = SlowSocket()
+    socket.release.set()
+    session = WebsocketSession(
+        id="session_id",
+        socket_id="socket_id",
+        emit=socket.send,
+        emit_call=lambda *args: None,
+        client_type="webapp",
+        user_env={},
+        capabilities=["event_seq"],
+    )
+
+    try:
+        await session.emit("new_message", {"id": "a"})
+        await session.emit("stream_token", token("a", "Hello"))
+        await session.outbound_queue.join()
+
+        assert socket.sent == [
+            ("new_message", ({"id": "a"}, 1)),
+            ("stream_token", (token("a", "Hello"), 2)),
+        ]
+
+        socket.sent.clear()
+        assert await session.replay(1)
+        assert socket.sent == [("stream_token", (token("a", "Hello"), 2))]
+    finally:
+        await session.delete()
+
+
+async def test_reconnected_session_sends_new_events_after_the_replay():
+    socket = SlowSocket()
+    socket.release.set()
+    session = WebsocketSession(
+        id="session_id",
+        socket_id="socket_id",
+        emit=socket.send,
+        emit_call=lambda *args: None,
+        client_type="webapp",
+        user_env={},
+        capabilities=["event_seq"],
+    )
+
+    try:
+        await session.emit("new_message", {"id": "a"})
+        await session.emit("stream_token", token("a", "Hello"))
+        await session.outbound_queue.join()
+        socket.sent.clear()
+
+        # The client reconnects, it only received the first event
+        session.resume_from(1)
+        await session.emit("stream_token", token("a", " world"))
+        await asyncio.sleep(0.01)
+        assert socket.sent == []
+
+        assert await session.replay(1)
+        await session.outbound_queue.join()
+        assert socket.sent == [
+            ("stream_token", (token("a", "Hello"), 2)),
+            ("stream_token", (token("a", " world"), 3)),
+        ]
+    finally:
+        await session.delete()
+
+
+async def test_reconnected_session_sends_new_events_without_a_replay(monkeypatch):
+    monkeypatch.setattr("chainlit.session.REPLAY_TIMEOUT", 0.01)
+    socket = SlowSocket()
+    socket.release.set()
+    session = WebsocketSession(
+        id="session_id",
+        socket_id="socket_id",
+        emit=socket.send,
+        emit_call=lambda *args: None,
+        client_type="webapp",
+        user_env={},
+        capabilities=["event_seq"],
+    )
+
+    try:
+        # The client never asks for the replay
+        session.resume_from(0)
+        await session.emit("new_message", {"id": "a"})
+        await asyncio.wait_for(session.outbound_queue.join(), 1)
+        assert socket.sent == [("new_message", ({"id": "a"}, 1))]
+        assert session.resume_seq is None
+
+        # It disconnects before asking for it
+        session.resume_from(1)
+        await session.emit("new_message", {"id": "b"})
+        session.cancel_replay()
+        await session.outbound_queue.join()
+        assert socket.sent[-1] == ("new_message", ({"id": "b"}, 2))
+    finally:
+        await session.delete()
@@ -4,6 +4,7 @@ import {
   MutableRefObject,
   useCallback,
   useEffect,
+  useLayoutEffect,
   useRef,
   useState
 } from 'react';
@@ -28,7 +29,9 @@ export default function ScrollContainer({
   const ref = useRef<HTMLDivElement>(null);
   const spacerRef = useRef<HTMLDivElement>(null);
   const lastUserMessageRef = useRef<HTMLDivElement | null>(null);
-  const { messages } = useChatMessages();
+  // Height of the content before older steps were prepended
+  const previousHeightRef = useRef<number | null>(null);
+  const { messages, hasPreviousSteps, loadPreviousSteps } = useChatMessages();
   const [showScrollButton, setShowScrollButton] = useState(false);
   const [isScrolling, setIsScrolling] = useState(false);
 
@@ -71,6 +74,15 @@ export default function ScrollContainer({
     }
   }, [autoScrollUserMessage, autoScrollRef]);
 
+  // Keep the visible messages in place when older steps are prepended
+  useLayoutEffect(() => {
+    if (!ref.current || previousHeightRef.current === null) return;
+
+    ref.current.scrollTop +=
+      ref.current.scrollHeight - previousHeightRef.current;
+    previousHeightRef.current = null;
+  }, [messages]);
+
   // Find and set a ref to the last user message element
   useEffect(() => {
     if (!ref.current) return;
@@ -190,6 +202,11 @@ export default function ScrollContainer({
     }
 
     setShowScrollButton(!atBottom);
+
+    if (hasPreviousSteps && scrollTop < 100) {
+      previousHeightRef.current = scrollHeight;
+      loadPreviousSteps();
+    }
   };
 
   return (
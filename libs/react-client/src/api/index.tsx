@@ -1,4 +1,4 @@
-import { IElement, IThread, IUser } from 'src/types';
+import { IElement, IStep, IThread, IUser } from 'src/types';
 
 import { IAction } from 'src/types/action';
 import { IFeedback } from 'src/types/feedback';
@@ -230,6 +230,25 @@ export class ChainlitAPI extends APIBase {
     return res.json();
   }
 
+  async getThreadSteps(
+    threadId: string,
+    before?: string,
+    limit?: number
+  ): Promise<{
+    steps: IStep[];
+    elements: IElement[];
+    before: string | null;
+  }> {
+    const params = new URLSearchParams();
+    if (before) params.append('before', before);
+    if (limit) params.append('limit', limit.toString());
+    const res = await this.get(
+      `/project/thread/${threadId}/steps?${params.toString()}`
+    );
+
+    return res.json();
+  }
+
   async renameThread(threadId: string, name: string) {
     const res = await this.put(`/project/thread`, { threadId, name });
 
@@ -215,6 +215,12 @@ export const currentThreadIdState = atom<string | undefined>({
   default: undefined
 });
 
+// Cursor of the older steps of the resumed thread, null once they are all loaded
+export const threadStepsBeforeState = atom<string | null>({
+  key: 'ThreadStepsBefore',
+  default: null
+});
+
 const localStorageEffect =
   <T>(key: string): AtomEffect<T> =>
   ({ setSelf, onSet }) => {
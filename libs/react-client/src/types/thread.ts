@@ -4,10 +4,13 @@ import { IStep } from './step';
 export interface IThread {
   id: string;
   createdAt: number | string;
+  updatedAt?: number | string;
   name?: string;
   userId?: string;
   userIdentifier?: string;
   metadata?: Record<string, any>;
   steps: IStep[];
   elements?: IElement[];
+  // Cursor of the older steps, when the thread is loaded page by page
+  stepsBefore?: string | null;
 }
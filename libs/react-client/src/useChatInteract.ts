@@ -15,6 +15,7 @@ import {
   sideViewState,
   tasklistState,
   threadIdToResumeState,
+  threadStepsBeforeState,
   tokenCountState
 } from 'src/state';
 import { IFileRef, IStep } from 'src/types';
@@ -45,6 +46,7 @@ const useChatInteract = () => {
   const setIdToResume = useSetRecoilState(threadIdToResumeState);
   const setSideView = useSetRecoilState(sideViewState);
   const setCurrentThreadId = useSetRecoilState(currentThreadIdState);
+  const setThreadStepsBefore = useSetRecoilState(threadStepsBeforeState);
 
   const clear = useCallback(() => {
     session?.socket.emit('clear_session');
@@ -61,6 +63,7 @@ const useChatInteract = () => {
     resetChatSettingsValue();
     setSideView(undefined);
     setCurrentThreadId(undefined);
+    setThreadStepsBefore(null);
   }, [session]);
 
   const sendMessage = useCallback(
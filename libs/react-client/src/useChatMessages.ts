@@ -1,20 +1,65 @@
-import { useRecoilValue } from 'recoil';
+import { useCallback, useContext, useRef } from 'react';
+import { useRecoilState, useRecoilValue, useSetRecoilState } from 'recoil';
+import { IMessageElement, ITasklistElement } from 'src/types';
+import { addPreviousSteps, dedupeById } from 'src/utils/message';
 
+import { ChainlitContext } from './context';
 import {
   currentThreadIdState,
+  elementState,
   firstUserInteraction,
-  messagesState
+  messagesState,
+  tasklistState,
+  threadStepsBeforeState
 } from './state';
 
 const useChatMessages = () => {
-  const messages = useRecoilValue(messagesState);
+  const client = useContext(ChainlitContext);
+  const [messages, setMessages] = useRecoilState(messagesState);
   const firstInteraction = useRecoilValue(firstUserInteraction);
   const threadId = useRecoilValue(currentThreadIdState);
+  const [stepsBefore, setStepsBefore] = useRecoilState(threadStepsBeforeState);
+  const setElements = useSetRecoilState(elementState);
+  const setTasklists = useSetRecoilState(tasklistState);
+  const loading = useRef(false);
+
+  const loadPreviousSteps = useCallback(async () => {
+    if (!threadId || !stepsBefore || loading.current) return;
+
+    loading.current = true;
+    try {
+      const page = await client.getThreadSteps(threadId, stepsBefore);
+      // The page contains the ancestors of its steps and their elements, which
+      // may be loaded already, nest everything again
+      setMessages((messages) => addPreviousSteps(messages, page.steps));
+      setTasklists((tasklists) =>
+        dedupeById([
+          ...(page.elements as ITasklistElement[]).filter(
+            (e) => e.type === 'tasklist'
+          ),
+          ...tasklists
+        ])
+      );
+      setElements((elements) =>
+        dedupeById([
+          ...(page.elements as IMessageElement[]).filter(
+            (e) => ['avatar', 'tasklist'].indexOf(e.type) === -1
+          ),
+          ...elements
+        ])
+      );
+      setStepsBefore(page.before);
+    } finally {
+      loading.current = false;
+    }
+  }, [client, threadId, stepsBefore]);
 
   return {
     threadId,
     messages,
-    firstInteraction
+    firstInteraction,
+    hasPreviousSteps: !!stepsBefore,
+    loadPreviousSteps
   };
 };
 
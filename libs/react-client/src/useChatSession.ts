@@ -30,6 +30,7 @@ import {
   sideViewState,
   tasklistState,
   threadIdToResumeState,
+  threadStepsBeforeState,
   tokenCountState,
   wavRecorderState,
   wavStreamPlayerState
@@ -46,9 +47,11 @@ import {
 import {
   addMessage,
   deleteMessageById,
+  patchMessageById,
   updateMessageById,
   updateMessageContentById
 } from 'src/utils/message';
+import { createNegotiatedParser } from 'src/utils/socketParser';
 
 import { OutputAudioChunk } from './types/audio';
 
@@ -82,6 +85,7 @@ const useChatSession = () => {
   const [chatProfile, setChatProfile] = useRecoilState(chatProfileState);
   const idToResume = useRecoilValue(threadIdToResumeState);
   const setThreadResumeError = useSetRecoilState(resumeThreadErrorState);
+  const setThreadStepsBefore = useSetRecoilState(threadStepsBeforeState);
 
   const [currentThreadId, setCurrentThreadId] =
     useRecoilState(currentThreadIdState);
@@ -118,12 +122,16 @@ const useChatSession = () => {
         path,
         withCredentials: true,
         transports,
+        // MessagePack is only used if the server supports it
+        query: { serializer: 'msgpack' },
+        parser: createNegotiatedParser(),
         auth: {
           clientType: client.type,
           sessionId,
           threadId: idToResume || '',
           userEnv: JSON.stringify(userEnv),
-          chatProfile: chatProfile ? encodeURIComponent(chatProfile) : ''
+          chatProfile: chatProfile ? encodeURIComponent(chatProfile) : '',
+          capabilities: ['patch_message', 'event_seq']
         }
       });
       setSession((old) => {
@@ -134,6 +142,16 @@ const useChatSession = () => {
         };
       });
 
+      // Events are stamped with a sequence number as their last argument.
+      // Sending back the last one on reconnect replays the missed events, the
+      // parser drops the events received twice.
+      socket.onAny((_event: string, ...args: unknown[]) => {
+        const seq = args[args.length - 1];
+        if (typeof seq === 'number') {
+          socket.auth['lastSeq'] = seq;
+        }
+      });
+
       socket.on('connect', () => {
         socket.emit('connection_successful');
         setSession((s) => ({ ...s!, error: false }));
@@ -240,6 +258,7 @@ const useChatSession = () => {
           setChatSettingsValue(thread.metadata?.chat_settings);
         }
         setMessages(messages);
+        setThreadStepsBefore(thread.stepsBefore || null);
         const elements = thread.elements || [];
         setTasklists(
           (elements as ITasklistElement[]).filter((e) => e.type === 'tasklist')
@@ -273,6 +292,15 @@ const useChatSession = () => {
         );
       });
 
+      socket.on(
+        'patch_message',
+        (patch: Partial<IStep> & Pick<IStep, 'id'>) => {
+          setMessages((oldMessages) =>
+            patchMessageById(oldMessages, patch.id, patch)
+          );
+        }
+      );
+
       socket.on('delete_message', (message: IStep) => {
         setMessages((oldMessages) =>
           deleteMessageById(oldMessages, message.id)
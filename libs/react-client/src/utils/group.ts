@@ -1,5 +1,9 @@
 import { IThread } from 'src/types';
 
+// Threads are grouped by last activity, if known
+const activityDate = (thread: IThread) =>
+  new Date(thread.updatedAt ?? thread.createdAt);
+
 export const groupByDate = (data: IThread[]) => {
   const groupedData: { [key: string]: IThread[] } = {};
 
@@ -7,12 +11,9 @@ export const groupByDate = (data: IThread[]) => {
   today.setHours(0, 0, 0, 0);
 
   [...data]
-    .sort(
-      (a, b) =>
-        new Date(b.createdAt).getTime() - new Date(a.createdAt).getTime()
-    )
+    .sort((a, b) => activityDate(b).getTime() - activityDate(a).getTime())
     .forEach((item) => {
-      const threadDate = new Date(item.createdAt);
+      const threadDate = activityDate(item);
       threadDate.setHours(0, 0, 0, 0);
 
       const daysDiff = Math.floor(
@@ -0,0 +1,74 @@
+import { describe, expect, it } from 'vitest';
+
+import { IStep } from '..';
+import { addPreviousSteps, dedupeById, nestMessages } from './message';
+
+const step = (id: string, parentId?: string, output = ''): IStep => ({
+  id,
+  parentId,
+  name: id,
+  type: 'tool',
+  output,
+  createdAt: 0
+});
+
+const tree = (messages: IStep[]): unknown[] =>
+  messages.map(({ id, output, steps }) => [id, output, tree(steps || [])]);
+
+describe('addPreviousSteps', () => {
+  it('nests the steps of two pages sharing their ancestors once', () => {
+    // A run in a message, the last page only has the last two tool calls
+    const messages = nestMessages([
+      step('message'),
+      step('run', 'message', 'running'),
+      step('tool3', 'run'),
+      step('tool4', 'run')
+    ]);
+    const page = [
+      step('message'),
+      step('run', 'message'),
+      step('tool1', 'run'),
+      step('tool2', 'run')
+    ];
+
+    expect(tree(addPreviousSteps(messages, page))).toEqual([
+      [
+        'message',
+        '',
+        [
+          [
+            'run',
+            // The version already loaded is kept
+            'running',
+            [
+              ['tool1', '', []],
+              ['tool2', '', []],
+              ['tool3', '', []],
+              ['tool4', '', []]
+            ]
+          ]
+        ]
+      ]
+    ]);
+  });
+});
+
+describe('dedupeById', () => {
+  it('keeps the elements of ancestors shared by two pages once', () => {
+    const loaded = [
+      { id: 'chart', forId: 'run', url: 'signed-2' },
+      { id: 'log', forId: 'tool3', url: '' }
+    ];
+    const page = [
+      { id: 'chart', forId: 'run', url: 'signed-1' },
+      { id: 'table', forId: 'tool1', url: '' }
+    ];
+
+    // The version already loaded is kept, in the order of the page
+    expect(dedupeById([...page, ...loaded])).toEqual([
+      { id: 'chart', forId: 'run', url: 'signed-2' },
+      { id: 'table', forId: 'tool1', url: '' },
+      { id: 'log', forId: 'tool3', url: '' }
+    ]);
+  });
+});
@@ -12,6 +12,37 @@ const nestMessages = (messages: IStep[]): IStep[] => {
   return nestedMessages;
 };
 
+// Inverse of nestMessages, parents come before their children
+const flattenMessages = (messages: IStep[]): IStep[] => {
+  const flatMessages: IStep[] = [];
+
+  for (const { steps, ...message } of messages) {
+    flatMessages.push(message);
+    if (steps) {
+      flatMessages.push(...flattenMessages(steps));
+    }
+  }
+
+  return flatMessages;
+};
+
+// Items once per id, in the order of their first occurrence with their last
+// version, e.g. the steps of a page and the ancestors it shares with the
+// steps already loaded
+const dedupeById = <T extends { id: string }>(items: T[]): T[] => {
+  const byId = new Map<string, T>();
+
+  for (const item of items) {
+    byId.set(item.id, item);
+  }
+
+  return Array.from(byId.values());
+};
+
+// Nest a page of previous steps with the messages already loaded
+const addPreviousSteps = (messages: IStep[], steps: IStep[]): IStep[] =>
+  nestMessages(dedupeById([...steps, ...flattenMessages(messages)]));
+
 const isLastMessage = (messages: IStep[], index: number) => {
   if (messages.length - 1 === index) {
     return true;
@@ -140,6 +171,27 @@ const updateMessageById = (
   return nextMessages;
 };
 
+const patchMessageById = (
+  messages: IStep[],
+  messageId: string,
+  patch: Partial<IStep>
+): IStep[] => {
+  const nextMessages = [...messages];
+
+  for (let index = 0; index < nextMessages.length; index++) {
+    const msg = nextMessages[index];
+
+    if (isEqual(msg.id, messageId)) {
+      nextMessages[index] = { ...msg, ...patch };
+    } else if (hasMessageById(nextMessages, messageId) && msg.steps) {
+      msg.steps = patchMessageById(msg.steps, messageId, patch);
+      nextMessages[index] = { ...msg };
+    }
+  }
+
+  return nextMessages;
+};
+
 const deleteMessageById = (messages: IStep[], messageId: string) => {
   let nextMessages = [...messages];
 
@@ -215,10 +267,14 @@ const updateMessageContentById = (
 export {
   addMessageToParent,
   addMessage,
+  addPreviousSteps,
+  dedupeById,
   deleteMessageById,
+  flattenMessages,
   hasMessageById,
   isLastMessage,
   nestMessages,
+  patchMessageById,
   updateMessageById,
   updateMessageContentById
 };
@@ -0,0 +1,147 @@
+import { describe, expect, it } from 'vitest';
+
+import { decode, encode } from './msgpack';
+
+// Expected encodings are produced by the Python msgpack package used by the
+// server (python-socketio MsgPackPacket), e.g. `msgpack.dumps(128).hex()`, to
+// check the client encodes and decodes the packets the same way.
+
+const fromHex = (hex: string) =>
+  new Uint8Array(hex.match(/../g)!.map((byte) => parseInt(byte, 16)));
+
+const toHex = (buffer: ArrayBuffer | Uint8Array) =>
+  Array.from(new Uint8Array(buffer))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+
+const roundTrip = (value: unknown, hex: string) => {
+  expect(toHex(encode(value))).toBe(hex);
+  expect(decode(fromHex(hex))).toEqual(value);
+};
+
+describe('msgpack', () => {
+  it('encodes integers like the server', () => {
+    const cases: [number, string][] = [
+      [0, '00'],
+      [127, '7f'],
+      [128, 'cc80'],
+      [255, 'ccff'],
+      [256, 'cd0100'],
+      [65535, 'cdffff'],
+      [65536, 'ce00010000'],
+      [4294967295, 'ceffffffff'],
+      [4294967296, 'cf0000000100000000'],
+      [Number.MAX_SAFE_INTEGER, 'cf001fffffffffffff'],
+      [-1, 'ff'],
+      [-32, 'e0'],
+      [-33, 'd0df'],
+      [-128, 'd080'],
+      [-129, 'd1ff7f'],
+      [-32768, 'd18000'],
+      [-32769, 'd2ffff7fff'],
+      [-2147483648, 'd280000000'],
+      [-2147483649, 'd3ffffffff7fffffff'],
+      [Number.MIN_SAFE_INTEGER, 'd3ffe0000000000001']
+    ];
+    cases.forEach(([value, hex]) => roundTrip(value, hex));
+  });
+
+  it('encodes floats like the server', () => {
+    roundTrip(0.5, 'cb3fe0000000000000');
+    roundTrip(-1.25, 'cbbff4000000000000');
+    roundTrip(Math.PI, 'cb400921fb54442d18');
+    // Python floats without a fractional part are still decoded
+    expect(decode(fromHex('cb3ff0000000000000'))).toBe(1);
+  });
+
+  it('encodes strings with the smallest header', () => {
+    const cases: [number, string][] = [
+      [0, 'a0'],
+      [31, 'bf'],
+      [32, 'd920'],
+      [255, 'd9ff'],
+      [256, 'da0100'],
+      [65535, 'daffff'],
+      [65536, 'db00010000']
+    ];
+    cases.forEach(([length, header]) => {
+      const value = 'a'.repeat(length);
+      const hex = header + '61'.repeat(length);
+      roundTrip(value, hex);
+    });
+    // The header counts bytes, not characters
+    roundTrip('é', 'a2c3a9');
+  });
+
+  it('encodes binary data with the smallest header', () => {
+    const cases: [number, string][] = [
+      [0, 'c400'],
+      [31, 'c41f'],
+      [255, 'c4ff'],
+      [256, 'c50100'],
+      [65535, 'c5ffff'],
+      [65536, 'c600010000']
+    ];
+    cases.forEach(([length, header]) => {
+      const hex = header + '01'.repeat(length);
+      expect(toHex(encode(new Uint8Array(length).fill(1)))).toBe(hex);
+      const decoded = decode(fromHex(hex)) as ArrayBuffer;
+      expect(decoded).toBeInstanceOf(ArrayBuffer);
+      expect(toHex(decoded)).toBe('01'.repeat(length));
+    });
+  });
+
+  it('encodes arrays and maps of 16 items and more', () => {
+    const array = Array.from({ length: 16 }, (_, i) => i);
+    roundTrip(array, 'dc0010' + '000102030405060708090a0b0c0d0e0f');
+
+    const map = Object.fromEntries(array.map((i) => [`k${i}`, i]));
+    expect(toHex(encode(map)).slice(0, 6)).toBe('de0010');
+    expect(decode(encode(map))).toEqual(map);
+  });
+
+  it('round-trips the socket.io packets of the server', () => {
+    roundTrip(
+      {
+        type: 2,
+        data: [
+          'new_message',
+          { id: 'a', metadata: { nested: [1, null, true, false] } }
+        ],
+        nsp: '/'
+      },
+      '83a47479706502a46461746192ab6e65775f6d65737361676582a26964a161a86d65' +
+        '74616461746181a66e65737465649401c0c3c2a36e7370a12f'
+    );
+  });
+
+  it('round-trips the binary attachments of a packet', () => {
+    const hex =
+      '84a47479706502a46461746192ab617564696f5f6368756e6b82a464617461c40400' +
+      '0102ffa86d696d6554797065a570636d3136a36e7370a12fa2696403';
+    const packet = {
+      type: 2,
+      data: [
+        'audio_chunk',
+        { data: new Uint8Array([0, 1, 2, 255]), mimeType: 'pcm16' }
+      ],
+      nsp: '/',
+      id: 3
+    };
+
+    expect(toHex(encode(packet))).toBe(hex);
+
+    const decoded = decode(fromHex(hex)) as {
+      data: [string, { data: ArrayBuffer }];
+    };
+    const [event, payload] = decoded.data;
+    expect(event).toBe('audio_chunk');
+    expect(Array.from(new Uint8Array(payload.data))).toEqual([0, 1, 2, 255]);
+  });
+
+  it('omits undefined values like JSON', () => {
+    expect(decode(encode({ id: 'a', parentId: undefined }))).toEqual({
+      id: 'a'
+    });
+  });
+});
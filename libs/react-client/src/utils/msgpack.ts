@@ -0,0 +1,33 @@
+import {
+  decode as decodeMessagePack,
+  encode as encodeMessagePack
+} from '@msgpack/msgpack';
+
+// MessagePack encoding of the socket.io packets, as done by the server
+// (python-socketio MsgPackPacket). Binary data is decoded as ArrayBuffer, like
+// the attachments of the JSON parser.
+
+const toArrayBuffers = (value: unknown): unknown => {
+  if (value instanceof Uint8Array) {
+    return value.buffer.slice(
+      value.byteOffset,
+      value.byteOffset + value.byteLength
+    );
+  }
+  if (Array.isArray(value)) {
+    return value.map(toArrayBuffers);
+  }
+  if (value && typeof value === 'object') {
+    return Object.fromEntries(
+      Object.entries(value).map(([key, item]) => [key, toArrayBuffers(item)])
+    );
+  }
+  return value;
+};
+
+// Undefined values are omitted, like with JSON
+export const encode = (value: unknown): Uint8Array =>
+  encodeMessagePack(value, { ignoreUndefined: true });
+
+export const decode = (data: ArrayBuffer | Uint8Array): unknown =>
+  toArrayBuffers(decodeMessagePack(data));
@@ -0,0 +1,93 @@
+import {
+  Decoder as JsonDecoder,
+  Encoder as JsonEncoder,
+  Packet,
+  PacketType
+} from 'socket.io-parser';
+
+import { decode, encode } from './msgpack';
+
+// Socket.io parser switching from JSON to MessagePack when the server does.
+// The client asks for MessagePack with the `serializer=msgpack` query parameter
+// and keeps using JSON until it receives a MessagePack packet, so it works with
+// servers that do not support (or did not enable) MessagePack.
+// When the server announces it with an `event_seq` event, before any other,
+// events are stamped with a per-session sequence number as their last argument
+// and the events sent again by a replay after a reconnection are dropped here.
+export const createNegotiatedParser = () => {
+  const state = { msgpack: false, eventSeq: false, lastSeq: 0 };
+
+  const isEvent = (packet: Packet) =>
+    packet.type === PacketType.EVENT || packet.type === PacketType.BINARY_EVENT;
+
+  const isNewEvent = (packet: Packet) => {
+    if (!state.eventSeq || !isEvent(packet)) {
+      return true;
+    }
+    const seq = packet.data?.length === 3 ? packet.data[2] : undefined;
+    if (typeof seq !== 'number') {
+      return true;
+    }
+    // A new session numbers its events from 1 again
+    if (seq !== 1 && seq <= state.lastSeq) {
+      return false;
+    }
+    state.lastSeq = seq;
+    return true;
+  };
+
+  class Encoder extends JsonEncoder {
+    encode(packet: Packet) {
+      if (!state.msgpack) {
+        return super.encode(packet);
+      }
+      // MessagePack carries binary data as is, no need for attachments
+      const type =
+        packet.type === PacketType.BINARY_EVENT
+          ? PacketType.EVENT
+          : packet.type === PacketType.BINARY_ACK
+          ? PacketType.ACK
+          : packet.type;
+      return [
+        encode({ type, data: packet.data, nsp: packet.nsp, id: packet.id })
+      ];
+    }
+  }
+
+  class Decoder extends JsonDecoder {
+    add(chunk: any) {
+      // With JSON, binary chunks are attachments of the packet being reconstructed
+      const reconstructing = !!(this as unknown as { reconstructor: unknown })
+        .reconstructor;
+      if (typeof chunk === 'string' || reconstructing) {
+        return super.add(chunk);
+      }
+
+      state.msgpack = true;
+      this.emitReserved('decoded', decode(chunk) as Packet);
+    }
+
+    // The socket only gets the events it did not receive yet
+    on(event: any, listener: any) {
+      if (event !== 'decoded') {
+        return super.on(event, listener);
+      }
+      return super.on(event, (packet: Packet) => {
+        if (isEvent(packet) && packet.data?.[0] === 'event_seq') {
+          state.eventSeq = true;
+        } else if (isNewEvent(packet)) {
+          listener(packet);
+        }
+      });
+    }
+
+    destroy() {
+      // The next connection negotiates the serializer and sequence numbers again
+      state.msgpack = false;
+      state.eventSeq = false;
+      super.destroy();
+    }
+  }
+
+  return { protocol: 5, PacketType, Encoder, Decoder };
+};